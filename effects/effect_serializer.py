@@ -1,6 +1,41 @@
 from io import TextIOWrapper
 import json
+import shutil
+import struct
+import tempfile
 import numpy as np
+from quantize import quantize
+
+# Binary effect container, read on the Pico by pico/effect_reader.py
+# (keep the layouts below in sync with it):
+#
+#   header   '<4sBBHHHIIII'  magic, version, flags, light_count, frame_delay_ms,
+#                            palette_size, row_count, frame_count,
+#                            palette_offset, index_offset
+#   rows     row_count x (row header '<HBH' repeat, kind, payload length + payload)
+#            ROW_RUNS payload is a list of (u8 run length, u8/u16 palette index)
+#            covering the whole frame
+#            ROW_DELTA payload is a list of spans, each a '<HH' span header (first
+#            light, byte length of its runs) followed by runs like in ROW_RUNS, which
+#            overwrite only those lights of the previous frame
+#   palette  palette_size x 3 bytes (r, g, b)
+#   index    row_count x '<II' (first frame number, row byte offset)
+MAGIC = b'SLFX'
+VERSION = 1
+FLAG_WIDE_INDICES = 1
+FLAG_DELTA_ROWS = 2
+HEADER_FORMAT = '<4sBBHHHIIII'
+ROW_HEADER_FORMAT = '<HBH'
+INDEX_ENTRY_FORMAT = '<II'
+SPAN_HEADER_FORMAT = '<HH'
+ROW_RUNS = 0
+ROW_DELTA = 1
+
+_MAX_RUN_LENGTH = 255
+_MAX_ROW_REPEAT = 0xffff
+# unchanged gaps shorter than this are sent again instead of starting a new span,
+# a span header costs more than the runs they take
+_MIN_SPAN_GAP = 4
 
 def _collapse_duplicate_rows(data):
     change_points = np.where(~np.all(data[:-1] == data[1:], axis=1))[0] + 1
@@ -35,10 +70,301 @@ def _serialize_value(val) -> str:
 def _serialize_row(row) -> str:
     return ','.join(_serialize_value(val) for val in row)
 
-def serialize(file: TextIOWrapper, lights, metadata: dict):
+def _split_counts(counts, values, max_count):
+    pieces = -(-counts // max_count)
+
+    if np.all(pieces == 1):
+        return counts, values
+
+    values = np.repeat(values, pieces, axis=0)
+    split = np.full(len(values), max_count)
+    last_piece = np.cumsum(pieces) - 1
+    split[last_piece] = counts - (pieces - 1)*max_count
+
+    return split, values
+
+def _run_dtype(wide: bool):
+    return np.dtype([('count', 'u1'), ('index', '<u2' if wide else 'u1')])
+
+def _pack_palette(color_table) -> bytes:
+    colors = np.asarray(color_table, dtype=np.uint32)
+    rgb = np.stack(((colors >> 16) & 0xff, (colors >> 8) & 0xff, colors & 0xff), axis=1)
+
+    return rgb.astype(np.uint8).tobytes()
+
+# Run length encodes spans of rows of palette indices all at once, span k covers
+# rows[span_rows[k], span_starts[k]:span_ends[k]]. A run starts at the start of every
+# span, wherever the value changes and every _MAX_RUN_LENGTH lights so no run can get
+# longer than that. Returns the runs of all spans in order and the run count of each.
+def _encode_spans(rows, span_rows, span_starts, span_ends, wide: bool):
+    lengths = span_ends - span_starts
+    total = int(lengths.sum())
+
+    span_ids = np.repeat(np.arange(len(lengths)), lengths)
+    offsets = np.arange(total) - (np.cumsum(lengths) - lengths)[span_ids]
+    values = rows[span_rows[span_ids], span_starts[span_ids] + offsets]
+
+    starts = offsets % _MAX_RUN_LENGTH == 0
+    starts[1:] |= values[1:] != values[:-1]
+    positions = np.nonzero(starts)[0]
+
+    runs = np.empty(len(positions), dtype=_run_dtype(wide))
+    runs['count'] = np.diff(positions, append=total)
+    runs['index'] = values[positions]
+
+    return runs, np.bincount(span_ids[positions], minlength=len(lengths))
+
+# Spans of lights that differ from the previous row, as (row, start, end) arrays sorted
+# by row and start. Gaps shorter than _MIN_SPAN_GAP are merged into the spans around them.
+def _changed_spans(rows, previous):
+    changed = np.zeros((rows.shape[0], rows.shape[1] + 2), dtype=np.int8)
+    changed[:, 1:-1] = rows != previous
+    edges = np.diff(changed, axis=1)
+
+    span_rows, starts = np.nonzero(edges == 1)
+    _, ends = np.nonzero(edges == -1)
+    if not len(span_rows):
+        return span_rows, starts, ends
+
+    merge = (span_rows[1:] == span_rows[:-1]) & (starts[1:] - ends[:-1] < _MIN_SPAN_GAP)
+    keep_start = np.concatenate(([True], ~merge))
+    keep_end = np.concatenate((~merge, [True]))
+
+    return span_rows[keep_start], starts[keep_start], ends[keep_end]
+
+# Writes a binary effect while frames arrive in chunks, so an animation never has to be
+# in memory as a whole. The palette grows as new colours show up, repeated frames are
+# collapsed across chunk boundaries and rows go to the file as soon as they are known.
+# The palette and frame index are written on close(), which also fills in the header,
+# so the file has to be seekable. With wide_indices=False palette indices take 1 byte,
+# which limits the palette to 256 colours.
+#
+# With delta=True rows only store the spans of lights that changed since the previous
+# row (ROW_DELTA). Every keyframe_interval-th row, and every row that would not get
+# smaller as a delta, is stored whole, so playback can start from those.
+class EffectWriter:
+    def __init__(self, file, metadata: dict, *, wide_indices = True, delta = False, keyframe_interval = 64):
+        self.file = file
+        self.metadata = metadata
+        self.wide = wide_indices
+        self.palette_limit = 0x10000 if wide_indices else 0x100
+        self.delta = delta
+        self.keyframe_interval = keyframe_interval
+        self.has_delta_rows = False
+        self.last_row = None
+
+        # known colours, sorted, and the palette index of each of them
+        self.known_colors = np.empty(0, dtype=np.int64)
+        self.known_indices = np.empty(0, dtype=np.int64)
+        self.palette = []
+
+        self.pending_row = None
+        self.pending_count = 0
+
+        self.header_size = struct.calcsize(HEADER_FORMAT)
+        self.row_header_dtype = np.dtype([('repeat', '<u2'), ('kind', 'u1'), ('length', '<u2')])
+        self.offset = self.header_size
+        self.row_count = 0
+        self.frame_count = 0
+        self.index = tempfile.TemporaryFile()
+
+        self.file.write(bytes(self.header_size))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        if exc[0] is None:
+            self.close()
+        else:
+            self.index.close()
+
+    def _to_indices(self, frames):
+        colors, inverse = np.unique(frames, return_inverse=True)
+
+        position = np.searchsorted(self.known_colors, colors)
+        found = position < len(self.known_colors)
+        found[found] = self.known_colors[position[found]] == colors[found]
+
+        new_colors = colors[~found]
+        if len(new_colors):
+            if len(self.palette) + len(new_colors) > self.palette_limit:
+                raise ValueError(f'More than {self.palette_limit} colours, use wide_indices=True')
+
+            new_indices = np.arange(len(self.palette), len(self.palette) + len(new_colors))
+            self.palette.extend(new_colors.tolist())
+
+            colors_sorted = np.concatenate((self.known_colors, new_colors))
+            order = np.argsort(colors_sorted, kind='stable')
+            self.known_colors = colors_sorted[order]
+            self.known_indices = np.concatenate((self.known_indices, new_indices))[order]
+
+        indices = self.known_indices[np.searchsorted(self.known_colors, colors)]
+        return np.reshape(indices[inverse], frames.shape)
+
+    # picks which rows to store as deltas and returns the spans to encode for all rows
+    def _plan_spans(self, rows):
+        row_count, light_count = rows.shape
+        all_rows = np.arange(row_count)
+        whole = (all_rows, np.zeros(row_count, dtype=np.int64), np.full(row_count, light_count))
+
+        if not self.delta:
+            return whole, np.zeros(row_count, dtype=bool)
+
+        if self.last_row is None:
+            previous = np.concatenate((rows[:1], rows[:-1]))
+        else:
+            previous = np.concatenate((self.last_row[np.newaxis], rows[:-1]))
+        span_rows, starts, ends = _changed_spans(rows, previous)
+
+        # estimate the encoded sizes from the number of value changes inside each span
+        changes = np.zeros((row_count, light_count + 1), dtype=np.int64)
+        np.cumsum(rows[:, 1:] != rows[:, :-1], axis=1, out=changes[:, 2:])
+        span_runs = changes[span_rows, ends] - changes[span_rows, np.minimum(starts + 1, light_count)] + 1
+        run_size = _run_dtype(self.wide).itemsize
+        span_size = struct.calcsize(SPAN_HEADER_FORMAT) + run_size*span_runs
+        delta_size = np.bincount(span_rows, weights=span_size, minlength=row_count)
+        whole_size = run_size*(changes[:, -1] + 1)
+
+        is_delta = (delta_size < whole_size) & ((self.row_count + all_rows) % self.keyframe_interval != 0)
+        if self.last_row is None:
+            is_delta[0] = False
+
+        keep = is_delta[span_rows]
+        whole_rows = ~is_delta
+        span_rows = np.concatenate((span_rows[keep], whole[0][whole_rows]))
+        starts = np.concatenate((starts[keep], whole[1][whole_rows]))
+        ends = np.concatenate((ends[keep], whole[2][whole_rows]))
+
+        order = np.lexsort((starts, span_rows))
+        return (span_rows[order], starts[order], ends[order]), is_delta
+
+    def _write_rows(self, counts, rows):
+        if not len(rows):
+            return
+
+        counts, rows = _split_counts(counts, rows, _MAX_ROW_REPEAT)
+        (span_rows, span_starts, span_ends), is_delta = self._plan_spans(rows)
+        runs, runs_per_span = _encode_spans(rows, span_rows, span_starts, span_ends, self.wide)
+
+        header_size = self.row_header_dtype.itemsize
+        span_header_size = struct.calcsize(SPAN_HEADER_FORMAT)
+        run_size = runs.dtype.itemsize
+
+        # byte sizes and positions of every span, row and run in the output
+        span_delta = is_delta[span_rows]
+        span_sizes = runs_per_span*run_size + span_delta*span_header_size
+        payload_sizes = np.bincount(span_rows, weights=span_sizes, minlength=len(rows)).astype(np.int64)
+        row_sizes = payload_sizes + header_size
+        row_starts = np.cumsum(row_sizes) - row_sizes
+
+        span_before = np.cumsum(span_sizes) - span_sizes
+        row_first_span = np.cumsum(payload_sizes) - payload_sizes
+        span_positions = row_starts[span_rows] + header_size + span_before - row_first_span[span_rows]
+
+        run_spans = np.repeat(np.arange(len(span_sizes)), runs_per_span)
+        run_rank = np.arange(len(runs)) - (np.cumsum(runs_per_span) - runs_per_span)[run_spans]
+        run_positions = span_positions[run_spans] + span_delta[run_spans]*span_header_size + run_rank*run_size
+
+        headers = np.empty(len(rows), dtype=self.row_header_dtype)
+        headers['repeat'] = counts
+        headers['kind'] = np.where(is_delta, ROW_DELTA, ROW_RUNS)
+        headers['length'] = payload_sizes
+
+        first_frames = self.frame_count + np.concatenate(([0], np.cumsum(counts)[:-1]))
+        index = np.empty(len(rows), dtype=[('frame', '<u4'), ('offset', '<u4')])
+        index['frame'] = first_frames
+        index['offset'] = self.offset + row_starts
+        self.index.write(index.tobytes())
+
+        # scatter the row headers, span headers and runs into one buffer
+        out = np.empty(int(row_sizes.sum()), dtype=np.uint8)
+        out[row_starts[:, np.newaxis] + np.arange(header_size)] = headers.view(np.uint8).reshape(-1, header_size)
+
+        if span_delta.any():
+            span_headers = np.empty(int(span_delta.sum()), dtype=[('start', '<u2'), ('length', '<u2')])
+            span_headers['start'] = span_starts[span_delta]
+            span_headers['length'] = runs_per_span[span_delta]*run_size
+            out[span_positions[span_delta][:, np.newaxis] + np.arange(span_header_size)] = span_headers.view(np.uint8).reshape(-1, span_header_size)
+            self.has_delta_rows = True
+
+        out[run_positions[:, np.newaxis] + np.arange(run_size)] = runs.view(np.uint8).reshape(-1, run_size)
+
+        self.file.write(out.tobytes())
+
+        self.offset += int(row_sizes.sum())
+        self.frame_count += int(counts.sum())
+        self.row_count += len(rows)
+        self.last_row = rows[-1]
+
+    def write(self, frames):
+        frames = np.atleast_2d(np.asarray(frames))
+        if not len(frames):
+            return
+
+        counts, rows = _collapse_duplicate_rows(self._to_indices(frames))
+
+        # the first row of the chunk may continue the last row of the previous one
+        if self.pending_row is not None and np.array_equal(self.pending_row, rows[0]):
+            counts[0] += self.pending_count
+        elif self.pending_row is not None:
+            self._write_rows(np.array([self.pending_count]), self.pending_row[np.newaxis])
+
+        self._write_rows(counts[:-1], rows[:-1])
+        self.pending_row = rows[-1]
+        self.pending_count = int(counts[-1])
+
+    def close(self):
+        if self.pending_row is not None:
+            self._write_rows(np.array([self.pending_count]), self.pending_row[np.newaxis])
+            self.pending_row = None
+
+        palette_offset = self.offset
+        palette = _pack_palette(self.palette)
+        self.file.write(palette)
+
+        index_offset = palette_offset + len(palette)
+        self.index.seek(0)
+        shutil.copyfileobj(self.index, self.file)
+        self.index.close()
+
+        self.file.seek(0)
+        self.file.write(struct.pack(
+            HEADER_FORMAT,
+            MAGIC,
+            VERSION,
+            (FLAG_WIDE_INDICES if self.wide else 0) | (FLAG_DELTA_ROWS if self.has_delta_rows else 0),
+            self.metadata['light_count'],
+            self.metadata['frame_delay_ms'],
+            len(self.palette),
+            self.row_count,
+            self.frame_count,
+            palette_offset,
+            index_offset,
+        ))
+        self.file.seek(0, 2)
+
+# Writes a binary effect from an iterable of frame chunks (2d arrays of colour ints,
+# one row per frame), keeping only one chunk in memory at a time
+def serialize_stream(file, chunks, metadata: dict, *, wide_indices = True, delta = False, keyframe_interval = 64):
+    with EffectWriter(file, metadata, wide_indices=wide_indices, delta=delta, keyframe_interval=keyframe_interval) as writer:
+        for chunk in chunks:
+            writer.write(chunk)
+
+# delta and keyframe_interval only apply to the binary format, see EffectWriter. With
+# max_colors set the colours are first quantized to at most that many, see quantize.py.
+def serialize(file: TextIOWrapper, lights, metadata: dict, *, binary = False, delta = False, keyframe_interval = 64, max_colors = None):
+    if max_colors is not None:
+        lights = quantize(lights, max_colors)
+
     color_table, color_indices = np.unique(lights, return_inverse=True)
     color_indices = np.reshape(color_indices, lights.shape)
 
+    if binary:
+        with EffectWriter(file, metadata, wide_indices=len(color_table) > 256, delta=delta, keyframe_interval=keyframe_interval) as writer:
+            writer.write(lights)
+        return
+
     metadata['colors'] = color_table.tolist()
 
     counts, unique_rows = _collapse_duplicate_rows(color_indices)
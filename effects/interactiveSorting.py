@@ -1,3 +1,18 @@
+import numpy as np
+
+# Runs sortAlg on a copy of values and returns every state it went through (one row
+# per onUpdate call, plus the initial one and holdFrames copies of the sorted one).
+# Sorting itself is cheap, so recording the states up front lets the slow part, turning
+# them into colours, be split across processes by render_driver.
+def recordSort(sortAlg, values, holdFrames = 0):
+    arr = list(values)
+    states = [arr.copy()]
+
+    sortAlg(arr, lambda: states.append(arr.copy()))
+
+    states.extend(states[-1:]*holdFrames)
+    return np.array(states)
+
 def heapSort(arr, onUpdate):
     def heapify(arr, n, i):
         largest = i
@@ -0,0 +1,113 @@
+import numpy as np
+
+# Limits the colours of an effect to a fixed size palette, so smooth gradients don't
+# produce palettes of thousands of entries. Distances are measured in CIELAB, where
+# equal distances look roughly equally different. The palette is seeded by median cut
+# and refined with a few k-means iterations, all on the unique colours weighted by how
+# often they occur. Every palette entry is one of the input colours (the one closest to
+# its cluster's centre), so solid colours come through unchanged.
+#
+# For streamed effects build the palette once from a representative sample and map
+# every chunk with map_to_palette.
+
+# distances are computed in blocks of this many colours to bound memory
+_BLOCK_SIZE = 4096
+
+def _split_channels(colors):
+    colors = np.asarray(colors, dtype=np.int64)
+    return np.stack(((colors >> 16) & 0xff, (colors >> 8) & 0xff, colors & 0xff), axis=-1)
+
+def to_lab(colors):
+    rgb = _split_channels(colors)/255
+    linear = np.where(rgb <= 0.04045, rgb/12.92, ((rgb + 0.055)/1.055)**2.4)
+
+    # sRGB -> XYZ, normalised to the D65 white point
+    xyz = linear @ np.array([
+        [0.4124, 0.2126, 0.0193],
+        [0.3576, 0.7152, 0.1192],
+        [0.1805, 0.0722, 0.9505],
+    ])
+    xyz /= np.array([0.9505, 1.0, 1.089])
+
+    f = np.where(xyz > (6/29)**3, np.cbrt(xyz), xyz/(3*(6/29)**2) + 4/29)
+
+    return np.stack((
+        116*f[..., 1] - 16,
+        500*(f[..., 0] - f[..., 1]),
+        200*(f[..., 1] - f[..., 2]),
+    ), axis=-1)
+
+def _nearest(points, centers):
+    # |p - c|^2 = |p|^2 - 2 p.c + |c|^2, and |p|^2 doesn't change which c is closest
+    center_norms = (centers**2).sum(axis=1)
+
+    nearest = np.empty(len(points), dtype=np.int64)
+    for start in range(0, len(points), _BLOCK_SIZE):
+        block = points[start:start + _BLOCK_SIZE]
+        nearest[start:start + _BLOCK_SIZE] = np.argmin(center_norms - 2*(block @ centers.T), axis=1)
+    return nearest
+
+# the weighted spread of a box along its widest axis, and that axis
+def _spread(points, weights, box):
+    if len(box) < 2:
+        return 0, 0
+
+    extent = np.ptp(points[box], axis=0)
+    axis = int(np.argmax(extent))
+    return extent[axis]*weights[box].sum(), axis
+
+def _median_cut(points, weights, max_colors: int):
+    boxes = [np.arange(len(points))]
+    spreads = [_spread(points, weights, boxes[0])]
+
+    while len(boxes) < max_colors:
+        i = max(range(len(boxes)), key=lambda j: spreads[j][0])
+        if spreads[i][0] == 0:
+            break
+
+        # split the widest box at the weighted median of its widest axis
+        box = boxes[i]
+        axis = spreads[i][1]
+        order = box[np.argsort(points[box, axis], kind='stable')]
+        cumulative = np.cumsum(weights[order])
+        split = int(np.searchsorted(cumulative, cumulative[-1]/2))
+        split = min(max(split, 1), len(order) - 1)
+
+        boxes[i:i+1] = [order[:split], order[split:]]
+        spreads[i:i+1] = [_spread(points, weights, order[:split]), _spread(points, weights, order[split:])]
+
+    return np.array([np.average(points[box], axis=0, weights=weights[box]) for box in boxes])
+
+# Picks up to max_colors colours for the given colour ints, weights default to how
+# often each colour occurs
+def build_palette(colors, max_colors: int, *, iterations = 4):
+    colors, counts = np.unique(np.asarray(colors, dtype=np.int64), return_counts=True)
+
+    if len(colors) <= max_colors:
+        return colors
+
+    points = to_lab(colors)
+    weights = counts.astype(np.float64)
+    centers = _median_cut(points, weights, max_colors)
+
+    for _ in range(iterations):
+        nearest = _nearest(points, centers)
+        totals = np.bincount(nearest, weights=weights, minlength=len(centers))
+        used = totals > 0
+        for axis in range(3):
+            centers[used, axis] = np.bincount(nearest, weights=weights*points[:, axis], minlength=len(centers))[used]/totals[used]
+        centers = centers[used]
+
+    # snap every centre to the input colour closest to it
+    return np.unique(colors[_nearest(centers, points)])
+
+# Replaces every colour with the perceptually closest palette entry
+def map_to_palette(lights, palette):
+    lights = np.asarray(lights)
+    colors, inverse = np.unique(lights, return_inverse=True)
+    mapped = np.asarray(palette)[_nearest(to_lab(colors), to_lab(palette))]
+
+    return np.reshape(mapped[inverse], lights.shape)
+
+def quantize(lights, max_colors: int, *, iterations = 4):
+    return map_to_palette(lights, build_palette(lights, max_colors, iterations=iterations))
@@ -0,0 +1,59 @@
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from effect_serializer import serialize, serialize_stream
+
+# Offline rendering of effects over several processes.
+#
+# render_effect splits one effect into jobs (frame ranges, slices of recorded states,
+# ...), renders them in a process pool and merges the parts into a single effect in
+# job order. The palette is built from the parts in that order too, so the output only
+# depends on how the effect is split into jobs and never on the worker count.
+#
+# render_sweep renders independent effects (a parameter sweep), one file per effect.
+#
+# Renderers run in the worker processes, so they have to be picklable: module level
+# functions, or functools.partial of one.
+
+# (start, stop) frame ranges of at most `chunk` frames covering the whole effect
+def frame_ranges(frame_count: int, chunk: int):
+    return [(start, min(start + chunk, frame_count)) for start in range(0, frame_count, chunk)]
+
+# Splits an array of per frame data (e.g. recorded sort states) into jobs of at most
+# `chunk` frames
+def frame_chunks(data, chunk: int):
+    return [data[start:stop] for start, stop in frame_ranges(len(data), chunk)]
+
+def _render_part(render, job):
+    return np.atleast_2d(np.around(render(job)).astype(np.int64))
+
+# render(job) returns the frames of one job as a 2d array of colour ints, one row per
+# frame. Parts are written as they arrive when binary, the text format needs the
+# whole effect for its palette.
+def render_effect(file, render, jobs, metadata: dict, *, workers = None, binary = True):
+    with ProcessPoolExecutor(workers) as pool:
+        parts = pool.map(_render_part, [render]*len(jobs), jobs)
+
+        if binary:
+            serialize_stream(file, parts, metadata)
+        else:
+            serialize(file, np.concatenate(list(parts)), metadata)
+
+def _render_file(render, target: str, binary: bool, param):
+    lights, metadata, name = render(param)
+    lights = np.around(lights).astype(int)
+    metadata.setdefault('light_count', np.size(lights, axis=1))
+
+    path = target.format(name)
+    with open(path, 'wb' if binary else 'w') as f:
+        serialize(f, lights, metadata, binary=binary)
+
+    return path
+
+# render(param) returns (lights, metadata, effect name) like the generators in
+# generate.ipynb, every result is written to target.format(effect name). Returns the
+# written paths in the order of params.
+def render_sweep(render, params, target: str, *, workers = None, binary = False):
+    params = list(params)
+
+    with ProcessPoolExecutor(workers) as pool:
+        return list(pool.map(_render_file, [render]*len(params), [target]*len(params), [binary]*len(params), params))
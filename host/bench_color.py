@@ -0,0 +1,68 @@
+# Allocations and time per colour transition, comparing the allocating blend()
+# with the in place blend_into() used by Light.
+#
+#   python host/bench_color.py [--frames 17] [--transitions 2000]
+import argparse
+import time
+import tracemalloc
+
+import pico_env
+from Color import Color
+
+created = 0
+_new = Color.__new__
+
+def counting_new(cls, *args, **kwargs):
+    global created
+    created += 1
+    return _new(cls)
+
+Color.__new__ = counting_new # type: ignore
+
+def transition_blend(start, target, frames):
+    color = start
+    for frame in range(frames + 1):
+        color = start.blend(target, frame/frames)
+    return color
+
+def transition_blend_into(color, start, target, frames):
+    for frame in range(frames + 1):
+        color.blend_into(start, target, (frame << 8) // frames)
+    return color
+
+def measure(run, transitions):
+    global created
+    created = 0
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    for _ in range(transitions):
+        run()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return created/transitions, peak, elapsed/transitions*1e6
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--frames', type=int, default=17)
+    parser.add_argument('--transitions', type=int, default=2000)
+    args = parser.parse_args()
+
+    start = Color.rgb(255, 40, 0)
+    target = Color.rgb(0, 90, 255)
+    color = Color()
+
+    assert transition_blend(start, target, args.frames) == transition_blend_into(color, start, target, args.frames) == target
+
+    print(f'{args.frames} frame transitions')
+    for name, run in (
+        ('blend', lambda: transition_blend(start, target, args.frames)),
+        ('blend_into', lambda: transition_blend_into(color, start, target, args.frames)),
+    ):
+        colors, peak, us = measure(run, args.transitions)
+        print(f'{name:>10}: {colors:5.1f} Color objects per transition, peak {peak:6} B traced, {us:6.1f} us')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+# Parsing Home Assistant light commands with CommandParser into a preallocated
+# LightCommand against what lights did before: decode, ujson.loads
+# and Color.from_dict. First checks the parser reads every field as json does, that
+# malformed messages (bad escapes in effect names too) are rejected and that no
+# truncation of a valid one raises.
+# Memory is the peak allocated while parsing one message; CPython boxes ints above
+# 256 (the packed colour, thousandths of a number), MicroPython keeps them unboxed.
+#
+#   python host/bench_command_parser.py [--messages 20000]
+import argparse
+import json
+import random
+import time
+import tracemalloc
+
+import pico_env
+import ujson
+from Color import Color
+from light_command import ABSENT, EFFECT_CLEAR, EFFECT_UNKNOWN, CommandParser, LightCommand
+
+EFFECTS = ['Fire', 'Rainbow wave', 'Twinkle', 'Ünicode']
+EFFECT_NAMES = [effect.encode() for effect in EFFECTS]
+
+def random_message(rng):
+    message = {}
+    while not message:
+        if rng.random() < 0.3:
+            message['state'] = rng.choice(['ON', 'OFF'])
+        if rng.random() < 0.6:
+            message['brightness'] = rng.randrange(0, 256)
+        if rng.random() < 0.3:
+            message['color'] = {'r': rng.randrange(256), 'g': rng.randrange(256), 'b': rng.randrange(256)}
+        if rng.random() < 0.2:
+            message['effect'] = rng.choice(EFFECTS + ['Missing', None])
+        if rng.random() < 0.2:
+            message['transition'] = rng.choice([0, 1, 2.5, 0.25, 10])
+        if rng.random() < 0.1:
+            message['color_temp'] = rng.randrange(153, 500)
+        if rng.random() < 0.05:
+            message['flash'] = 'short'
+    separators = rng.choice([(',', ':'), (', ', ': ')])
+    return json.dumps(message, separators=separators, ensure_ascii=rng.random() < 0.5).encode()
+
+# what the parser should make of a message, from json.loads
+def expected(raw):
+    message = json.loads(raw)
+    command = LightCommand()
+    if 'state' in message:
+        command.state = 1 if message['state'] == 'ON' else 0
+    if 'brightness' in message:
+        command.brightness = message['brightness']
+    if 'color' in message:
+        color = message['color']
+        command.color = color['r'] << 16 | color['g'] << 8 | color['b']
+    if 'effect' in message:
+        effect = message['effect']
+        command.effect = EFFECT_CLEAR if effect is None else EFFECTS.index(effect) if effect in EFFECTS else EFFECT_UNKNOWN
+    if 'transition' in message:
+        command.transition_ms = int(message['transition']*1000)
+    return command
+
+def fields(command):
+    return command.state, command.brightness, command.color, command.effect, command.transition_ms
+
+def check(messages):
+    parser = CommandParser()
+    command = LightCommand()
+
+    for raw in messages:
+        assert parser.parse(raw, command, EFFECT_NAMES), raw
+        assert fields(command) == fields(expected(raw)), (raw, fields(command))
+        assert parser.parse(memoryview(raw), command, EFFECT_NAMES), raw
+
+        for end in range(len(raw) - 1):
+            assert not parser.parse(raw[:end], command, EFFECT_NAMES), raw[:end]
+
+    for raw in (b'', b'[]', b'"ON"', b'{"state": ON}', b'{"brightness": "x"}', b'{"brightness": 1e3}', b'{} x', b'{"a" 1}'):
+        assert not parser.parse(raw, command, EFFECT_NAMES), raw
+
+    # effect names with escapes are decoded with ujson, bad escapes reject the message
+    for raw in (rb'{"effect": "\q"}', rb'{"effect": "\u12"}', b'{"effect": "\\\xff"}'):
+        assert not parser.parse(raw, command, EFFECT_NAMES), raw
+    assert parser.parse(rb'{"effect": "\u00dcnicode"}', command, EFFECT_NAMES) and command.effect == 3
+
+    # brightness is clamped like the colour channels
+    for raw, brightness in ((b'{"brightness": 300}', 255), (b'{"brightness": -5}', 0), (b'{"brightness": 255.9}', 255)):
+        assert parser.parse(raw, command, EFFECT_NAMES) and command.brightness == brightness, raw
+
+def parse_ujson(raw, parser, command):
+    message = ujson.loads(raw.decode())
+    color = message.get('color')
+    if color:
+        Color.from_dict(color)
+
+def parse_in_place(raw, parser, command):
+    parser.parse(raw, command, EFFECT_NAMES)
+
+def measure(parse, messages):
+    parser = CommandParser()
+    command = LightCommand()
+
+    start = time.perf_counter()
+    for raw in messages:
+        parse(raw, parser, command)
+    elapsed = time.perf_counter() - start
+
+    peaks = []
+    tracemalloc.start()
+    for raw in messages[:500]:
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        parse(raw, parser, command)
+        peaks.append(tracemalloc.get_traced_memory()[1] - before)
+    tracemalloc.stop()
+
+    return len(messages)/elapsed, sum(peaks)/len(peaks), max(peaks)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--messages', type=int, default=20000)
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    messages = [random_message(rng) for _ in range(args.messages)]
+
+    check(messages[:2000])
+    print('parser reads every message as json does and rejects malformed ones')
+
+    print(f'{args.messages} messages, {sum(map(len, messages))/len(messages):.0f} bytes on average')
+    for label, parse in (('ujson', parse_ujson), ('CommandParser', parse_in_place)):
+        per_second, average, worst = measure(parse, messages)
+        print(f'{label:>14}: {per_second:9.0f} messages/s, {average:6.0f} bytes peak on average, {worst:5} at most')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+# Per tick cost of the compositor with the strip split into segments, some of them
+# running an effect and the rest showing a solid colour, against the single light
+# path (one segment over the whole strip). Only the time spent in Compositor.tick is
+# counted; effects are procedural so no files are involved.
+#
+#   python host/bench_compositor.py [--leds 300] [--segments 6] [--ticks 300]
+import argparse
+import asyncio
+import time
+
+import pico_env
+from Color import Color
+from color_pipeline import OutputStage
+from compositor import Compositor, LightSegment
+from dma_output import DmaStripManager
+from procedural_effects import procedural_effects
+from transitions import TransitionScheduler
+
+class BenchLight:
+    def __init__(self, effect):
+        self.effect = effect
+        self.color = Color.rgb(255, 64, 0)
+        self.brightness = 200
+        self.transitions = TransitionScheduler()
+
+    def tick(self, now_ms: int) -> bool:
+        return self.transitions.tick(self, now_ms)
+
+def open_effect(effect_name, segment):
+    return procedural_effects[effect_name](segment.view.count, segment.light.color)
+
+async def run(leds: int, segment_count: int, active: int, ticks: int):
+    lights = DmaStripManager([(0, leds)])
+    stage = OutputStage()
+    size = leds // segment_count
+    segments = [
+        LightSegment(BenchLight('Rainbow wave' if i < active else None), lights.segment(i*size, size), stage.shared_with())
+        for i in range(segment_count)
+    ]
+    compositor = Compositor(lights, segments, open_effect)
+    clock = pico_env.clock
+
+    spent = 0
+    for _ in range(ticks):
+        start = time.perf_counter()
+        due_in = compositor.tick(time.ticks_ms())
+        spent += time.perf_counter() - start
+
+        await clock.sleep_us(max(due_in, 1)*1000)
+        if compositor.dirty:
+            await lights.wait_done()
+            lights.show()
+
+    for segment in segments:
+        segment.stop_effect()
+
+    return spent/ticks*1e6, compositor.rendered/ticks, compositor.copied/ticks
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--leds', type=int, default=300)
+    parser.add_argument('--segments', type=int, default=6)
+    parser.add_argument('--ticks', type=int, default=300)
+    args = parser.parse_args()
+
+    print(f'{args.leds} leds, per tick cost over {args.ticks} ticks')
+    scenarios = [('single light, effect', 1, 1), ('single light, solid', 1, 0)]
+    scenarios += [(f'{args.segments} segments, {active} active', args.segments, active) for active in range(args.segments + 1)]
+
+    for label, segment_count, active in scenarios:
+        us, rendered, copied = asyncio.run(run(args.leds, segment_count, active, args.ticks))
+        print(f'{label:>26}: {us:8.1f} us/tick, {rendered:4.2f} segments rendered and {copied:4.2f} copied per tick')
+
+if __name__ == '__main__':
+    main()
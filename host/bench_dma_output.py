@@ -0,0 +1,92 @@
+# Simulates the render loop with a blocking show() and with DmaStripManager, where the
+# next frame is rendered while the current one is sent. Render work and the time the
+# chains take to send a frame are both modelled on the virtual clock, so the numbers
+# are simulated frame periods. Also checks that every chain receives the frames in the
+# order they were shown, that no transfer is torn by writes to the buffer being sent,
+# and that writing to that buffer is caught.
+#
+#   python host/bench_dma_output.py [--leds 300] [--strips 1 2] [--render-us 2000 6000 12000]
+import argparse
+import asyncio
+
+import pico_env
+from fake_dma import DMA
+from color_pipeline import OutputStage
+from frame_writer import FrameWriter
+from strip_manager import StripManager
+from dma_output import DmaStripManager, WORD_US
+
+FRAMES = 50
+
+def frame_bytes(n: int, led_count: int):
+    return bytearray((n*7 + i) & 0xff for i in range(led_count*3))
+
+async def blocking_loop(manager, render_us: int):
+    writer = FrameWriter(manager, OutputStage(gamma=1))
+    clock = pico_env.clock
+    transfer_us = max(strip.count for strip in manager.strips)*WORD_US + manager.latch_us
+
+    start = clock.now_us()
+    for n in range(FRAMES):
+        await clock.sleep_us(render_us)
+        writer.write(frame_bytes(n, manager.led_count), 255)
+        manager.show()
+        # the cpu is stuck in show() until the frame is out
+        await clock.sleep_us(transfer_us)
+    return (clock.now_us() - start)/FRAMES
+
+async def dma_loop(manager, render_us: int, tear = False):
+    writer = FrameWriter(manager, OutputStage(gamma=1))
+    clock = pico_env.clock
+    expected = [[] for _ in manager.strips]
+
+    start = clock.now_us()
+    for n in range(FRAMES):
+        await clock.sleep_us(render_us)
+        writer.write(frame_bytes(n, manager.led_count), 255)
+        if tear:
+            # wrong on purpose: write over the frame that is being sent
+            front = manager.buffers[manager.back ^ 1]
+            front[0] ^= 1
+
+        await manager.wait_done()
+        for strip, words in zip(manager.strips, expected):
+            words.extend(manager.pixels[strip.start:strip.start + strip.count])
+        manager.show()
+    await manager.wait_done()
+    period = (clock.now_us() - start)/FRAMES
+
+    channels = [channel[0] for channel in manager.channels]
+    for (dma, _, fifo, _), words in zip(manager.channels, expected):
+        assert dma.sent[fifo] == words, 'frames arrived out of order'
+
+    return period, sum(dma.torn for dma in channels)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--leds', type=int, default=300)
+    parser.add_argument('--strips', type=int, nargs='+', default=[1, 2])
+    parser.add_argument('--render-us', type=int, nargs='+', default=[2000, 6000, 12000])
+    args = parser.parse_args()
+
+    DMA.record = True
+
+    print(f'{args.leds} leds, simulated frame period over {FRAMES} frames')
+    for strips in args.strips:
+        config = [(i, args.leds // strips) for i in range(strips)]
+        for render_us in args.render_us:
+            blocking = asyncio.run(blocking_loop(StripManager(config), render_us))
+            dma, torn = asyncio.run(dma_loop(DmaStripManager(config), render_us))
+            assert torn == 0, 'a frame was overwritten while being sent'
+
+            print(
+                f'{strips} chains, render {render_us/1000:5.1f} ms: blocking show {blocking/1000:6.2f} ms, '
+                f'dma {dma/1000:6.2f} ms ({100*(1 - dma/blocking):4.1f}% shorter)'
+            )
+
+    _, torn = asyncio.run(dma_loop(DmaStripManager([(0, args.leds)]), 2000, tear=True))
+    assert torn > 0, 'writes to the buffer being sent went unnoticed'
+    print(f'frames arrive in order, writing to the buffer being sent tears {torn} of {FRAMES} transfers')
+
+if __name__ == '__main__':
+    main()
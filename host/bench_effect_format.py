@@ -0,0 +1,110 @@
+# Compares playback of the text and binary effect formats, and binary with delta rows,
+# on the host.
+#
+#   python host/bench_effect_format.py [--lights 100] [--frames 3000] [--effect blocks|sort]
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+import pico_env
+import numpy as np
+
+from effect_serializer import serialize
+from effect_reader import effect_reader, binary_effect_reader
+from interactiveSorting import recordSort, bubbleSort
+
+def synthetic_effect(frames: int, light_count: int):
+    # a handful of moving colour blocks over a dim background, with some held frames
+    rng = np.random.default_rng(0)
+    colors = rng.integers(0, 0xffffff, size=16)
+    lights = np.full((frames, light_count), 0x050505)
+
+    for i in range(frames):
+        step = i // 2
+        for j, color in enumerate(colors):
+            start = (step + j*light_count // len(colors)) % light_count
+            lights[i, start:start + 4] = color
+
+    return lights
+
+def sort_effect(frames: int, light_count: int):
+    # a bubble sort visualisation, only a couple of lights change between frames
+    values = np.random.default_rng(0).random(light_count)
+    states = recordSort(bubbleSort, values)[:frames]
+    levels = np.around(states*255).astype(int)
+
+    return (levels << 16) | (levels//4 << 8) | (255 - levels)
+
+effects = {'blocks': synthetic_effect, 'sort': sort_effect}
+
+def consume_text(frame):
+    total = 0
+    for val in frame:
+        total += val
+    return total
+
+def consume_binary(frame):
+    return frame[0]
+
+def bench(reader, consume, frames: int):
+    it = reader.read_frames()
+    next(it)
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    for _ in range(frames):
+        consume(next(it))
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return frames/elapsed, peak
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--lights', type=int, default=100)
+    parser.add_argument('--frames', type=int, default=3000)
+    parser.add_argument('--effect', choices=effects, default='blocks')
+    args = parser.parse_args()
+
+    lights = effects[args.effect](args.frames, args.lights)
+    frames = len(lights)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        text_path = os.path.join(tmp, 'bench.effect')
+        binary_path = os.path.join(tmp, 'bench.bfx')
+        delta_path = os.path.join(tmp, 'delta.bfx')
+
+        with open(text_path, 'w') as f:
+            serialize(f, lights, {'frame_delay_ms': 30, 'light_count': args.lights})
+
+        with open(binary_path, 'wb') as f:
+            serialize(f, lights, {'frame_delay_ms': 30, 'light_count': args.lights}, binary=True)
+
+        with open(delta_path, 'wb') as f:
+            serialize(f, lights, {'frame_delay_ms': 30, 'light_count': args.lights}, binary=True, delta=True)
+
+        # sanity check: all formats decode to the same frames
+        text_frames = effect_reader(text_path, 'bench').read_frames()
+        binary_frames = binary_effect_reader(binary_path, 'bench').read_frames()
+        delta_frames = binary_effect_reader(delta_path, 'bench').read_frames()
+        for expected in lights[:200]:
+            text = list(next(text_frames))
+            for binary in (next(binary_frames), next(delta_frames)):
+                decoded = [(binary[i] << 16) | (binary[i+1] << 8) | binary[i+2] for i in range(0, len(binary), 3)]
+                assert text == decoded == expected.tolist()
+
+        print(f'{args.effect}: {frames} frames, {args.lights} lights')
+        for name, path, reader, consume in (
+            ('text', text_path, effect_reader, consume_text),
+            ('binary', binary_path, binary_effect_reader, consume_binary),
+            ('delta', delta_path, binary_effect_reader, consume_binary),
+        ):
+            fps, peak = bench(reader(path, 'bench'), consume, frames)
+            size = os.path.getsize(path)
+            print(f'{name:>8}: {fps:10.0f} frames/s, peak {peak/1024:7.1f} KiB allocated, {size/1024:8.1f} KiB on disk')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+# Per frame cost of pushing a frame with set_pixel calls versus FrameWriter.
+#
+#   python host/bench_frame_writer.py [--frames 200]
+import argparse
+import os
+import time
+
+import pico_env
+from fake_neopixel import Neopixel
+from frame_writer import FrameWriter
+from color_pipeline import OutputStage
+
+def push_set_pixel(lights, frame, brightness):
+    for i in range(len(frame) // 3):
+        j = i*3
+        lights.set_pixel(i, (frame[j] << 16) | (frame[j+1] << 8) | frame[j+2], brightness)
+
+def time_per_frame(push, frames):
+    start = time.perf_counter()
+    for frame in frames:
+        push(frame)
+    return (time.perf_counter() - start) / len(frames) * 1e6
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--frames', type=int, default=200)
+    args = parser.parse_args()
+
+    for led_count in (100, 300, 1000):
+        frames = [bytearray(os.urandom(led_count*3)) for _ in range(args.frames)]
+
+        lights = Neopixel(num_leds=led_count, state_machine=0, pin=22, mode='GRB')
+        # gamma 1 so the output matches what set_pixel produces
+        writer = FrameWriter(lights, OutputStage(gamma=1.0))
+
+        # both paths have to produce the same words
+        for brightness in (255, 128, 7):
+            push_set_pixel(lights, frames[0], brightness)
+            expected = lights.pixels[:]
+            writer.write(frames[0], brightness)
+            diff = max(abs(a - b) for a, b in zip(expected, lights.pixels))
+            assert diff <= 0x010101, (brightness, diff)
+
+        set_pixel_us = time_per_frame(lambda f: push_set_pixel(lights, f, 200), frames)
+        writer_us = time_per_frame(lambda f: writer.write(f, 200), frames)
+
+        print(
+            f'{led_count:5} leds: set_pixel {set_pixel_us:8.1f} us/frame, '
+            f'FrameWriter {writer_us:8.1f} us/frame ({set_pixel_us/writer_us:4.1f}x)'
+        )
+
+if __name__ == '__main__':
+    main()
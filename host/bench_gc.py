@@ -0,0 +1,101 @@
+# Late frames caused by garbage collection pauses, with the collector left to the
+# allocator, with gc.threshold() alone and with GcManager collecting in the slack
+# left at the end of a frame. The frame loop mirrors lights_main: every frame takes a
+# random render time and allocates a number of bytes on a SimulatedHeap, whose
+# collections advance the virtual clock, then sleeps until the next frame is due.
+# Effects differ in what they keep live (the effect cache, decoded rows), how much
+# they allocate per frame and how long a frame takes to render.
+#
+#   python host/bench_gc.py [--seconds 300] [--seed 1]
+import argparse
+import random
+
+import pico_env
+from fake_gc import SimulatedHeap
+from frame_profiler import FrameProfiler
+from gc_manager import GcManager
+
+FRAME_DURATION_MS = 30
+
+# name, KiB live, bytes allocated per frame, render time range in ms
+EFFECTS = (
+    ('text effect', 60, 2048, (14, 28)),
+    ('cached binary', 110, 384, (8, 24)),
+    ('procedural', 40, 1024, (18, 29)),
+)
+
+def run(effect, policy: str, frames: int, seed: int):
+    _, live_kib, per_frame, (render_min, render_max) = effect
+    heap = SimulatedHeap(live=live_kib*1024).install()
+    clock = pico_env.clock
+    fast = clock.fast
+    clock.fast = True
+
+    try:
+        profiler = FrameProfiler(enabled=True)
+        manager = None
+        if policy == 'threshold':
+            heap.threshold(96*1024)
+        elif policy == 'GcManager':
+            manager = GcManager(profiler)
+            manager.begin(effect[0])
+
+        rng = random.Random(seed)
+        late = 0
+        worst_us = 0
+
+        for _ in range(frames):
+            tick_start_us = clock.now_us()
+
+            # rendering allocates as it goes, a collection can land anywhere in it
+            render_us = rng.randint(render_min*1000, render_max*1000)
+            for _ in range(4):
+                clock.offset_us += render_us // 4
+                heap.allocate(per_frame // 4)
+
+            # in us, lights_main has ms but rounding would hide sub-ms overruns
+            delay_us = FRAME_DURATION_MS*1000 - (clock.now_us() - tick_start_us)
+            if manager and manager.idle(delay_us):
+                delay_us = FRAME_DURATION_MS*1000 - (clock.now_us() - tick_start_us)
+
+            if delay_us < 0:
+                late += 1
+                worst_us = max(worst_us, -delay_us)
+            else:
+                clock.offset_us += delay_us
+
+        return {
+            'late': late,
+            'worst_ms': worst_us / 1000,
+            'automatic': heap.automatic,
+            'explicit': heap.explicit,
+            'pause_ms': heap.pause_us / 1000,
+            'deferred': manager.deferred if manager else 0,
+            'free_min': manager.summary()['effect_free_min'] if manager else None,
+        }
+    finally:
+        clock.fast = fast
+        heap.uninstall()
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--seconds', type=int, default=300)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    frames = args.seconds*1000 // FRAME_DURATION_MS
+    print(f'{frames} frames of {FRAME_DURATION_MS} ms')
+    for effect in EFFECTS:
+        pause_ms = SimulatedHeap(live=effect[1]*1024).pause() / 1000
+        print(f'{effect[0]}: {effect[1]} KiB live, {effect[2]} B per frame, {pause_ms:.1f} ms per collection')
+        for policy in ('allocator', 'threshold', 'GcManager'):
+            result = run(effect, policy, frames, args.seed)
+            free_min = '' if result['free_min'] is None else f', {result["free_min"] // 1024} KiB free at least'
+            print(
+                f'{policy:>12}: {result["late"]:4} late frames, {result["worst_ms"]:4.1f} ms worst, '
+                f'{result["automatic"]:3} allocator + {result["explicit"]:3} idle collections '
+                f'({result["pause_ms"]:6.0f} ms), {result["deferred"]:4} deferred{free_min}'
+            )
+
+if __name__ == '__main__':
+    main()
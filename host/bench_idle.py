@@ -0,0 +1,106 @@
+# How often the lights_main loop from pico/main.py wakes up and shows a frame over
+# a stretch of virtual time, and the cpu time its ticks take, for a light that
+# stays on one colour, one that gets a command now and then (with the default
+# transition and with "transition": 0), and effects with and without repeated rows. Before dirty tracking every case woke and showed a frame
+# every frame_duration_ms.
+#
+#   python host/bench_idle.py [--seconds 60] [--command-every 10]
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+import pico_env
+from fake_dma import DMA
+from effect_serializer import serialize
+from bench_effect_format import synthetic_effect
+
+# virtual sleeps add up, so only lights_main sleeps and the others poll the clock
+async def send_commands(main, every_ms: int, transition: bytes):
+    clock = pico_env.clock
+    light = main.ha_lights[0]
+    brightness = 100
+    next_us = clock.now_us()
+    while True:
+        next_us += every_ms*1000
+        while clock.now_us() < next_us:
+            await asyncio.sleep(0)
+        brightness = 355 - brightness
+        main.commands.receive(light.command_topic, b'{"brightness": %d%s}' % (brightness, transition))
+
+async def run_for(main, seconds: int, command_every_ms, transition):
+    clock = pico_env.clock
+    channels = len(DMA.instances)
+    end_us = clock.now_us() + seconds*1_000_000
+
+    tasks = [asyncio.create_task(main.lights_main())]
+    if command_every_ms:
+        tasks.append(asyncio.create_task(send_commands(main, command_every_ms, transition)))
+
+    while clock.now_us() < end_us:
+        await asyncio.sleep(0)
+        for task in tasks:
+            if task.done():
+                task.result()
+
+    for other in asyncio.all_tasks():
+        if other is not asyncio.current_task():
+            other.cancel()
+
+    return sum(dma.transfers for dma in DMA.instances[channels:])
+
+def run(main, effect, seconds: int, command_every_ms = None, transition = b''):
+    import compositor
+
+    counts = {'ticks': 0, 'spent': 0.0}
+    class CountingCompositor(compositor.Compositor):
+        def tick(self, now_ms):
+            start = time.perf_counter()
+            due_in = super().tick(now_ms)
+            counts['spent'] += time.perf_counter() - start
+            counts['ticks'] += 1
+            return due_in
+
+    main.Compositor = CountingCompositor
+    main.ha_lights[0].effect = effect
+
+    # the event is bound to the loop of the asyncio.run() it was first awaited in
+    main.state_changed = asyncio.Event()
+    main.commands.changed = main.state_changed
+
+    shown = asyncio.run(run_for(main, seconds, command_every_ms, transition))
+
+    return counts['ticks'], shown, counts['spent']
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--seconds', type=int, default=60)
+    parser.add_argument('--command-every', type=int, default=10, help='seconds between brightness commands')
+    args = parser.parse_args()
+
+    frames = args.seconds*1000 // 30
+    lights = synthetic_effect(frames, 100)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        with open(os.path.join(tmp, 'synthetic_binary.bfx'), 'wb') as f:
+            serialize(f, lights, {'frame_delay_ms': 30, 'light_count': 100}, binary=True)
+
+        pico_env.effects_dir = tmp
+        import main as pico_main
+        pico_main.effects_dir = tmp
+
+        print(f'{args.seconds} s of virtual time, {frames} frames of {pico_main.frame_duration_ms} ms')
+        every_ms = args.command_every*1000
+        for label, effect, command_every_ms, transition in (
+            ('solid colour', None, None, b''),
+            ('solid, commands', None, every_ms, b''),
+            ('instant commands', None, every_ms, b', "transition": 0'),
+            ('repeated rows', 'synthetic_binary', None, b''),
+            ('fire effect', 'Fire', None, b''),
+        ):
+            ticks, shown, cpu = run(pico_main, effect, args.seconds, command_every_ms, transition)
+            print(f'{label:>16}: {ticks:5} wakeups, {shown:5} frames shown, {cpu*1000:8.1f} ms in ticks')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+# Renders a bubble sort visualisation with render_driver over different worker counts,
+# checks that every run writes the same bytes and reports the time each one took.
+#
+#   python host/bench_parallel_render.py [--lights 100] [--chunk 250] [--workers 1 2 4]
+import argparse
+import functools
+import os
+import tempfile
+import time
+
+import pico_env
+import numpy as np
+
+from color import Color
+from interactiveSorting import recordSort, bubbleSort
+from render_driver import frame_chunks, render_effect
+
+# the per value colour conversion from the sort effect in generate.ipynb, the slow part
+def lightness_frames(states, color):
+    return np.vectorize(lambda h: int(color.lightness(0.5*h)))(states)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--lights', type=int, default=100)
+    parser.add_argument('--chunk', type=int, default=250)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--text', action='store_true', help='write the text format instead of binary')
+    args = parser.parse_args()
+
+    values = np.random.default_rng(0).random(args.lights)
+    states = recordSort(bubbleSort, values, holdFrames=40)
+    jobs = frame_chunks(states, args.chunk)
+    render = functools.partial(lightness_frames, color=Color.rgb(1, 0, 1))
+    metadata = {'frame_delay_ms': 70, 'light_count': args.lights}
+
+    print(f'{len(states)} frames, {args.lights} lights, {len(jobs)} jobs, {os.cpu_count()} cpus')
+
+    outputs = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for workers in args.workers:
+            path = os.path.join(tmp, f'sort{workers}.effect' if args.text else f'sort{workers}.bfx')
+
+            start = time.perf_counter()
+            with open(path, 'w' if args.text else 'wb') as f:
+                render_effect(f, render, jobs, dict(metadata), workers=workers, binary=not args.text)
+            elapsed = time.perf_counter() - start
+
+            with open(path, 'rb') as f:
+                outputs.append(f.read())
+            print(f'{workers:>3} workers: {elapsed:7.2f} s, {len(outputs[-1])/1024:8.1f} KiB')
+
+    assert all(output == outputs[0] for output in outputs), 'output depends on the worker count'
+    print('identical output for every worker count')
+
+if __name__ == '__main__':
+    main()
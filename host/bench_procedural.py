@@ -0,0 +1,41 @@
+# Per frame cost and allocations of the procedural effects.
+#
+#   python host/bench_procedural.py [--frames 500]
+import argparse
+import time
+import tracemalloc
+
+import pico_env
+from Color import Color
+from procedural_effects import procedural_effects
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--frames', type=int, default=500)
+    args = parser.parse_args()
+
+    color = Color.rgb(255, 120, 20)
+
+    for led_count in (100, 300, 1000):
+        print(f'{led_count} leds')
+        for name, factory in procedural_effects.items():
+            effect = factory(led_count, color)
+            frames = effect.read_frames()
+            frame = next(frames)
+            assert len(frame) == led_count*3
+
+            start = time.perf_counter()
+            for _ in range(args.frames):
+                next(frames)
+            us = (time.perf_counter() - start) / args.frames * 1e6
+
+            tracemalloc.start()
+            for _ in range(args.frames):
+                next(frames)
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            print(f'{name:>14}: {us:8.1f} us/frame, {peak:5} B peak traced over {args.frames} frames')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+# Quantizes a smooth gradient effect to palettes of different sizes and reports the
+# colour error, file sizes and how long the readers take to open the result.
+#
+#   python host/bench_quantize.py [--lights 100] [--frames 600] [--colors 16 64 256]
+import argparse
+import os
+import tempfile
+import time
+
+import pico_env
+import numpy as np
+
+from effect_serializer import serialize
+from effect_reader import effect_reader, binary_effect_reader
+from quantize import quantize, to_lab
+
+def gradient_effect(frames: int, light_count: int):
+    # two hue gradients drifting against each other, with a slow breathing brightness
+    x = np.linspace(0, 1, light_count)[np.newaxis, :]
+    t = np.linspace(0, 1, frames)[:, np.newaxis]
+    level = 0.6 + 0.4*np.sin(2*np.pi*t)
+
+    r = (0.5 + 0.5*np.sin(2*np.pi*(x + t)))*level
+    g = (0.5 + 0.5*np.sin(2*np.pi*(x - 2*t) + 2))*level
+    b = (0.5 + 0.5*np.sin(2*np.pi*(2*x + t) + 4))*level
+
+    channels = [np.around(c*255).astype(np.int64) for c in (r, g, b)]
+    return (channels[0] << 16) | (channels[1] << 8) | channels[2]
+
+def open_time(reader, path: str, repeat = 20):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        reader(path, 'bench')
+    return (time.perf_counter() - start)/repeat
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--lights', type=int, default=100)
+    parser.add_argument('--frames', type=int, default=600)
+    parser.add_argument('--colors', type=int, nargs='+', default=[16, 64, 256])
+    args = parser.parse_args()
+
+    lights = gradient_effect(args.frames, args.lights)
+    lab = to_lab(lights)
+
+    print(f'{args.frames} frames, {args.lights} lights, {len(np.unique(lights))} colours')
+    with tempfile.TemporaryDirectory() as tmp:
+        for max_colors in [None] + args.colors:
+            start = time.perf_counter()
+            quantized = lights if max_colors is None else quantize(lights, max_colors)
+            elapsed = time.perf_counter() - start
+            error = np.sqrt(((to_lab(quantized) - lab)**2).sum(axis=-1))
+
+            text_path = os.path.join(tmp, 'bench.effect')
+            binary_path = os.path.join(tmp, 'bench.bfx')
+            with open(text_path, 'w') as f:
+                serialize(f, quantized, {'frame_delay_ms': 30, 'light_count': args.lights})
+            with open(binary_path, 'wb') as f:
+                serialize(f, quantized, {'frame_delay_ms': 30, 'light_count': args.lights}, binary=True)
+
+            print(
+                f'{str(max_colors or "all"):>5} colours: quantized in {elapsed:5.2f} s, '
+                f'delta E mean {error.mean():5.2f} max {error.max():5.2f}, '
+                f'text {os.path.getsize(text_path)/1024:7.1f} KiB opened in {open_time(effect_reader, text_path)*1000:6.2f} ms, '
+                f'binary {os.path.getsize(binary_path)/1024:7.1f} KiB opened in {open_time(binary_effect_reader, binary_path)*1000:6.2f} ms'
+            )
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+# Replays a looping sequential effect file read against pico/sdcard.py on top of
+# a simulated card, with and without the sector cache.
+#
+#   python host/bench_sdcard.py [--file-kib 96] [--loops 5]
+import argparse
+import os
+import time
+
+import pico_env
+from fake_sdcard import FakeSDCardSPI
+
+simulated_sleep_ms = 0
+
+def sleep_ms(ms):
+    global simulated_sleep_ms
+    simulated_sleep_ms += ms
+
+time.sleep_ms = sleep_ms # type: ignore
+
+from sdcard import SDCard, IOCTL_CACHE_HITS, IOCTL_CACHE_MISSES, IOCTL_CACHE_READAHEADS
+
+def replay(card, first_block: int, blocks: int, loops: int, chunk_blocks: int):
+    buf = bytearray(chunk_blocks*512)
+    for _ in range(loops):
+        # the fat layer mostly asks for single sectors, like f.readline() does
+        for block in range(first_block, first_block + blocks, chunk_blocks):
+            card.readblocks(block, buf)
+
+def main():
+    global simulated_sleep_ms
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--file-kib', type=int, default=96)
+    parser.add_argument('--loops', type=int, default=5)
+    parser.add_argument('--baudrate', type=int, default=1320000)
+    args = parser.parse_args()
+
+    blocks = args.file_kib*1024//512
+    data = os.urandom(blocks*512)
+
+    print(f'{args.file_kib} KiB file read {args.loops} times, {args.baudrate} baud')
+    for cache_kib, readahead in ((0, 0), (16, 8), (64, 8), (128, 16)):
+        spi = FakeSDCardSPI()
+        spi.load(1000, data)
+        card = SDCard(spi, spi.cs, baudrate=args.baudrate, cache_bytes=cache_kib*1024, readahead_blocks=readahead)
+
+        # verify contents on the first pass
+        buf = bytearray(512)
+        for i in range(blocks):
+            card.readblocks(1000 + i, buf)
+            assert buf == data[i*512:(i+1)*512]
+
+        card.ioctl(0x103, 0)
+        spi.reset_counters()
+        simulated_sleep_ms = 0
+
+        start = time.perf_counter()
+        replay(card, 1000, blocks, args.loops, 1)
+        elapsed = time.perf_counter() - start
+
+        bus_ms = spi.bus_time_s()*1000 + simulated_sleep_ms
+        commands = spi.commands.get(17, 0) + spi.commands.get(18, 0)
+        print(
+            f'cache {cache_kib:4} KiB, readahead {readahead:2}: '
+            f'{commands:6} read commands, {spi.blocks_read:6} blocks from card, '
+            f'hits {card.ioctl(IOCTL_CACHE_HITS, 0):6}, misses {card.ioctl(IOCTL_CACHE_MISSES, 0):6}, '
+            f'readaheads {card.ioctl(IOCTL_CACHE_READAHEADS, 0):5}, '
+            f'simulated bus {bus_ms:8.0f} ms, host {elapsed*1000:6.0f} ms'
+        )
+
+if __name__ == '__main__':
+    main()
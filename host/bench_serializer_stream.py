@@ -0,0 +1,87 @@
+# Compares writing binary effects in one go and streamed in chunks, from 1k up to 1M
+# frames. The batch serializer needs the whole animation in memory, so it only runs
+# up to --batch-limit frames.
+#
+#   python host/bench_serializer_stream.py [--lights 100] [--chunk 1000] [--max-frames 1000000]
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+import pico_env
+import numpy as np
+
+from effect_serializer import serialize, serialize_stream
+from effect_reader import binary_effect_reader
+
+def synthetic_chunks(frames: int, light_count: int, chunk: int):
+    # moving colour blocks over a dim background, every frame held for two ticks
+    rng = np.random.default_rng(0)
+    colors = rng.integers(0, 0xffffff, size=16)
+    positions = np.arange(light_count)
+
+    for first in range(0, frames, chunk):
+        steps = np.arange(first, min(first + chunk, frames)) // 2
+        lights = np.full((len(steps), light_count), 0x050505)
+
+        for j, color in enumerate(colors):
+            start = (steps + j*light_count // len(colors)) % light_count
+            offset = (positions[np.newaxis, :] - start[:, np.newaxis]) % light_count
+            lights[offset < 4] = color
+
+        yield lights
+
+def measure(write):
+    tracemalloc.start()
+    start = time.perf_counter()
+    write()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return elapsed, peak
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--lights', type=int, default=100)
+    parser.add_argument('--chunk', type=int, default=1000)
+    parser.add_argument('--max-frames', type=int, default=1_000_000)
+    parser.add_argument('--batch-limit', type=int, default=100_000)
+    args = parser.parse_args()
+
+    metadata = {'frame_delay_ms': 30, 'light_count': args.lights}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        stream_path = os.path.join(tmp, 'stream.bfx')
+        batch_path = os.path.join(tmp, 'batch.bfx')
+
+        frames = 1000
+        while frames <= args.max_frames:
+            def write_stream():
+                with open(stream_path, 'wb') as f:
+                    serialize_stream(f, synthetic_chunks(frames, args.lights, args.chunk), metadata)
+
+            elapsed, peak = measure(write_stream)
+            size = os.path.getsize(stream_path)
+            print(f'{frames:>8} frames  stream: {frames/elapsed:9.0f} frames/s, peak {peak/1024/1024:7.1f} MiB, {size/1024:9.1f} KiB on disk')
+
+            if frames <= args.batch_limit:
+                def write_batch():
+                    lights = np.concatenate(list(synthetic_chunks(frames, args.lights, args.chunk)))
+                    with open(batch_path, 'wb') as f:
+                        serialize(f, lights, dict(metadata), binary=True)
+
+                elapsed, peak = measure(write_batch)
+                print(f'{"":>8}         batch: {frames/elapsed:9.0f} frames/s, peak {peak/1024/1024:7.1f} MiB')
+
+                # sanity check: both decode to the same frames
+                streamed = binary_effect_reader(stream_path, 'bench').read_frames()
+                batched = binary_effect_reader(batch_path, 'bench').read_frames()
+                for _ in range(min(frames, 500)):
+                    assert next(streamed) == next(batched)
+
+            frames *= 10
+
+if __name__ == '__main__':
+    main()
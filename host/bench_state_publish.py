@@ -0,0 +1,108 @@
+# Cost of writing a light's state payload into its reused buffer (Light.publish_state)
+# against building a dict and json.dumps-ing it as before, checking both give the same
+# json. The memory is the peak allocated during one payload; CPython boxes the packed
+# colour, MicroPython keeps ints that small unboxed.
+#
+# Then replays automations setting the state every 50 - 500 ms, mostly to what it
+# already is, through a StatePublisher and counts what reaches the broker. This part
+# runs in real time (clock.fast off) with every time scaled down by --scale.
+#
+#   python host/bench_state_publish.py [--calls 20000] [--requests 1000] [--window-ms 250] [--scale 10]
+import argparse
+import asyncio
+import json
+import random
+import time
+import tracemalloc
+
+import pico_env
+import ujson
+from Color import Color
+from Light import Light
+from fake_mqtt import Device, MQTTClient
+from state_publisher import StatePublisher
+
+def make_light():
+    client = MQTTClient()
+    device = Device(client, b'device', b'DIY', b'model', b'name')
+    light = Light(client, name=b'light', device=device, effects=['Fire', 'Rainbow wave'])
+    light.effect = 'Rainbow wave'
+    return light
+
+# what Light.publish_state sent before
+def dict_payload(light, brightness, color):
+    state = {'state': b'ON' if light.is_on else b'OFF'}
+    if brightness:
+        state['brightness'] = brightness
+    if color:
+        state['color'] = dict(color)
+        state['color_mode'] = b'rgb'
+    state['effect'] = light.effect
+    return ujson.dumps(state)
+
+def buffer_payload(light, brightness, color):
+    return light._write_state(light.is_on, brightness, int(color), light.effect)
+
+def measure(write, light, colors, calls):
+    start = time.perf_counter()
+    for i in range(calls):
+        write(light, i & 0xff, colors[i & 0xff])
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    before = tracemalloc.get_traced_memory()[0]
+    payload = write(light, 200, colors[3])
+    allocated = tracemalloc.get_traced_memory()[1] - before
+    tracemalloc.stop()
+
+    if isinstance(payload, int):
+        payload = bytes(light.state_buffer[:payload])
+    return elapsed/calls*1e6, allocated, payload
+
+async def replay(light, requests: int, window_ms: int, scale: int, rng):
+    clock = pico_env.clock
+    clock.fast = False
+    publisher = StatePublisher(window_ms=window_ms // scale)
+    task = asyncio.create_task(publisher.run())
+
+    for _ in range(requests):
+        await clock.sleep_us(rng.randrange(50, 500)*1000 // scale)
+
+        if rng.random() < 0.1:
+            light.brightness = rng.randrange(1, 256)
+        publisher.request(light)
+
+    await clock.sleep_us(2*window_ms*1000 // scale)
+    task.cancel()
+
+    return publisher
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--calls', type=int, default=20000)
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--window-ms', type=int, default=250)
+    parser.add_argument('--scale', type=int, default=10)
+    args = parser.parse_args()
+
+    light = make_light()
+    colors = [Color.from_int(i*0x010203 & 0xffffff) for i in range(256)]
+
+    print(f'state payload, {args.calls} calls')
+    payloads = []
+    for label, write in (('dict + json', dict_payload), ('reused buffer', buffer_payload)):
+        us, allocated, payload = measure(write, light, colors, args.calls)
+        payloads.append(json.loads(payload))
+        print(f'{label:>14}: {us:6.2f} us per payload, {allocated:4} bytes peak')
+    assert payloads[0] == payloads[1], payloads
+
+    print(f'{args.requests} state requests 50 - 500 ms apart, 10% of them changing the state')
+    publisher = asyncio.run(replay(light, args.requests, args.window_ms, args.scale, random.Random(1)))
+    print(
+        f'{publisher.requested} requested, {publisher.published} published, {publisher.duplicates} duplicates skipped, '
+        f'{len(light.mqtt.published)} messages sent'
+    )
+
+if __name__ == '__main__':
+    main()
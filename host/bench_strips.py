@@ -0,0 +1,88 @@
+# Simulates how long showing a frame takes with several chains, pushing them one
+# after the other (a Neopixel.show() per chain) versus StripManager.show(), which feeds
+# the state machines round robin. The PIO state machines are replaced by a model of
+# their TX FIFO draining at the ws2812 bit rate on a virtual clock, so the numbers are
+# the time until the last chain has shifted out its last word.
+#
+#   python host/bench_strips.py [--leds 100] [--strips 1 2 4 8]
+import argparse
+
+import pico_env
+from strip_manager import StripManager
+
+# 24 bits at 800 kHz
+WORD_US = 30
+FIFO_WORDS = 4
+# cpu time of one put() call
+PUT_US = 3
+LATCH_US = 100
+
+class VirtualClock:
+    def __init__(self):
+        self.now = 0
+
+class TimedStateMachine:
+    def __init__(self, clock):
+        self.clock = clock
+        self.drain_end = 0
+        self.words = []
+
+    def put(self, value, shift=0):
+        clock = self.clock
+        clock.now += PUT_US
+
+        values = [value] if isinstance(value, int) else list(value)
+        for word in values:
+            # block until the FIFO has room for the word
+            if self.drain_end - clock.now > FIFO_WORDS*WORD_US:
+                clock.now = self.drain_end - FIFO_WORDS*WORD_US
+            self.drain_end = max(self.drain_end, clock.now) + WORD_US
+            self.words.append(word)
+
+def attach(manager):
+    clock = VirtualClock()
+    for strip in manager.strips:
+        strip.sm = strip.neopixel.sm = TimedStateMachine(clock)
+    return clock
+
+def frame_time(manager, clock):
+    return max(strip.sm.drain_end for strip in manager.strips) - clock.start + LATCH_US
+
+def show_sequential(manager, clock):
+    # what a Neopixel.show() per chain does: one blocking put, then the latch delay
+    for strip in manager.strips:
+        strip.sm.put(strip.pixels, strip.cut)
+        clock.now += LATCH_US
+
+def show_round_robin(manager, clock):
+    manager.show()
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--leds', type=int, default=100)
+    parser.add_argument('--strips', type=int, nargs='+', default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    print(f'{args.leds} leds per chain, simulated time to show one frame')
+    for count in args.strips:
+        results = []
+        for show in (show_sequential, show_round_robin):
+            manager = StripManager([(i, args.leds) for i in range(count)], latch_us=0)
+            for i in range(manager.led_count):
+                manager.pixels[i] = i
+
+            clock = attach(manager)
+            clock.start = clock.now
+            show(manager, clock)
+
+            # every state machine got exactly its own part of the frame, in order
+            for strip in manager.strips:
+                assert strip.sm.words == list(range(strip.start, strip.start + strip.count))
+
+            results.append(frame_time(manager, clock))
+
+        sequential, round_robin = results
+        print(f'{count} chains: one by one {sequential/1000:6.2f} ms, round robin {round_robin/1000:6.2f} ms')
+
+if __name__ == '__main__':
+    main()
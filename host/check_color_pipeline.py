@@ -0,0 +1,42 @@
+# Checks OutputStage against the float math it replaces: Neopixel.set_pixel's
+# round(value * brightness / 255) for gamma 1, and the textbook gamma formula otherwise.
+#
+#   python host/check_color_pipeline.py
+import time
+
+import pico_env
+from color_pipeline import OutputStage
+
+def float_path(value, brightness, gamma):
+    return round(255 * ((value / 255) * (brightness / 255)) ** gamma)
+
+def max_error(stage, gamma):
+    worst = 0
+    for brightness in range(256):
+        stage.set_brightness(brightness)
+        for value in range(256):
+            worst = max(worst, abs(stage.table[value] - float_path(value, brightness, gamma)))
+    return worst
+
+def main():
+    for gamma in (1.0, 1.8, 2.2, 2.8):
+        stage = OutputStage(gamma=gamma)
+        error = max_error(stage, gamma)
+        print(f'gamma {gamma}: max deviation from float path {error}')
+        assert error <= 1
+
+    stage = OutputStage()
+    start = time.perf_counter()
+    for brightness in range(256):
+        stage.set_brightness(brightness)
+    rebuild_us = (time.perf_counter() - start) / 256 * 1e6
+
+    versions = stage.version
+    for _ in range(100):
+        stage.set_brightness(255)
+    assert stage.version == versions, 'table rebuilt without a brightness change'
+
+    print(f'table rebuild {rebuild_us:.1f} us, skipped when brightness is unchanged')
+
+if __name__ == '__main__':
+    main()
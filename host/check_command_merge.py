@@ -0,0 +1,79 @@
+# Checks that applying commands merged the way CommandProcessor does (into the command
+# before when Light.merge_command allows it) ends in the same state as applying them
+# one after the other, for random sequences of Home Assistant commands: on/off,
+# brightness, colour, effect and transition, alone and combined. The commands arrive
+# at the same time, as they do between two frames.
+#
+#   python host/check_command_merge.py [--sequences 2000]
+import argparse
+import contextlib
+import io
+import json
+import random
+
+import pico_env
+from Color import Color
+from Light import Light
+from fake_mqtt import Device, MQTTClient
+from light_command import CommandParser, LightCommand
+
+def make_light():
+    device = Device(MQTTClient(), b'device', b'DIY', b'model', b'name')
+    light = Light(MQTTClient(), name=b'light', device=device, effects=['Fire', 'Rainbow wave'], transition_duration_ms=500)
+    light.effect = 'Fire'
+    return light
+
+def random_command(rng):
+    command = {}
+    while not command:
+        if rng.random() < 0.3:
+            command['state'] = rng.choice(['ON', 'OFF'])
+        if rng.random() < 0.4:
+            command['brightness'] = rng.randrange(0, 256)
+        if rng.random() < 0.3:
+            command['color'] = {'r': rng.randrange(256), 'g': rng.randrange(256), 'b': rng.randrange(256)}
+        if rng.random() < 0.3:
+            command['effect'] = rng.choice(['Fire', 'Rainbow wave', 'Missing'])
+        if rng.random() < 0.3:
+            command['transition'] = rng.choice([0, 0.5, 2])
+    return command
+
+# once every transition has finished
+def state(light):
+    light.tick(10_000)
+    return light.is_on, light.brightness, int(light.color), light.effect, light.saved_brightness, int(light.saved_color)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sequences', type=int, default=2000)
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    parser = CommandParser()
+    for _ in range(args.sequences):
+        commands = [random_command(rng) for _ in range(rng.randrange(1, 6))]
+
+        one_by_one, merged = make_light(), make_light()
+        pending = []
+        with contextlib.redirect_stdout(io.StringIO()):
+            for message in commands:
+                command = LightCommand()
+                assert parser.parse(json.dumps(message).encode(), command, one_by_one.effect_names)
+
+                one_by_one.apply_command(command, 0)
+                one_by_one.tick(0)
+
+                if not pending or not merged.merge_command(pending[-1], command):
+                    pending.append(LightCommand())
+                    merged.merge_command(pending[-1], command)
+
+            for command in pending:
+                merged.apply_command(command, 0)
+                merged.tick(0)
+
+        assert state(one_by_one) == state(merged), (commands, state(one_by_one), state(merged))
+
+    print(f'{args.sequences} sequences: merged commands end in the same state')
+
+if __name__ == '__main__':
+    main()
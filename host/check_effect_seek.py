@@ -0,0 +1,102 @@
+# Checks that every effect reader starts at the right frame when asked to, including
+# delta encoded (also streamed one frame per chunk) and cached effects, for the bench
+# effects and for ones with nothing to delta encode: a single frame, a static colour
+# and a static colour held longer than a row can repeat. Compares the time it takes to start near the
+# end of an effect with the index against skipping through a text effect.
+#
+#   python host/check_effect_seek.py [--lights 100] [--frames 3000]
+import argparse
+import os
+import tempfile
+import time
+
+import pico_env
+import numpy as np
+
+from effect_serializer import serialize, serialize_stream
+from effect_reader import effect_reader, binary_effect_reader
+from effect_cache import cached_effect
+from bench_effect_format import effects
+
+check_effects = dict(
+    effects,
+    **{
+        'single frame': lambda frames, light_count: np.full((1, light_count), 0xff0000),
+        'static': lambda frames, light_count: np.full((frames, light_count), 0x00ff00),
+        'long static': lambda frames, light_count: np.full((0x10000 + 10, light_count), 0x0000ff),
+    },
+)
+
+def decode(frame):
+    if isinstance(frame, bytearray):
+        return [(frame[i] << 16) | (frame[i+1] << 8) | frame[i+2] for i in range(0, len(frame), 3)]
+    return list(frame)
+
+def cache(reader):
+    entry = cached_effect(reader)
+    for repeat, row in reader.read_rows():
+        entry.rows.append(bytearray(row))
+        entry.repeats.append(repeat)
+        entry.frame_count += repeat
+    return entry
+
+def start_time(reader, frame: int, repeat = 20):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        frames = reader.read_frames(frame)
+        next(frames)
+        frames.close()
+    return (time.perf_counter() - start)/repeat
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--lights', type=int, default=100)
+    parser.add_argument('--frames', type=int, default=3000)
+    args = parser.parse_args()
+
+    metadata = {'frame_delay_ms': 30, 'light_count': args.lights}
+    rng = np.random.default_rng(1)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for effect, make in check_effects.items():
+            lights = make(args.frames, args.lights)
+            frame_count = len(lights)
+
+            text_path = os.path.join(tmp, 'seek.effect')
+            binary_path = os.path.join(tmp, 'seek.bfx')
+            delta_path = os.path.join(tmp, 'delta.bfx')
+            streamed_path = os.path.join(tmp, 'streamed.bfx')
+            with open(text_path, 'w') as f:
+                serialize(f, lights, dict(metadata))
+            with open(binary_path, 'wb') as f:
+                serialize(f, lights, dict(metadata), binary=True)
+            with open(delta_path, 'wb') as f:
+                serialize(f, lights, dict(metadata), binary=True, delta=True, keyframe_interval=16)
+            with open(streamed_path, 'wb') as f:
+                serialize_stream(f, (lights[i:i + 1] for i in range(len(lights))), dict(metadata), delta=True, keyframe_interval=16)
+
+            readers = {
+                'text': effect_reader(text_path, 'seek'),
+                'binary': binary_effect_reader(binary_path, 'seek'),
+                'delta': binary_effect_reader(delta_path, 'seek'),
+                'streamed': binary_effect_reader(streamed_path, 'seek'),
+                'cached': cache(binary_effect_reader(delta_path, 'seek')),
+            }
+
+            # random starts, a start past the end that has to wrap, and playing over the loop point
+            starts = rng.integers(0, frame_count, size=25).tolist() + [0, frame_count - 1, frame_count + 5]
+            for name, reader in readers.items():
+                for start in starts:
+                    frames = reader.read_frames(start)
+                    for k in range(3):
+                        assert decode(next(frames)) == lights[(start + k) % frame_count].tolist(), (effect, name, start, k)
+                    frames.close()
+
+            print(f'{effect}: {frame_count} frames, start at frame {frame_count - 1} in', ', '.join(
+                f'{name} {start_time(reader, frame_count - 1)*1000:.2f} ms' for name, reader in readers.items()
+            ))
+
+    print('all readers start at the requested frame')
+
+if __name__ == '__main__':
+    main()
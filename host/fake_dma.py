@@ -0,0 +1,87 @@
+# Stand-in for rp2.DMA feeding a PIO TX FIFO. A transfer takes count words at the
+# ws2812 bit rate on the virtual clock from pico_env, and completes (recording the
+# words and calling the irq handler) on the first sleep or active() poll after that.
+# The source buffer is checked at the end of every transfer: if it changed while the
+# channel was reading it, the transfer is counted as torn. With `record` set the words
+# sent to every address are kept too. As on the RP2040 the irq handler only runs when
+# the channel's ctrl has irq_quiet=False, pack_ctrl() defaults it to True.
+import time
+
+WORD_US = 30
+
+
+class DMA:
+    # every channel created, so host tools can find the ones made inside lights_main
+    instances = []
+    clock = None
+    record = False
+
+    def __init__(self):
+        self.handler = None
+        self.end_us = None
+        self.read = None
+        self.snapshot = None
+        self.write = None
+        self.ctrl = None
+        self.transfers = 0
+        self.torn = 0
+        # wall clock time of every transfer start
+        self.start_times = []
+        # write address -> every word sent there, when recording
+        self.sent = {}
+        DMA.instances.append(self)
+
+    def pack_ctrl(self, **fields):
+        ctrl = {'irq_quiet': True}
+        ctrl.update(fields)
+        return ctrl
+
+    def irq(self, handler=None, hard=False):
+        self.handler = handler
+
+    def config(self, read=None, write=None, count=None, ctrl=None, trigger=False):
+        self.read = read
+        self.write = write
+        self.ctrl = ctrl or self.pack_ctrl()
+        self.count = count
+        if trigger:
+            self._start()
+
+    def _start(self):
+        if self.active():
+            raise RuntimeError('DMA channel reconfigured while busy')
+
+        now = self.clock.now_us()
+        self.snapshot = bytes(self.read[:self.count])
+        self.end_us = now + self.count*WORD_US
+        self.start_times.append(time.perf_counter())
+        # finishes through active(), so a timer left from an earlier transfer can't end this one
+        self.clock.call_at(self.end_us, self.active)
+
+    def _finish(self):
+        if self.end_us is None:
+            return
+
+        if bytes(self.read[:self.count]) != self.snapshot:
+            self.torn += 1
+
+        if self.record:
+            self.sent.setdefault(self.write, []).extend(memoryview(self.snapshot).cast('I'))
+        self.transfers += 1
+        self.end_us = None
+
+        if self.handler and not self.ctrl['irq_quiet']:
+            self.handler(self)
+
+    def active(self):
+        if self.end_us is None:
+            return False
+
+        if self.clock.now_us() >= self.end_us:
+            self._finish()
+            return False
+
+        return True
+
+    def close(self):
+        self.end_us = None
@@ -0,0 +1,77 @@
+# Stand-in for the MicroPython heap and its collector, to compare when collections
+# run rather than how CPython manages memory. The heap holds `live` bytes that
+# survive collections and the garbage allocated since the last one. allocate() runs a
+# collection first when the heap can't fit the request or, with gc.threshold() set,
+# once that many bytes were allocated since the last one, as the MicroPython allocator
+# does. Every collection advances the virtual clock from pico_env by its pause:
+#
+#   base_us + sweep_us_per_kib for every KiB of heap + mark_us_per_kib for every KiB live
+#
+# The defaults are in the range of an RP2040 at 125 MHz with a 190 KiB heap.
+# install() replaces gc.collect, mem_alloc, mem_free and threshold until uninstall().
+import gc
+
+import pico_env
+
+
+class SimulatedHeap:
+    def __init__(self, *, size = pico_env.HEAP_SIZE, live = 0, base_us = 200, sweep_us_per_kib = 8, mark_us_per_kib = 25):
+        self.size = size
+        self.live = live
+        self.garbage = 0
+        self.base_us = base_us
+        self.sweep_us_per_kib = sweep_us_per_kib
+        self.mark_us_per_kib = mark_us_per_kib
+        self.limit = -1
+        self.since_collect = 0
+
+        # collections run by the allocator and by gc.collect(), and their pauses
+        self.automatic = 0
+        self.explicit = 0
+        self.pause_us = 0
+        self.pause_max_us = 0
+        self.saved = None
+
+    def pause(self) -> int:
+        return self.base_us + (self.size*self.sweep_us_per_kib + self.live*self.mark_us_per_kib) // 1024
+
+    def allocated(self) -> int:
+        return self.live + self.garbage
+
+    def _collect(self):
+        pause = self.pause()
+        pico_env.clock.offset_us += pause
+        self.pause_us += pause
+        self.pause_max_us = max(self.pause_max_us, pause)
+        self.garbage = 0
+        self.since_collect = 0
+
+    def collect(self):
+        self.explicit += 1
+        self._collect()
+
+    def allocate(self, n: int):
+        if self.allocated() + n > self.size or 0 <= self.limit <= self.since_collect + n:
+            self.automatic += 1
+            self._collect()
+            if self.allocated() + n > self.size:
+                raise MemoryError(f'{n} bytes with {self.live} live')
+
+        self.garbage += n
+        self.since_collect += n
+
+    def threshold(self, amount = None):
+        if amount is None:
+            return self.limit
+        self.limit = amount
+
+    def install(self):
+        self.saved = gc.collect, gc.mem_alloc, gc.mem_free, gc.threshold # type: ignore
+        gc.collect = self.collect
+        gc.mem_alloc = self.allocated # type: ignore
+        gc.mem_free = lambda: self.size - self.allocated() # type: ignore
+        gc.threshold = self.threshold # type: ignore
+        return self
+
+    def uninstall(self):
+        gc.collect, gc.mem_alloc, gc.mem_free, gc.threshold = self.saved # type: ignore
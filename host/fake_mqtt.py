@@ -0,0 +1,113 @@
+# Stand-ins for mqtt_as.MQTTClient and the ha_mqtt_device entities, recording
+# everything that would go over the wire. Like mqtt_as, the message queue holds
+# queue_len messages and overwrites the oldest one when full. A publish takes
+# publish_ms of virtual time, spent polling the clock so it doesn't add to the sleeps
+# of other tasks.
+import asyncio
+import json
+import time
+
+
+class MQTTClient:
+    publish_ms = 0
+
+    def __init__(self, **config):
+        self.config = config
+        self.queue = _MessageQueue(config.get('queue_len', 0))
+        self.up = asyncio.Event()
+        self.subscriptions = []
+        self.published = []
+        self._ssid = config.get('ssid')
+        self._wifi_pw = config.get('wifi_pw')
+
+    async def connect(self):
+        self.up.set()
+
+    async def subscribe(self, topic, qos=0):
+        self.subscriptions.append(topic)
+
+    async def publish(self, topic, msg, retain=False, qos=0):
+        end = time.ticks_us() + self.publish_ms*1000
+        while time.ticks_us() < end:
+            await asyncio.sleep(0)
+        # msg may be a view of a buffer the caller reuses, or a str like mqtt_as takes
+        self.published.append((topic, msg.encode() if isinstance(msg, str) else bytes(msg), retain))
+
+    def inject(self, topic, msg, retained=False):
+        self.queue.put((topic, msg, retained))
+
+
+class _MessageQueue:
+    def __init__(self, size=0):
+        self.queue = asyncio.Queue(size)
+        self.overwritten = 0
+
+    def put(self, message):
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.overwritten += 1
+        self.queue.put_nowait(message)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self.queue.get()
+
+
+class Device:
+    def __init__(self, mqtt, device_id, manufacturer, model, name):
+        self.mqtt = mqtt
+        self.device_id = device_id
+        self.config = {
+            'ids': device_id,
+            'mf': manufacturer,
+            'mdl': model,
+            'name': name,
+        }
+
+    async def init_mqtt(self):
+        pass
+
+
+def _str(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+
+class BaseEntity:
+    def __init__(
+        self,
+        mqtt,
+        name,
+        *,
+        component,
+        device,
+        object_id,
+        node_id=None,
+        discovery_prefix=b'homeassistant',
+        extra_conf=None,
+    ):
+        self.mqtt = mqtt
+        self.name = name
+        self.device = device
+
+        parts = [discovery_prefix, component]
+        if node_id:
+            parts.append(node_id)
+        parts.append(object_id)
+        self.base_topic = b'/'.join(parts)
+
+        self.config_topic = self.base_topic + b'/config'
+        self.state_topic = self.base_topic + b'/state'
+        self.config = {
+            '~': _str(self.base_topic),
+            'name': _str(name),
+            'stat_t': '~/state',
+        }
+        self.config.update({key: _str(value) for key, value in (extra_conf or {}).items()})
+
+    async def init_mqtt(self):
+        await self.mqtt.publish(self.config_topic, json.dumps(self.config).encode(), retain=True)
+
+    async def publish_state(self, state):
+        await self.mqtt.publish(self.state_topic, state)
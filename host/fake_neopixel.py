@@ -0,0 +1,69 @@
+# Stand-in for lib/neopixel.py (pi_pico_neopixel) with the PIO state machine
+# replaced by a recorder, so output code can run under CPython.
+from array import array
+import time
+
+
+class FakeStateMachine:
+    def __init__(self):
+        self.words_put = 0
+        self.last_words = None
+
+    def put(self, value, shift=0):
+        if isinstance(value, int):
+            self.words_put += 1
+        else:
+            self.words_put += len(value)
+            self.last_words = array('I', value)
+
+
+class Neopixel:
+    # every strip created, so host tools can find the ones made inside lights_main
+    instances = []
+
+    def __init__(self, num_leds, state_machine, pin, mode="RGB", delay=0.0001):
+        self.pixels = array('I', [0] * num_leds)
+        self.mode = mode
+        self.sm = FakeStateMachine()
+        self.shift = {
+            'R': ((mode.index('R') ^ 3) - 1) * 8,
+            'G': ((mode.index('G') ^ 3) - 1) * 8,
+            'B': ((mode.index('B') ^ 3) - 1) * 8,
+            'W': 0,
+        }
+        self.num_leds = num_leds
+        self.delay = delay
+        self.brightnessvalue = 255
+        self.shows = 0
+        self.show_times = []
+        Neopixel.instances.append(self)
+
+    def brightness(self, brightness=None):
+        if brightness is None:
+            return self.brightnessvalue
+        self.brightnessvalue = max(1, min(255, brightness))
+
+    def set_pixel(self, pixel_num, rgb_w, how_bright=None):
+        if how_bright is None:
+            how_bright = self.brightness()
+
+        if isinstance(rgb_w, int):
+            rgb_w = ((rgb_w >> 16) & 0xff, (rgb_w >> 8) & 0xff, rgb_w & 0xff)
+
+        bratio = how_bright / 255.0
+        red = round(rgb_w[0] * bratio)
+        green = round(rgb_w[1] * bratio)
+        blue = round(rgb_w[2] * bratio)
+
+        self.pixels[pixel_num] = (
+            red << self.shift['R'] | green << self.shift['G'] | blue << self.shift['B']
+        )
+
+    def fill(self, rgb_w, how_bright=None):
+        for i in range(self.num_leds):
+            self.set_pixel(i, rgb_w, how_bright)
+
+    def show(self):
+        self.sm.put(self.pixels, 8)
+        self.shows += 1
+        self.show_times.append(time.perf_counter())
@@ -0,0 +1,187 @@
+# Simulated SD card speaking the SPI protocol used by pico/sdcard.py, so the driver
+# can be exercised and benchmarked under CPython. Sectors live in a dict, anything
+# never written reads back as zeros.
+from collections import deque
+
+_R1_IDLE_STATE = 0x01
+_R1_READY = 0x00
+_TOKEN_CMD25 = 0xFC
+_TOKEN_STOP_TRAN = 0xFD
+_TOKEN_DATA = 0xFE
+
+
+class FakePin:
+    OUT = 1
+
+    def __init__(self):
+        self.value = 1
+
+    def init(self, mode, value=1):
+        self.value = value
+
+    def __call__(self, value):
+        self.value = value
+
+
+class FakeSDCardSPI:
+    def __init__(self, sectors=8192, busy_bytes=2):
+        self.sectors = sectors
+        self.blocks = {}
+        self.baudrate = 0
+        # filler bytes sent before the first data token of a read command, like a
+        # card seeking to the sector; following blocks of a CMD18 stream back to back
+        self.busy_bytes = busy_bytes
+
+        self.out = deque()
+        self.multi_read_block = None
+        self.write_block = None
+        self.receiving = None
+        self.crc_left = 0
+        self.idle = True
+
+        self.bytes_clocked = 0
+        self.commands = {}
+        self.blocks_read = 0
+
+        # chip select to pass to SDCard, the card only drives the bus while it is low
+        self.cs = FakePin()
+
+    def reset_counters(self):
+        self.bytes_clocked = 0
+        self.commands = {}
+        self.blocks_read = 0
+
+    def bus_time_s(self):
+        return self.bytes_clocked * 8 / self.baudrate if self.baudrate else 0
+
+    def sector(self, block_num):
+        return self.blocks.get(block_num, bytes(512))
+
+    def load(self, block_num, data):
+        for i in range(0, len(data), 512):
+            self.blocks[block_num + i // 512] = bytes(data[i : i + 512]).ljust(512, b'\0')
+
+    # spi api
+
+    def init(self, baudrate=0, **kwargs):
+        self.baudrate = baudrate
+
+    def _pop(self):
+        if self.cs.value:
+            return 0xFF
+
+        if not self.out and self.multi_read_block is not None:
+            self._queue_block(self.multi_read_block, 0)
+            self.multi_read_block += 1
+
+        return self.out.popleft() if self.out else 0xFF
+
+    def _queue_block(self, block_num, busy_bytes):
+        self.out.extend(b'\xff' * busy_bytes)
+        self.out.append(_TOKEN_DATA)
+        self.out.extend(self.sector(block_num))
+        self.out.extend(b'\xff\xff')
+        self.blocks_read += 1
+
+    def write(self, buf):
+        self.bytes_clocked += len(buf)
+
+        if self.receiving is not None and len(buf) == 512:
+            self.blocks[self.receiving] = bytes(buf)
+            self.crc_left = 2
+            return
+
+        if self.crc_left:
+            self.crc_left -= len(buf)
+            if self.crc_left <= 0:
+                self.crc_left = 0
+                self.out.clear()
+                self.out.append(0x05)
+                if self.write_block is not None:
+                    self.write_block += 1
+                self.receiving = None
+            return
+
+        if len(buf) == 6 and buf[0] & 0xC0 == 0x40:
+            self._command(buf[0] & 0x3F, buf[1] << 24 | buf[2] << 16 | buf[3] << 8 | buf[4])
+            return
+
+        for _ in range(len(buf)):
+            self._pop()
+
+    def readinto(self, buf, write=0xFF):
+        self.bytes_clocked += len(buf)
+        for i in range(len(buf)):
+            buf[i] = self._pop()
+
+    def write_readinto(self, write_buf, read_buf):
+        self.readinto(read_buf)
+
+    def read(self, nbytes, write=0x00):
+        self.bytes_clocked += nbytes
+
+        if nbytes == 1 and write in (_TOKEN_DATA, _TOKEN_CMD25) and self.write_block is not None:
+            self.receiving = self.write_block
+            return b'\xff'
+
+        if nbytes == 1 and write == _TOKEN_STOP_TRAN:
+            self.write_block = None
+            return b'\xff'
+
+        return bytes(self._pop() for _ in range(nbytes))
+
+    # card side
+
+    def _block_arg(self, arg):
+        # the fake reports itself as SDHC, so addresses are in blocks
+        return arg
+
+    def _command(self, cmd, arg):
+        self.commands[cmd] = self.commands.get(cmd, 0) + 1
+
+        if cmd == 12:
+            self.multi_read_block = None
+            self.out.clear()
+            # one stuff byte, skipped by the driver, then R1
+            self.out.extend((0xFF, _R1_READY))
+            return
+
+        self.out.clear()
+        r1 = _R1_IDLE_STATE if self.idle else _R1_READY
+
+        if cmd == 0:
+            self.idle = True
+            self.out.append(_R1_IDLE_STATE)
+        elif cmd == 8:
+            self.out.extend((_R1_IDLE_STATE, 0x00, 0x00, 0x01, 0xAA))
+        elif cmd == 58:
+            self.out.extend((r1, 0xC0, 0xFF, 0x80, 0x00))
+        elif cmd == 55:
+            self.out.append(r1)
+        elif cmd == 41:
+            self.idle = False
+            self.out.append(_R1_READY)
+        elif cmd == 9:
+            csd = bytearray(16)
+            csd[0] = 0x40
+            c_size = self.sectors // 1024 - 1
+            csd[8] = (c_size >> 8) & 0xFF
+            csd[9] = c_size & 0xFF
+            self.out.append(_R1_READY)
+            self.out.append(_TOKEN_DATA)
+            self.out.extend(csd)
+            self.out.extend(b'\xff\xff')
+        elif cmd == 16:
+            self.out.append(_R1_READY)
+        elif cmd == 17:
+            self.out.append(_R1_READY)
+            self._queue_block(self._block_arg(arg), self.busy_bytes)
+        elif cmd == 18:
+            self.out.append(_R1_READY)
+            self._queue_block(self._block_arg(arg), self.busy_bytes)
+            self.multi_read_block = self._block_arg(arg) + 1
+        elif cmd in (24, 25):
+            self.out.append(_R1_READY)
+            self.write_block = self._block_arg(arg)
+        else:
+            self.out.append(0x04)
@@ -0,0 +1,137 @@
+# Replays bursts of Home Assistant commands, as sent while a brightness or colour
+# slider is dragged, against the lights_main loop from pico/main.py. Once through the
+# CommandProcessor and once applying and publishing every message on its own, as
+# main.py used to.
+# Reports the state updates published, the messages the mqtt_as queue (queue_len 10)
+# overwrote, the processor counters and whether the light ended up in the state of the
+# last command. Runs in real time (clock.fast off), messages have to arrive while the
+# loop is sleeping.
+#
+#   python host/load_commands.py [--bursts 10] [--burst-size 40] [--interval-ms 10] [--publish-ms 15] [--window-ms 250]
+import argparse
+import asyncio
+import json
+import time
+
+import pico_env
+import fake_mqtt
+from Color import Color
+from command_processor import CommandProcessor
+from state_publisher import StatePublisher
+
+clock = pico_env.clock
+clock.fast = False
+
+async def wait_until(us):
+    await clock.sleep_us(us - clock.now_us())
+
+def burst(index: int, size: int):
+    messages = []
+    for i in range(size):
+        if index % 2:
+            value = {'color': {'r': 255, 'g': (index*37 + i*5) % 256, 'b': i % 256}}
+        else:
+            value = {'brightness': 1 + (index*31 + i*7) % 255}
+        messages.append(json.dumps(value).encode())
+
+    # a message cut short on the way, every burst
+    messages.insert(size // 2, b'{"brightness": ')
+    return messages
+
+# takes the place of the StatePublisher when every message is handled on its own
+class ImmediatePublisher:
+    def __init__(self):
+        self.lights = []
+
+    def request(self, light):
+        self.lights.append(light)
+
+async def handle_in_order(main):
+    async for topic, msg, retained in main.client.queue: # type: ignore
+        main.commands.receive(topic, msg)
+        main.commands.apply(time.ticks_ms())
+        while main.publisher.lights:
+            await main.publisher.lights.pop(0).publish_target_state()
+
+def reset(main):
+    client = main.client
+    client.queue = fake_mqtt._MessageQueue(client.config['queue_len'])
+    client.published.clear()
+
+    for light in main.ha_lights:
+        light.transitions.brightness_active = light.transitions.color_active = False
+        light.brightness = 255
+        light.color = Color.rgb(255, 255, 255)
+        light.effect = None
+        light.published = False
+
+async def scenario(main, coalesce: bool, args):
+    reset(main)
+    light = main.ha_lights[0]
+    main.publisher = StatePublisher(window_ms=args.window_ms) if coalesce else ImmediatePublisher()
+    main.commands = CommandProcessor(main.ha_lights, main.publisher, changed=main.state_changed)
+
+    tasks = [asyncio.create_task(main.lights_main())]
+    if coalesce:
+        tasks.append(asyncio.create_task(main.commands.run(main.client.queue)))
+        tasks.append(asyncio.create_task(main.publisher.run()))
+    else:
+        tasks.append(asyncio.create_task(handle_in_order(main)))
+
+    last = {}
+    sent = 0
+    for index in range(args.bursts):
+        for message in burst(index, args.burst_size):
+            main.client.inject(light.command_topic, message)
+            sent += 1
+            if message.endswith(b'}'):
+                last.update(json.loads(message))
+            await wait_until(clock.now_us() + args.interval_ms*1000)
+        await wait_until(clock.now_us() + 500*1000)
+
+    # let the last transition finish
+    await wait_until(clock.now_us() + 2*light.transition_duration_ms*1000)
+    for task in tasks:
+        if task.done():
+            task.result()
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    for other in asyncio.all_tasks():
+        if other is not asyncio.current_task():
+            other.cancel()
+
+    expected = Color.from_dict(last['color'])
+    correct = light.brightness == last['brightness'] and int(light.color) == int(expected)
+    published = sum(1 for topic, _, _ in main.client.published if topic == light.state_topic)
+
+    return sent, published, main.client.queue.overwritten, main.commands, correct
+
+async def run(main, args):
+    fake_mqtt.MQTTClient.publish_ms = args.publish_ms
+    print(
+        f'{args.bursts} bursts of {args.burst_size} messages {args.interval_ms} ms apart, '
+        f'publishing takes {args.publish_ms} ms'
+    )
+
+    for label, coalesce in (('one by one', False), ('coalesced', True)):
+        sent, published, overwritten, commands, correct = await scenario(main, coalesce, args)
+        counters = f', {commands.merged} merged, {commands.dropped} dropped, {commands.applied} applied' if coalesce else ''
+        print(
+            f'{label:>10}: {sent} sent, {published} state updates, {overwritten} overwritten in the queue{counters}, '
+            f'final state {"matches" if correct else "DIFFERS"}'
+        )
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--bursts', type=int, default=10)
+    parser.add_argument('--burst-size', type=int, default=40)
+    parser.add_argument('--interval-ms', type=int, default=10)
+    parser.add_argument('--publish-ms', type=int, default=15)
+    parser.add_argument('--window-ms', type=int, default=250)
+    args = parser.parse_args()
+
+    import main as pico_main
+    asyncio.run(run(pico_main, args))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,252 @@
+# Makes the code from pico/ and effects/ importable under CPython, by putting both
+# on sys.path and installing stand-ins for the MicroPython only modules (machine, rp2,
+# uasyncio, ujson, uos, micropython, the mqtt and neopixel libs) and the MicroPython
+# extensions of time and gc. Import this before any module from pico/.
+#
+# uasyncio.sleep_ms runs against `clock`: with clock.fast set (the default) sleeps
+# only advance a virtual offset added to ticks_ms/ticks_us instead of waiting, so the
+# render loop can be driven as fast as the host allows. Simulated hardware (the DMA
+# channels) schedules its events on the same clock.
+import asyncio
+import binascii
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+import types
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PICO_DIR = os.path.join(ROOT, 'pico')
+EFFECTS_DIR = os.path.join(ROOT, 'effects')
+HOST_DIR = os.path.dirname(os.path.abspath(__file__))
+
+for path in (PICO_DIR, EFFECTS_DIR, HOST_DIR):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+# RP2040 MicroPython heap, used for gc.mem_free()
+HEAP_SIZE = 190*1024
+
+
+class Clock:
+    def __init__(self):
+        self.fast = True
+        self.offset_us = 0
+        # (time in us, callback) of simulated hardware events, run on the next sleep
+        self.timers = []
+
+    def now_us(self):
+        return int(time.perf_counter()*1_000_000) + self.offset_us
+
+    def call_at(self, us, callback):
+        self.timers.append((us, callback))
+
+    def run_timers(self):
+        now = self.now_us()
+        due = [timer for timer in self.timers if timer[0] <= now]
+        if due:
+            self.timers = [timer for timer in self.timers if timer[0] > now]
+            for _, callback in sorted(due, key=lambda timer: timer[0]):
+                callback()
+
+    async def sleep_us(self, us):
+        if self.fast:
+            self.offset_us += max(us, 0)
+            self.run_timers()
+            await asyncio.sleep(0)
+        else:
+            await asyncio.sleep(us/1_000_000)
+            self.run_timers()
+
+clock = Clock()
+
+
+def _module(name, **attrs):
+    module = types.ModuleType(name)
+    module.__dict__.update(attrs)
+    sys.modules.setdefault(name, module)
+    return sys.modules[name]
+
+
+# time and gc extensions
+
+time.ticks_us = clock.now_us # type: ignore
+time.ticks_ms = lambda: clock.now_us() // 1000 # type: ignore
+time.ticks_diff = lambda new, old: new - old # type: ignore
+time.ticks_add = lambda ticks, delta: ticks + delta # type: ignore
+time.sleep_ms = lambda ms: time.sleep(ms/1000) # type: ignore
+time.sleep_us = lambda us: time.sleep(us/1_000_000) # type: ignore
+
+def _mem_alloc():
+    return tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else 0
+
+gc.mem_alloc = _mem_alloc # type: ignore
+gc.mem_free = lambda: max(HEAP_SIZE - _mem_alloc(), 0) # type: ignore
+
+_gc_threshold = [-1]
+
+# the allocation threshold is only recorded, CPython collects on its own terms
+def _threshold(amount=None):
+    if amount is None:
+        return _gc_threshold[0]
+    _gc_threshold[0] = amount
+
+gc.threshold = _threshold # type: ignore
+
+
+# micropython
+
+def _identity(f):
+    return f
+
+_module('micropython', const=lambda value: value, native=_identity, viper=_identity)
+
+
+# ujson, MicroPython serialises bytes like str
+
+def _json_default(value):
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode()
+    raise TypeError(f'{value!r} is not JSON serializable')
+
+_module(
+    'ujson',
+    dumps=lambda obj: json.dumps(obj, default=_json_default, separators=(',', ':')),
+    loads=json.loads,
+)
+
+_module('ubinascii', hexlify=binascii.hexlify, unhexlify=binascii.unhexlify)
+
+
+# uasyncio
+
+async def _sleep_ms(ms):
+    await clock.sleep_us(ms*1000)
+
+async def _sleep(seconds):
+    await clock.sleep_us(int(seconds*1_000_000))
+
+# set from interrupt handlers on the device, the simulated ones run on the event loop
+class _ThreadSafeFlag:
+    def __init__(self):
+        self.event = asyncio.Event()
+
+    def set(self):
+        self.event.set()
+
+    def clear(self):
+        self.event.clear()
+
+    async def wait(self):
+        # let the simulated hardware catch up with the virtual clock
+        while not self.event.is_set():
+            await clock.sleep_us(10)
+        self.event.clear()
+
+# the timeout runs on the virtual clock, polled a millisecond at a time
+async def _wait_for_ms(awaitable, ms):
+    task = asyncio.ensure_future(awaitable)
+    end = clock.now_us() + ms*1000
+    while not task.done():
+        left = end - clock.now_us()
+        if left <= 0:
+            task.cancel()
+            raise asyncio.TimeoutError
+        await clock.sleep_us(min(left, 1000))
+    return task.result()
+
+_module(
+    'uasyncio',
+    **{name: getattr(asyncio, name) for name in ('create_task', 'gather', 'Event', 'Lock', 'CancelledError', 'run', 'wait_for', 'TimeoutError')},
+    sleep=_sleep,
+    sleep_ms=_sleep_ms,
+    wait_for_ms=_wait_for_ms,
+    ThreadSafeFlag=_ThreadSafeFlag,
+)
+
+
+# uos, /sd/effects is mapped onto `effects_dir`
+
+effects_dir = None
+
+def _listdir(path):
+    if path.rstrip('/') == '/sd/effects':
+        if effects_dir is None:
+            raise OSError(2, 'no sd card')
+        return os.listdir(effects_dir)
+    return os.listdir(path)
+
+def _no_sd(*args, **kwargs):
+    raise OSError(19, 'no sd card')
+
+_module('uos', listdir=_listdir, VfsFat=_no_sd, mount=_no_sd, stat=os.stat, remove=os.remove)
+
+
+# machine, the SPI bus is dead so SDCard fails to find a card
+
+class _Pin:
+    OUT = 1
+    IN = 0
+
+    def __init__(self, pin=None, mode=None, value=1):
+        self.pin = pin
+        self.value = value
+
+    def init(self, mode=None, value=1):
+        self.value = value
+
+    def __call__(self, value=None):
+        if value is None:
+            return self.value
+        self.value = value
+
+class _SPI:
+    MSB = 0
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def init(self, *args, **kwargs):
+        pass
+
+    def write(self, buf):
+        pass
+
+    def readinto(self, buf, write=0xFF):
+        for i in range(len(buf)):
+            buf[i] = 0xFF
+
+    def write_readinto(self, write_buf, read_buf):
+        self.readinto(read_buf)
+
+    def read(self, nbytes, write=0x00):
+        return b'\xff'*nbytes
+
+_module('machine', Pin=_Pin, SPI=_SPI, unique_id=lambda: b'\xe6\x61\x38\x11\x11\x22\x33\x44', freq=lambda *args: 125_000_000)
+
+
+# device libraries and secrets
+
+import fake_mqtt
+import fake_neopixel
+import fake_dma
+
+fake_dma.DMA.clock = clock
+_module('rp2', DMA=fake_dma.DMA)
+
+async def _try_connecting_to_known_networks():
+    return None, 'ssid', 'password'
+
+_module('lib')
+_module('lib.lib')
+_module('lib.lib.mqtt_as', MQTTClient=fake_mqtt.MQTTClient)
+_module('lib.ha_mqtt_device', MQTTClient=fake_mqtt.MQTTClient, Device=fake_mqtt.Device, BaseEntity=fake_mqtt.BaseEntity)
+_module('lib.neopixel', Neopixel=fake_neopixel.Neopixel)
+_module('lib.wifiConfig', tryConnectingToKnownNetworks=_try_connecting_to_known_networks)
+# the device keeps its credentials in secrets.py, which shadows the standard library
+# module of the same name, so they are added to that one instead of replacing it
+import secrets
+secrets.mqtt_user = 'user' # type: ignore
+secrets.mqtt_password = 'password' # type: ignore
@@ -0,0 +1,133 @@
+# Runs the real lights_main loop from pico/main.py under CPython against synthetic
+# effect files and reports how often the loop ticked and showed a frame, the host
+# time every compositor tick takes, the time between shown frames and peak memory.
+# Sleeps are virtual (see pico_env.clock), so the numbers are the cost of the frame
+# work itself. Every run covers the virtual time of --frames frames; unchanged frames
+# aren't shown, so a solid colour shows once and repeated rows are skipped, the tick
+# counts and times describe the loop then.
+#
+#   python host/run_lights.py [--frames 2000] [--effect-frames 3000]
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+import tracemalloc
+
+import pico_env
+from fake_neopixel import Neopixel
+from fake_dma import DMA
+from effect_serializer import serialize
+from bench_effect_format import synthetic_effect
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered)*fraction), len(ordered) - 1)]
+
+# show times of the output made by lights_main, the transfer starts with DMA output
+def show_times(main, neopixels: int, channels: int):
+    if main.dma_output:
+        return DMA.instances[-1].start_times if len(DMA.instances) > channels else []
+    return Neopixel.instances[-1].show_times if len(Neopixel.instances) > neopixels else []
+
+async def run_frames(main, frames: int):
+    neopixels, channels = len(Neopixel.instances), len(DMA.instances)
+    end_us = pico_env.clock.now_us() + frames*main.frame_duration_ms*1000
+    task = asyncio.create_task(main.lights_main())
+
+    while len(show_times(main, neopixels, channels)) < frames and pico_env.clock.now_us() < end_us:
+        await asyncio.sleep(0)
+        if task.done():
+            task.result()
+
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+
+    # lights_main leaves the prefetch task behind when cancelled
+    for other in asyncio.all_tasks():
+        if other is not asyncio.current_task():
+            other.cancel()
+
+    return show_times(main, neopixels, channels)[:frames]
+
+def run(main, effect, frames: int):
+    import compositor
+
+    tick_times = []
+    class TimedCompositor(compositor.Compositor):
+        def tick(self, now_ms):
+            start = time.perf_counter()
+            due_in = super().tick(now_ms)
+            tick_times.append((time.perf_counter() - start)*1e6)
+            return due_in
+
+    main.Compositor = TimedCompositor
+    main.ha_lights[0].effect = effect
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    times = asyncio.run(run_frames(main, frames))
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    shown = len(times)
+    times = [start] + times
+    latencies = [(b - a)*1e6 for a, b in zip(times, times[1:])]
+
+    return {
+        'ticks': len(tick_times),
+        'shown': shown,
+        'tick_p50': percentile(tick_times, 0.5),
+        'tick_p99': percentile(tick_times, 0.99),
+        'tick_max': max(tick_times),
+        'fps': shown/elapsed,
+        'p50': percentile(latencies, 0.5),
+        'p99': percentile(latencies, 0.99),
+        'peak_kib': peak/1024,
+    }
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--frames', type=int, default=2000)
+    parser.add_argument('--effect-frames', type=int, default=3000)
+    args = parser.parse_args()
+
+    lights = synthetic_effect(args.effect_frames, 100)
+    metadata = {'frame_delay_ms': 30, 'light_count': 100}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        with open(os.path.join(tmp, 'synthetic_text.effect'), 'w') as f:
+            serialize(f, lights, dict(metadata))
+
+        with open(os.path.join(tmp, 'synthetic_binary.bfx'), 'wb') as f:
+            serialize(f, lights, dict(metadata), binary=True)
+
+        pico_env.effects_dir = tmp
+        import main as pico_main
+        pico_main.effects_dir = tmp
+
+        print(f'{args.frames} frames per run, 100 leds')
+        for label, effect in (
+            ('solid colour', None),
+            ('text effect', 'synthetic_text'),
+            ('binary effect', 'synthetic_binary'),
+            ('fire effect', 'Fire'),
+        ):
+            stats = run(pico_main, effect, args.frames)
+            # a scene that shows once has no time between shows
+            between = (
+                f'between shows us p50 {stats["p50"]:7.1f} p99 {stats["p99"]:8.1f}' if stats['shown'] > 1
+                else f'{"between shows us -":>40}'
+            )
+            print(
+                f'{label:>14}: {stats["ticks"]:5} ticks, tick us p50 {stats["tick_p50"]:6.1f} '
+                f'p99 {stats["tick_p99"]:7.1f} max {stats["tick_max"]:8.1f}; {stats["shown"]:5} shown, '
+                f'{stats["fps"]:6.0f} frames/s, {between}; peak {stats["peak_kib"]:6.1f} KiB'
+            )
+
+if __name__ == '__main__':
+    main()
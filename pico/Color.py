@@ -1,6 +1,22 @@
 import colorsys
 
+# Channels are stored as 8.8 fixed point ints (0 - 255 << 8), so the hot paths
+# (blend_into, add, scale) work on small ints and never allocate. The float based
+# r, g, b properties and operators are kept for compatibility with the old API.
+_ONE = 255 << 8
+
+def _clamp(value: int) -> int:
+    if value > _ONE:
+        return _ONE
+
+    if value < 0:
+        return 0
+
+    return value
+
 class Color:
+    __slots__ = ('r8', 'g8', 'b8')
+
     @classmethod
     def hsv(cls, h: float, s: float, v: float) -> 'Color':
         res = cls()
@@ -24,100 +40,114 @@ class Color:
     @classmethod
     def rgb(cls, r: float, g: float, b: float) -> 'Color':
         res = cls()
-
-        r /= 255
-        g /= 255
-        b /= 255
-
-        res.r, res.g, res.b = r, g, b
+        res.set_rgb(r, g, b)
         return res
 
     def __init__(self, r = 1, g = 1, b = 1) -> None:
-        self.r = r
-        self.g = g
-        self.b = b
+        self.r8 = int(r*_ONE + 0.5)
+        self.g8 = int(g*_ONE + 0.5)
+        self.b8 = int(b*_ONE + 0.5)
+
+    # float view of the channels, in 0 - 1 range
+
+    @property
+    def r(self) -> float:
+        return self.r8 / _ONE
+
+    @r.setter
+    def r(self, value: float):
+        self.r8 = _clamp(int(value*_ONE + 0.5))
+
+    @property
+    def g(self) -> float:
+        return self.g8 / _ONE
+
+    @g.setter
+    def g(self, value: float):
+        self.g8 = _clamp(int(value*_ONE + 0.5))
+
+    @property
+    def b(self) -> float:
+        return self.b8 / _ONE
+
+    @b.setter
+    def b(self, value: float):
+        self.b8 = _clamp(int(value*_ONE + 0.5))
 
     def __iter__(self):
-        yield 'r', self.r*255
-        yield 'g', self.g*255
-        yield 'b', self.b*255
+        yield 'r', (self.r8 + 128) >> 8
+        yield 'g', (self.g8 + 128) >> 8
+        yield 'b', (self.b8 + 128) >> 8
 
     @classmethod
     def from_dict(cls, dict: dict) -> 'Color':
-        return cls().rgb(dict['r'], dict['g'], dict['b'])
+        return cls.rgb(dict['r'], dict['g'], dict['b'])
 
     def to_tuple(self):
-        return int(self.r*255), int(self.g*255), int(self.b*255)
+        return self.r8 >> 8, self.g8 >> 8, self.b8 >> 8
 
     def to_hls(self):
         return colorsys.rgb_to_hls(self.r, self.g, self.b)
 
     def copy(self) -> 'Color':
         res = Color()
-        res.r, res.g, res.b = self.r, self.g, self.b
+        res.copy_from(self)
         return res
 
-    def __int__(self):
-        return (int(self.r*255) << 16) | (int(self.g*255) << 8) | int(self.b*255)
-
-    def __imul__(self, mult: float):
-        if (mult > 1):
-            mult = 1
-
-        self.r *= mult
-        self.g *= mult
-        self.b *= mult
+    # allocation free operations, all of them modify self and return it
 
+    def set_rgb(self, r: int, g: int, b: int) -> 'Color':
+        self.r8 = _clamp(int(r*256))
+        self.g8 = _clamp(int(g*256))
+        self.b8 = _clamp(int(b*256))
         return self
 
-    def __mul__(self, mult: float) -> 'Color':
-        if (mult > 1):
-            mult = 1
-
-        res = self.copy()
-
-        res.r *= mult
-        res.g *= mult
-        res.b *= mult
-
-        return res
-
-    def __iadd__(self, other: 'Color'):
-        self.r += other.r
-        self.g += other.g
-        self.b += other.b
-
-        if self.r > 1:
-            self.r = 1
+    def copy_from(self, other: 'Color') -> 'Color':
+        self.r8 = other.r8
+        self.g8 = other.g8
+        self.b8 = other.b8
+        return self
 
-        if self.g > 1:
-            self.g = 1
+    def add(self, other: 'Color') -> 'Color':
+        self.r8 = _clamp(self.r8 + other.r8)
+        self.g8 = _clamp(self.g8 + other.g8)
+        self.b8 = _clamp(self.b8 + other.b8)
+        return self
 
-        if self.b > 1:
-            self.b = 1
+    # weight is a fraction in 8.8 fixed point, 0 - 256
+    def scale(self, weight: int) -> 'Color':
+        if weight > 256:
+            weight = 256
 
+        self.r8 = (self.r8 * weight) >> 8
+        self.g8 = (self.g8 * weight) >> 8
+        self.b8 = (self.b8 * weight) >> 8
         return self
 
-    def __add__(self, other: 'Color') -> 'Color':
-        res = self.copy()
+    # sets self to start blended with target, weight 0 - 256 is the share of target
+    def blend_into(self, start: 'Color', target: 'Color', weight: int) -> 'Color':
+        self.r8 = start.r8 + (((target.r8 - start.r8) * weight) >> 8)
+        self.g8 = start.g8 + (((target.g8 - start.g8) * weight) >> 8)
+        self.b8 = start.b8 + (((target.b8 - start.b8) * weight) >> 8)
+        return self
 
-        res.r += other.r
-        res.g += other.g
-        res.b += other.b
+    def __int__(self):
+        return ((self.r8 >> 8) << 16) | ((self.g8 >> 8) << 8) | (self.b8 >> 8)
 
-        if res.r > 1:
-            res.r = 1
+    def __imul__(self, mult: float):
+        return self.scale(int(mult*256))
 
-        if res.g > 1:
-            res.g = 1
+    def __mul__(self, mult: float) -> 'Color':
+        return self.copy().scale(int(mult*256))
 
-        if res.b > 1:
-            res.b = 1
+    def __iadd__(self, other: 'Color'):
+        return self.add(other)
 
-        return res
+    def __add__(self, other: 'Color') -> 'Color':
+        return self.copy().add(other)
 
     def __eq__(self, other: 'Color') -> bool:
-        return self.r == other.r and self.g == other.g and self.b == other.b
+        return self.r8 == other.r8 and self.g8 == other.g8 and self.b8 == other.b8
 
     def __str__(self):
         return "#{:x}".format(int(self)).lower()
@@ -142,4 +172,4 @@ class Color:
         return res
 
     def blend(self, other: 'Color', fraction: float) -> 'Color':
-        return self*(1-fraction) + other*fraction
+        return Color().blend_into(self, other, int(fraction*256))
@@ -0,0 +1,48 @@
+from lib.ha_mqtt_device import BaseEntity, Device, MQTTClient
+from ubinascii import hexlify
+import machine
+
+class DiagnosticSensor(BaseEntity):
+    def __init__(
+        self,
+        mqtt: MQTTClient,
+        *,
+        name: bytes,
+        device: Device,
+        object_id: bytes,
+        unit = None,
+        # text sensors (effect names) aren't measurements
+        measurement = True,
+        unique_id = None,
+        node_id = None,
+        discovery_prefix = b'homeassistant',
+        extra_conf = None,
+    ):
+        hardwareId = hexlify(machine.unique_id())
+
+        objectid = object_id + b'-' + hardwareId #type: ignore
+
+        config = {
+            'uniq_id': unique_id if unique_id else objectid, # type: ignore
+            'entity_category': 'diagnostic',
+        }
+
+        if measurement:
+            config['state_class'] = 'measurement'
+
+        if unit:
+            config['unit_of_measurement'] = unit
+
+        if extra_conf:
+            config.update(extra_conf)
+
+        super().__init__(
+            mqtt,
+            name,
+            component=b'sensor',
+            device=device,
+            object_id=objectid,
+            node_id=node_id,
+            discovery_prefix=discovery_prefix,
+            extra_conf=config
+        )
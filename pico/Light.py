@@ -4,8 +4,16 @@ import uasyncio
 import ujson as json
 from ubinascii import hexlify
 import machine
-from uasyncio import create_task, CancelledError, sleep_ms
-import math
+from transitions import TransitionScheduler, linear
+from light_command import ABSENT, EFFECT_CLEAR, EFFECT_UNKNOWN, LightCommand
+
+# 0 - 255 as ascii, so state payloads are written without formatting numbers
+_NUMBERS = tuple(str(i).encode() for i in range(256))
+
+def _number(value: int) -> bytes:
+    return _NUMBERS[value] if 0 <= value < 256 else str(value).encode()
+
+_BLACK = Color.rgb(0, 0, 0)
 
 class Light(BaseEntity):
     def __init__(
@@ -21,7 +29,7 @@ class Light(BaseEntity):
         discovery_prefix = b'homeassistant',
         extra_conf = None,
         transition_duration_ms = 500,
-        frame_duration_ms = 30
+        transition_easing = linear,
     ):
         cmd_t_suffix = b'set'
 
@@ -32,6 +40,8 @@ class Light(BaseEntity):
         config = {
             'cmd_t': b'~/' + cmd_t_suffix,
             'uniq_id': unique_id if unique_id else objectid, # type: ignore
+            # json schema lights take a 'transition' in every command, Home Assistant
+            # offers it for them without a config key
             'schema': 'json',
             'brightness': True,
             'supported_color_modes': ['rgb'],
@@ -41,13 +51,29 @@ class Light(BaseEntity):
         self.possible_effects = effects
         self.is_on = True
         self.color = Color.rgb(255, 255, 255)
-        self.saved_color = self.color
+        self.saved_color = self.color.copy()
         self.brightness = 255
         self.saved_brightness = self.brightness
         self.transition_duration_ms = transition_duration_ms
-        self.frame_duration_ms = frame_duration_ms
-        self.brightness_transition_task = None
-        self.color_transition_task = None
+        self.transitions = TransitionScheduler(easing=transition_easing)
+
+        # commands are parsed in place (see CommandProcessor), effects matched by their
+        # encoded names
+        self.effect_names = [effect.encode() for effect in effects]
+        self.command_color = Color()
+
+        # state payloads are written into state_buffer, effect names are json encoded once
+        self.effect_json = {effect: json.dumps(effect).encode() for effect in effects}
+        self.state_buffer = bytearray(112 + max([len(name) for name in self.effect_json.values()] + [4]))
+        self.publish_lock = uasyncio.Lock()
+        # what the state published last showed, published is False until the first one
+        self.published = False
+        self.published_on = False
+        self.published_brightness = 0
+        self.published_color = 0
+        self.published_effect = None
+        self.publishes = 0
+        self.duplicates = 0
 
         if len(effects) > 0:
             config['effect_list'] = effects
@@ -72,129 +98,181 @@ class Light(BaseEntity):
     async def init_mqtt(self):
         await super().init_mqtt()
         await self.mqtt.subscribe(self.command_topic)
-        await self.publish_state(self.brightness, self.color)
-
-    async def handle_mqtt_message(self, topic: bytes, message):
-        if topic == self.command_topic:
-            await self._handle_command(message)
-
-    async def _color_transition(self, start_color, target_color):
-        try:
-            total_frames = math.ceil(self.transition_duration_ms/self.frame_duration_ms)
-            for frame in range(total_frames+1):
-                self.color = start_color.blend(target_color, frame/total_frames)
-                await sleep_ms(self.frame_duration_ms)
-
-        except CancelledError:
-            pass
-
-    async def _brightness_transition(self, start_brightness, target_brightness):
-        try:
-            total_frames = math.ceil(self.transition_duration_ms/self.frame_duration_ms)
-            for frame in range(total_frames+1):
-                frac = frame/total_frames
-
-                self.brightness = int(start_brightness * (1 - frac) + target_brightness * frac)
-
-                await sleep_ms(self.frame_duration_ms)
-
-        except CancelledError:
-            pass
-
-    async def start_brightness_transition(self, target_brightness, *, publish = True):
-        if self.brightness_transition_task:
-            self.brightness_transition_task.cancel() # type: ignore
-
-        self.brightness_transition_task = create_task(
-            self._brightness_transition(
-                start_brightness=self.brightness,
-                target_brightness=target_brightness,
-            )
-        )
+        # after a reconnect the broker may not have the state, so it's sent even if unchanged
+        await self.publish_state(self.brightness, self.color, force=True)
 
-        await self.publish_state(target_brightness if publish else None, None)
+    # advances running transitions, called by the render loop once per frame
+    def tick(self, now_ms: int) -> bool:
+        return self.transitions.tick(self, now_ms)
 
-    async def start_color_transition(self, target_color, *, publish = True):
-        if self.color_transition_task:
-            self.color_transition_task.cancel() # type: ignore
+    def _write(self, pos: int, data) -> int:
+        end = pos + len(data)
+        self.state_buffer[pos:end] = data
+        return end
 
-        self.color_transition_task = create_task(
-            self._color_transition(
-                start_color=self.color,
-                target_color=target_color,
-            )
-        )
-
-        if publish:
-            await self.publish_state(None, target_color if publish else None)
-
-    async def publish_state(self, brightness = None, color = None):
-        state = {
-            'state': b'ON' if self.is_on else b'OFF',
-        }
+    # Writes the json state payload into state_buffer, returns its length. brightness
+    # 0 and color -1 leave them out.
+    def _write_state(self, is_on: bool, brightness: int, color: int, effect) -> int:
+        pos = self._write(0, b'{"state":"ON"' if is_on else b'{"state":"OFF"')
 
         if brightness:
-            state['brightness'] = brightness
-
+            pos = self._write(pos, b',"brightness":')
+            pos = self._write(pos, _number(brightness))
+
+        if color >= 0:
+            pos = self._write(pos, b',"color":{"r":')
+            pos = self._write(pos, _NUMBERS[color >> 16])
+            pos = self._write(pos, b',"g":')
+            pos = self._write(pos, _NUMBERS[(color >> 8) & 0xff])
+            pos = self._write(pos, b',"b":')
+            pos = self._write(pos, _NUMBERS[color & 0xff])
+            pos = self._write(pos, b'},"color_mode":"rgb"')
+
+        pos = self._write(pos, b',"effect":')
+        if effect is None:
+            pos = self._write(pos, b'null')
+        else:
+            name = self.effect_json.get(effect)
+            pos = self._write(pos, name if name else json.dumps(effect).encode())
+
+        return self._write(pos, b'}')
+
+    # Publishes the state, unless it's the one published last and force isn't set.
+    # Returns whether it was published.
+    async def publish_state(self, brightness = None, color = None, *, force = False) -> bool:
+        is_on = self.is_on
+        effect = self.effect
+        brightness = brightness or 0
+        packed = -1
         if color:
-            state['color'] = dict(color) #type:ignore
-            state['color_mode'] = b"rgb"
-
-        state['effect'] = self.effect #type:ignore
-
-        await super().publish_state(json.dumps(state))
+            r, g, b = color.r8 + 128 >> 8, color.g8 + 128 >> 8, color.b8 + 128 >> 8
+            packed = r << 16 | g << 8 | b
+
+        if (
+            not force and self.published
+            and self.published_on == is_on
+            and self.published_brightness == brightness
+            and self.published_color == packed
+            and self.published_effect == effect
+        ):
+            self.duplicates += 1
+            return False
+
+        # the buffer is reused, one publish at a time
+        async with self.publish_lock:
+            length = self._write_state(is_on, brightness, packed, effect)
+            await super().publish_state(memoryview(self.state_buffer)[:length])
+
+        self.published = True
+        self.published_on = is_on
+        self.published_brightness = brightness
+        self.published_color = packed
+        self.published_effect = effect
+        self.publishes += 1
+        return True
+
+    # publishes the state the light is heading to, with the targets of running transitions
+    async def publish_target_state(self) -> bool:
+        if not self.is_on:
+            return await self.publish_state()
+
+        transitions = self.transitions
+        brightness = transitions.brightness_target if transitions.brightness_active else self.brightness
+        color = transitions.color_target if transitions.color_active else self.color
+
+        return await self.publish_state(brightness, color)
+
+    # Folds a parsed command into `pending`, an earlier command not applied yet, so that
+    # applying the result once ends in the same state as applying both in order.
+    # Returns False, leaving pending as it was, when that isn't possible: turning the
+    # light on or off saves or restores the colour and brightness the earlier command
+    # set, and the changes of one transition can't take the length of another.
+    def merge_command(self, pending: LightCommand, command: LightCommand) -> bool:
+        changes = pending.state != ABSENT or pending.brightness != ABSENT or pending.color != ABSENT
+        if command.state != ABSENT and changes:
+            return False
+
+        # the changes of both have to take the same time
+        if (
+            changes and pending.transition_ms != command.transition_ms
+            and (command.brightness != ABSENT or command.color != ABSENT)
+        ):
+            return False
+
+        # a command with neither effect nor brightness stops the effect
+        if command.effect == ABSENT and command.brightness == ABSENT:
+            pending.effect = EFFECT_CLEAR
+
+        if command.state != ABSENT:
+            pending.state = command.state
+        # brightness 0 changes nothing, but still keeps the effect
+        if command.brightness > 0 or (command.brightness == 0 and pending.brightness == ABSENT):
+            pending.brightness = command.brightness
+        if command.color != ABSENT:
+            pending.color = command.color
+        # a transition only applies to the changes of its own command
+        if command.state != ABSENT or command.brightness != ABSENT or command.color != ABSENT:
+            pending.transition_ms = command.transition_ms
+
+        # an unavailable effect changes nothing, so it can't replace an earlier one
+        if command.effect != ABSENT and not (command.effect == EFFECT_UNKNOWN and pending.effect != ABSENT):
+            pending.effect = command.effect
+
+        return True
+
+    def _to_brightness(self, target: int, duration_ms: int, now_ms):
+        if duration_ms > 0:
+            self.transitions.start_brightness(self.brightness, target, duration_ms, now_ms)
+        else:
+            self.transitions.set_brightness(self, target)
 
-    async def _handle_command(self, raw_message):
-        try:
-            message = json.loads(raw_message.decode())
-        except ValueError:
-            print("Invalid json command")
-            return
+    def _to_color(self, target: Color, duration_ms: int, now_ms):
+        if duration_ms > 0:
+            self.transitions.start_color(self.color, target, duration_ms, now_ms)
+        else:
+            self.transitions.set_color(self, target)
 
-        is_on = message.get('state', None)
-        brightness = message.get('brightness', None)
-        effect = message.get('effect', None)
-        color = message.get('color', None)
+    # Applies a parsed command, starting its transitions from now_ms, without publishing.
+    # The command's transition length wins over transition_duration_ms, with 0 the
+    # values change at once.
+    def apply_command(self, command: LightCommand, now_ms = None):
+        duration_ms = self.transition_duration_ms if command.transition_ms == ABSENT else command.transition_ms
 
-        bright_coro, color_coro = None, None
+        # retargeting starts from where a running transition is now, not at the last frame
+        if now_ms is not None and self.transitions.active:
+            self.transitions.tick(self, now_ms)
 
-        if is_on:
-            new_state = is_on == 'ON'
+        if command.state != ABSENT:
+            new_state = command.state == 1
 
             if self.is_on != new_state:
                 if new_state:
                     print('Starting off -> on transitions')
-                    color_coro = self.start_color_transition(self.saved_color, publish=False)
-                    bright_coro = self.start_brightness_transition(self.saved_brightness, publish=False)
+                    self._to_color(self.saved_color, duration_ms, now_ms)
+                    self._to_brightness(self.saved_brightness, duration_ms, now_ms)
                 else:
                     print('Starting on -> off transitions')
-                    self.saved_color = self.color
+                    self.saved_color.copy_from(self.color)
                     self.saved_brightness = self.brightness
-                    color_coro = self.start_color_transition(Color.rgb(0,0,0), publish=False)
-                    bright_coro = self.start_brightness_transition(0, publish=False)
+                    self._to_color(_BLACK, duration_ms, now_ms)
+                    self._to_brightness(0, duration_ms, now_ms)
 
                 self.is_on = new_state
 
-        if effect is None and brightness is None:
+        effect = command.effect
+        if effect == EFFECT_CLEAR or (effect == ABSENT and command.brightness == ABSENT):
             self.effect = None
-        elif effect is None:
-            pass
-        elif effect in self.possible_effects:
-            self.effect = effect
-        else:
-            print(f'Unavailable effect recieved: {effect}')
+        elif effect == EFFECT_UNKNOWN:
+            print('Unavailable effect recieved')
+        elif effect >= 0:
+            self.effect = self.possible_effects[effect]
 
-        if brightness:
+        if command.brightness > 0:
             print('Starting brightness transition')
-            bright_coro = self.start_brightness_transition(brightness)
+            self._to_brightness(command.brightness, duration_ms, now_ms)
 
-        if color:
+        color = command.color
+        if color != ABSENT:
             print('Starting color transition')
-            color_coro = self.start_color_transition(Color.from_dict(color))
-
-        if bright_coro and color_coro:
-            await uasyncio.gather(bright_coro, color_coro)  # type: ignore
-        elif color_coro:
-            await color_coro
-        elif bright_coro:
-            await bright_coro
+            self.command_color.set_rgb(color >> 16, (color >> 8) & 0xff, color & 0xff)
+            self._to_color(self.command_color, duration_ms, now_ms)
@@ -0,0 +1,42 @@
+# Final colour stage between the light state and the pixel words. Gamma correction
+# and brightness scaling are folded into one 256 entry table, so every channel value
+# goes through a single lookup. The table is only rebuilt when brightness changes,
+# using integer math over a finer grained gamma table built once on startup.
+_GAMMA_STEPS = 4096
+
+class OutputStage:
+    # stages with the same gamma can share one gamma_table, see shared_with()
+    def __init__(self, gamma = 2.2, gamma_table = None):
+        self.gamma = gamma
+        top = _GAMMA_STEPS - 1
+        self.gamma_table = gamma_table or bytearray(int(255*((i/top) ** gamma) + 0.5) for i in range(_GAMMA_STEPS))
+
+        self.table = bytearray(256)
+        self.brightness = -1
+        # bumped on every rebuild, so consumers can tell when to refresh derived tables
+        self.version = 0
+
+    # a new stage with its own brightness, reusing this stage's gamma table
+    def shared_with(self) -> 'OutputStage':
+        return OutputStage(self.gamma, self.gamma_table)
+
+    def set_brightness(self, brightness: int):
+        if brightness == self.brightness:
+            return False
+
+        self.brightness = brightness
+        table = self.table
+        gamma_table = self.gamma_table
+        top = _GAMMA_STEPS - 1
+        divisor = 255*255
+
+        for value in range(256):
+            table[value] = gamma_table[(value*brightness*top + divisor//2) // divisor]
+
+        self.version += 1
+        return True
+
+    def apply(self, r: int, g: int, b: int, brightness: int):
+        self.set_brightness(brightness)
+        table = self.table
+        return table[r], table[g], table[b]
@@ -0,0 +1,92 @@
+from light_command import CommandParser, LightCommand
+
+# Takes light commands off the MQTT queue as they arrive and applies them once per
+# frame tick. Commands received between two ticks are merged per light, later fields
+# winning (see Light.merge_command), so a burst from a brightness slider drag starts
+# one transition and publishes one state update instead of one of each per message.
+# The few commands that can't be merged into the one before (turning the light on or
+# off after a colour change) are kept in order and applied in the same tick.
+# State updates are left to a StatePublisher, the render loop never waits on MQTT.
+#
+# Messages are parsed in place into preallocated LightCommands (see CommandParser),
+# so receiving and applying a command doesn't allocate.
+#
+# received counts the commands for every light, merged the ones folded into a command
+# still pending and dropped the ones that couldn't be parsed.
+class CommandProcessor:
+    def __init__(self, lights, publisher, *, changed = None, queue_size = 4):
+        self.lights = lights
+        self.topics = {light.command_topic: index for index, light in enumerate(lights)}
+        self.publisher = publisher
+        # uasyncio.Event set on every command, wakes the render loop while it idles
+        self.changed = changed
+
+        self.parser = CommandParser()
+        self.command = LightCommand()
+        # per light, the merged commands waiting for the next tick, in order, and their count
+        self.queues = [[LightCommand() for _ in range(queue_size)] for _ in lights]
+        self.counts = [0]*len(lights)
+        self.pending = 0
+
+        self.received = 0
+        self.merged = 0
+        self.dropped = 0
+        self.applied = 0
+
+    def receive(self, topic: bytes, raw_message):
+        index = self.topics.get(topic)
+        if index is None:
+            return
+
+        self.received += 1
+
+        light = self.lights[index]
+        command = self.command
+        if not self.parser.parse(raw_message, command, light.effect_names):
+            print('Invalid json command')
+            self.dropped += 1
+            return
+
+        queue = self.queues[index]
+        count = self.counts[index]
+        if count and light.merge_command(queue[count - 1], command):
+            self.merged += 1
+        else:
+            if count == len(queue):
+                queue.append(LightCommand())
+
+            pending = queue[count]
+            pending.clear()
+            light.merge_command(pending, command)
+            self.counts[index] = count + 1
+            self.pending += 1
+
+        if self.changed:
+            self.changed.set()
+
+    # applies the pending commands, called by the render loop before every tick,
+    # returns whether there were any
+    def apply(self, now_ms: int) -> bool:
+        if not self.pending:
+            return False
+
+        for index in range(len(self.lights)):
+            count = self.counts[index]
+            if not count:
+                continue
+
+            light = self.lights[index]
+            queue = self.queues[index]
+            for i in range(count):
+                light.apply_command(queue[i], now_ms)
+
+            self.applied += count
+            self.counts[index] = 0
+            self.publisher.request(light)
+
+        self.pending = 0
+        return True
+
+    async def run(self, queue):
+        async for topic, message, retained in queue: # type: ignore
+            self.receive(topic, message)
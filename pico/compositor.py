@@ -0,0 +1,158 @@
+from frame_writer import FrameWriter
+from frame_prefetcher import FramePrefetcher
+import time
+
+# One Home Assistant light shown on a range of the strip (a Segment view of the
+# output), with its own output stage, effect reader and prefetcher.
+#
+# version counts changes of what the segment shows, buffer_versions holds the version
+# each output buffer was last written with, so the compositor can tell which buffers
+# still need the current content.
+class LightSegment:
+    def __init__(self, light, view, stage, *, prefetch_buffer_count = 4, profiler = None):
+        self.light = light
+        self.view = view
+        self.writer = FrameWriter(view, stage)
+        self.prefetcher = FramePrefetcher(buffer_count=prefetch_buffer_count, profiler=profiler)
+        self.reader = None
+        # effect name -> frame to resume it from
+        self.positions = {}
+        self.next_frame_ms = 0
+
+        self.version = -1
+        self.buffer_versions = [-1]*len(view.manager.buffers)
+        self.written = False
+        # the solid colour (-1 when an effect was shown) and brightness written last
+        self.color = -1
+        self.brightness = -1
+
+    def stop_effect(self):
+        if self.reader:
+            position = self.prefetcher.position()
+            # wrapped to the effect length when the reader knows it, procedural effects
+            # have none and text effects only once they were played to the end
+            frame_count = getattr(self.reader, 'frame_count', None)
+            if frame_count:
+                position %= frame_count
+            self.positions[self.reader.effect_name] = position
+            self.prefetcher.stop()
+            self.reader = None
+
+    # Updates the segment in the buffer being written, returns True when it wrote it
+    def render(self, now_ms: int, open_effect, resume: bool) -> bool:
+        light = self.light
+        light.tick(now_ms)
+
+        if not light.effect:
+            self.stop_effect()
+
+            color = int(light.color)
+            if color == self.color and light.brightness == self.brightness:
+                return False
+
+            self.writer.fill(light.color.to_tuple(), light.brightness)
+            self.color = color
+            self.brightness = light.brightness
+            return True
+
+        if not self.reader or self.reader.effect_name != light.effect:
+            self.stop_effect()
+            self.reader = open_effect(light.effect, self)
+            self.prefetcher.start(self.reader, self.positions.get(light.effect, 0) if resume else 0)
+            self.next_frame_ms = now_ms
+            self.color = -1
+
+        if time.ticks_diff(self.next_frame_ms, now_ms) > 0:
+            return False
+
+        delay = self.reader.frame_delay_ms
+        self.next_frame_ms = time.ticks_add(self.next_frame_ms, delay)
+        # don't try to catch up after falling behind by more than a frame
+        if time.ticks_diff(now_ms, self.next_frame_ms) > 0:
+            self.next_frame_ms = time.ticks_add(now_ms, delay)
+
+        frame = self.prefetcher.next_frame()
+        if frame is None:
+            return False
+
+        # a row repeated by the effect is already in the buffer
+        if self.prefetcher.repeated and light.brightness == self.brightness:
+            return False
+
+        self.writer.write(frame, light.brightness)
+        self.brightness = light.brightness
+        return True
+
+    # ms until the segment needs to render again: the next effect frame, the next
+    # transition step or idle_ms when only a state change can alter it
+    def due_in(self, now_ms: int, frame_duration_ms: int, idle_ms: int) -> int:
+        if self.reader:
+            return time.ticks_diff(self.next_frame_ms, now_ms)
+        if self.light.transitions.active:
+            return frame_duration_ms
+        return idle_ms
+
+# Renders every segment into the output's back buffer once per tick. Segments whose
+# content didn't change are not rendered again: the buffer being written already holds
+# them, or they are copied over from the buffer shown last, which is cheaper than
+# decoding or filling them again. The per tick cost of an idle segment is a few
+# comparisons, so it grows with the number of active segments only.
+#
+# dirty tells whether the tick changed anything, the output only needs to be shown
+# then. When nothing changed the back buffer is left as it is, stale segments are
+# copied on the next tick that writes one.
+class Compositor:
+    def __init__(self, lights, segments, open_effect, *, resume_effects = True, frame_duration_ms = 30, idle_ms = 1000):
+        self.lights = lights
+        self.segments = segments
+        self.open_effect = open_effect
+        self.resume_effects = resume_effects
+        self.frame_duration_ms = frame_duration_ms
+        self.idle_ms = idle_ms
+        # segments whose effect failed since the last call to take_errors()
+        self.errors = []
+        self.dirty = False
+        self.rendered = 0
+        self.copied = 0
+
+    # renders one tick and returns the ms until the next one is needed
+    def tick(self, now_ms: int) -> int:
+        back = self.lights.back
+        due_in = self.idle_ms
+        dirty = False
+
+        for segment in self.segments:
+            try:
+                written = segment.render(now_ms, self.open_effect, self.resume_effects)
+            except Exception as e:
+                # unreadable effect files and ones that fail to decode alike
+                print(e)
+                segment.stop_effect()
+                segment.light.effect = None
+                self.errors.append(segment)
+                written = False
+
+            segment.written = written
+            if written:
+                segment.version += 1
+                segment.buffer_versions[back] = segment.version
+                self.rendered += 1
+                dirty = True
+
+            due_in = min(due_in, segment.due_in(now_ms, self.frame_duration_ms, self.idle_ms))
+
+        if dirty:
+            for segment in self.segments:
+                if not segment.written and segment.buffer_versions[back] != segment.version:
+                    views = segment.view.views
+                    views[back][:] = views[back ^ 1]
+                    segment.buffer_versions[back] = segment.version
+                    self.copied += 1
+
+        self.dirty = dirty
+        return due_in
+
+    def take_errors(self):
+        errors = self.errors
+        self.errors = []
+        return errors
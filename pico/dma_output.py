@@ -0,0 +1,86 @@
+from array import array
+import rp2
+import time
+import uasyncio
+from uasyncio import ThreadSafeFlag
+from frame_writer import FrameWriter
+from strip_manager import StripManager
+
+# TX FIFO of state machine 0 of each PIO block, the others follow 4 bytes apart
+_PIO_TXF0 = (0x50200010, 0x50300010)
+# DMA request signal of TX FIFO 0 of each PIO block
+_DREQ_PIO_TX0 = (0, 8)
+# 24 bits at 800 kHz
+WORD_US = 30
+
+# StripManager that hands frames to DMA instead of pushing them from the cpu. show()
+# starts one DMA channel per chain, paced by its state machine's TX FIFO, and returns
+# at once, so the next frame is decoded while this one is sent. Frames are double
+# buffered: pixels is always the buffer that isn't being sent, and show() swaps them.
+#
+# The words go to the FIFO as they are, without the shift Neopixel.show() applies, so
+# the channel shifts handed to FrameWriter already include it. Await wait_done()
+# before the next show(), it returns once the previous frame is out and latched.
+class DmaStripManager(StripManager):
+    def __init__(self, strips, *, mode = None, latch_us = 300):
+        super().__init__(strips, mode=mode, latch_us=latch_us)
+
+        self.buffers.append(array('I', [0]*self.led_count))
+
+        cut = self.strips[0].cut
+        shift = self.shift or FrameWriter.default_shift
+        self.shift = {channel: value + cut for channel, value in shift.items()}
+
+        self.channels = []
+        for state_machine, strip in enumerate(self.strips):
+            pio, index = divmod(state_machine, 4)
+
+            dma = rp2.DMA()
+            dma.irq(self._transfer_done)
+            # irq_quiet defaults to True, which would keep _transfer_done from running
+            ctrl = dma.pack_ctrl(size=2, inc_write=False, irq_quiet=False, treq_sel=_DREQ_PIO_TX0[pio] + index)
+            reads = [memoryview(buffer)[strip.start:strip.start + strip.count] for buffer in self.buffers]
+
+            self.channels.append((dma, ctrl, _PIO_TXF0[pio] + 4*index, reads))
+
+        self.transfer_us = max(strip.count for strip in self.strips)*WORD_US
+        self.done = ThreadSafeFlag()
+        self.pending = 0
+        self.ready_at = time.ticks_us()
+
+    def _transfer_done(self, dma):
+        self.pending -= 1
+        if not self.pending:
+            self.done.set()
+
+    async def wait_done(self):
+        while self.pending:
+            await self.done.wait()
+
+        # the last words are still shifting out when the channel finishes
+        delay = time.ticks_diff(self.ready_at, time.ticks_us())
+        if delay > 1000:
+            await uasyncio.sleep_ms(delay // 1000)
+            delay = time.ticks_diff(self.ready_at, time.ticks_us())
+        if delay > 0:
+            time.sleep_us(delay)
+
+    def show(self):
+        # only spins when wait_done() wasn't awaited before
+        for dma, _, _, _ in self.channels:
+            while dma.active():
+                pass
+        delay = time.ticks_diff(self.ready_at, time.ticks_us())
+        if delay > 0:
+            time.sleep_us(delay)
+
+        front = self.back
+        self.pending = len(self.channels)
+        for dma, ctrl, fifo, reads in self.channels:
+            read = reads[front]
+            dma.config(read=read, write=fifo, count=len(read), ctrl=ctrl, trigger=True)
+
+        self.ready_at = time.ticks_add(time.ticks_us(), self.transfer_us + self.latch_us)
+
+        self.back = front ^ 1
+        self.pixels = self.buffers[self.back]
@@ -0,0 +1,195 @@
+from effect_reader import colors_into
+import gc
+import uasyncio
+
+# An effect decoded into RAM, one bytearray of packed r, g, b bytes per stored row.
+# Exposes the same interface as the file readers, so the rest of the code doesn't
+# care where the frames come from.
+class cached_effect:
+    def __init__(self, reader):
+        self.effect_name = reader.effect_name
+        self.filename = reader.filename
+        self.frame_delay_ms = reader.frame_delay_ms
+        self.light_count = reader.light_count
+        self.rows = []
+        self.repeats = []
+        self.frame_count = 0
+        self.size = 0
+
+    def read_rows(self):
+        for i in range(len(self.rows)):
+            yield self.repeats[i], self.rows[i]
+
+    def read_runs(self, start_frame = 0):
+        if not self.rows:
+            return
+
+        start_frame %= self.frame_count
+        first = 0
+        while start_frame >= self.repeats[first]:
+            start_frame -= self.repeats[first]
+            first += 1
+
+        while True:
+            for i in range(first, len(self.rows)):
+                yield self.repeats[i] - start_frame, self.rows[i]
+                start_frame = 0
+
+            first = 0
+
+    def read_frames(self, start_frame = 0):
+        for repeat, row in self.read_runs(start_frame):
+            for _ in range(repeat):
+                yield row
+
+# Keeps decoded effects in RAM, least recently used ones are evicted to make room.
+# open() never decodes: on a miss it returns the file reader, so the effect streams
+# right away, and decodes a second reader into the cache from a uasyncio task,
+# yielding between rows. Later opens of the effect get the cached copy.
+#
+# The decoded size of every effect seen is remembered (for text effects that didn't
+# fit, the size at which decoding gave up), so effects that can't fit the budget are
+# streamed without decoding them again. Binary effects know their size up front.
+class EffectCache:
+    def __init__(self, max_fraction = 0.5, collect = gc.collect):
+        # the cache may take up to this fraction of the heap that is free or already cached
+        self.max_fraction = max_fraction
+        self.collect = collect
+        self.entries = {}
+        self.last_used = {}
+        self.used_bytes = 0
+        self.clock = 0
+        # effect name -> decoded size in bytes, or at least that many when it didn't fit
+        self.sizes = {}
+        self.loading = None
+
+        self.hits = 0
+        self.misses = 0
+        self.streamed = 0
+        self.evictions = 0
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'streamed': self.streamed,
+            'evictions': self.evictions,
+            'entries': len(self.entries),
+            'used_bytes': self.used_bytes,
+        }
+
+    def _touch(self, effect_name):
+        self.clock += 1
+        self.last_used[effect_name] = self.clock
+
+    def _evict_one(self):
+        oldest = None
+        for name in self.entries:
+            if (oldest is None or self.last_used[name] < self.last_used[oldest]):
+                oldest = name
+
+        if oldest is None:
+            return False
+
+        self.used_bytes -= self.entries.pop(oldest).size
+        del self.last_used[oldest]
+        self.evictions += 1
+        return True
+
+    def evict(self, effect_name):
+        entry = self.entries.pop(effect_name, None)
+        if entry:
+            self.used_bytes -= entry.size
+            del self.last_used[effect_name]
+
+    def _limit(self) -> int:
+        return int((gc.mem_free() + self.used_bytes) * self.max_fraction) # type: ignore
+
+    def _expected_size(self, effect_name, reader):
+        row_count = getattr(reader, 'row_count', None)
+        if row_count is not None:
+            return row_count * reader.light_count * 3
+        return self.sizes.get(effect_name)
+
+    # Returns the cached effect, or a reader opened with open_reader(effect_name) to
+    # stream it while it is loaded into the cache. Effects known not to fit the budget
+    # are only streamed.
+    def open(self, effect_name, open_reader):
+        entry = self.entries.get(effect_name)
+        if entry:
+            self.hits += 1
+            self._touch(effect_name)
+            return entry
+
+        self.misses += 1
+        reader = open_reader(effect_name)
+
+        # without a collection first free memory is underestimated, which errs on the
+        # side of streaming
+        expected = self._expected_size(effect_name, reader)
+        if expected is not None and expected > self._limit():
+            self.streamed += 1
+        elif self.loading is None:
+            self.loading = effect_name
+            uasyncio.create_task(self._load(effect_name, open_reader(effect_name)))
+
+        return reader
+
+    async def _load(self, effect_name, reader):
+        try:
+            self.collect()
+            limit = self._limit()
+            frame_size = reader.light_count * 3
+
+            expected = self._expected_size(effect_name, reader)
+            if expected is not None:
+                if expected > limit:
+                    self.streamed += 1
+                    return
+
+                # binary effects make room first, text ones only evict others once
+                # the whole effect is known to fit
+                while self.used_bytes + expected > limit and self._evict_one():
+                    pass
+
+            entry = cached_effect(reader)
+
+            # the entries a text effect may replace are still held while it decodes, with
+            # max_fraction at most 0.5 the cache and the new entry both fit the free heap
+            rows = reader.read_rows()
+            for repeat, row in rows:
+                if entry.size + frame_size > limit:
+                    rows.close()
+                    self.sizes[effect_name] = entry.size + frame_size
+                    self.streamed += 1
+                    entry = None
+                    self.collect()
+                    return
+
+                if isinstance(row, bytearray):
+                    buffer = bytearray(row)
+                else:
+                    buffer = bytearray(frame_size)
+                    colors_into(buffer, row)
+
+                entry.rows.append(buffer)
+                entry.repeats.append(repeat)
+                entry.frame_count += repeat
+                entry.size += frame_size
+
+                # let the render loop and mqtt run between rows
+                await uasyncio.sleep_ms(0)
+
+            self.sizes[effect_name] = entry.size
+            while self.used_bytes + entry.size > limit and self._evict_one():
+                pass
+
+            self.entries[effect_name] = entry
+            self.used_bytes += entry.size
+            self._touch(effect_name)
+
+        except Exception:
+            # not cached, the streaming reader reports the error to the light
+            pass
+        finally:
+            self.loading = None
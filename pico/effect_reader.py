@@ -1,5 +1,6 @@
 import ujson as json
 import re
+import struct
 
 row_regex = re.compile("(\\d+)r\\[(.*)\\]\n?")
 value_regex = re.compile("(\\d+)x(\\d+)")
@@ -18,16 +19,32 @@ def parse_row(row: str, color_table):
     for val in row.split(','):
         yield from parse_value(val, color_table)
 
-def parse_rows(f):
+def parse_counted_rows(f):
     for row in f:
         result = re.match(row_regex, row)
         if result:
             count, rest = result.groups()
-            for _ in range(int(count)):
-                yield rest
+            yield int(count), rest
         else:
+            yield 1, row
+
+def parse_rows(f):
+    for count, row in parse_counted_rows(f):
+        for _ in range(count):
             yield row
 
+def colors_into(buffer, values):
+    # writes the 0xRRGGBB ints of a text effect row as packed r, g, b bytes
+    i = 0
+    for val in values:
+        buffer[i] = (val >> 16) & 0xff
+        buffer[i+1] = (val >> 8) & 0xff
+        buffer[i+2] = val & 0xff
+        i += 3
+
+# rows a text effect skips between handing control back, see effect_reader.read_runs
+SKIP_ROWS = 64
+
 class effect_reader:
     def __init__(self, filename: str, effect_name: str):
         self.effect_name = effect_name
@@ -38,12 +55,234 @@ class effect_reader:
 
         self.frame_delay_ms = self.metadata['frame_delay_ms']
         self.light_count = self.metadata['light_count']
+        # only known once the file was read to the end
+        self.frame_count = None
+
+    # Text effects have no index, so frames before start_frame are skipped by their
+    # row repeat counts, without decoding their values. A long skip hands control back
+    # every SKIP_ROWS rows with an empty run (0, None), so the caller can let other
+    # tasks run.
+    def read_runs(self, start_frame = 0):
+        if self.frame_count:
+            start_frame %= self.frame_count
 
-    def read_frames(self):
         with open(self.filename, 'r') as f:
             while True:
                 next(f)
-                for row in parse_rows(f):
-                    yield parse_row(row, self.metadata['colors'])
+                frames = 0
+                skipped = 0
+                for count, row in parse_counted_rows(f):
+                    frames += count
+                    if start_frame >= count:
+                        start_frame -= count
+                        skipped += 1
+                        if skipped % SKIP_ROWS == 0:
+                            yield 0, None
+                        continue
+
+                    yield count - start_frame, parse_row(row, self.metadata['colors'])
+                    start_frame = 0
 
+                if not frames:
+                    return
+
+                self.frame_count = frames
+                start_frame %= frames
                 f.seek(0)
+
+    def read_frames(self, start_frame = 0):
+        for count, row in self.read_runs(start_frame):
+            if not count:
+                continue
+            values = list(row)
+            for _ in range(count):
+                yield values
+
+    # single pass over the file, yielding each stored row with its repeat count
+    def read_rows(self):
+        with open(self.filename, 'r') as f:
+            next(f)
+            for count, row in parse_counted_rows(f):
+                yield count, parse_row(row, self.metadata['colors'])
+
+# Binary effect container written by effects/effect_serializer.py with binary=True,
+# the layouts have to match the ones described there
+BINARY_MAGIC = b'SLFX'
+BINARY_HEADER_FORMAT = '<4sBBHHHIIII'
+BINARY_HEADER_SIZE = struct.calcsize(BINARY_HEADER_FORMAT)
+ROW_HEADER_FORMAT = '<HBH'
+ROW_HEADER_SIZE = struct.calcsize(ROW_HEADER_FORMAT)
+INDEX_ENTRY_FORMAT = '<II'
+INDEX_ENTRY_SIZE = struct.calcsize(INDEX_ENTRY_FORMAT)
+SPAN_HEADER_SIZE = 4
+ROW_RUNS = 0
+ROW_DELTA = 1
+FLAG_WIDE_INDICES = 1
+FLAG_DELTA_ROWS = 2
+
+class binary_effect_reader:
+    def __init__(self, filename: str, effect_name: str):
+        self.effect_name = effect_name
+        self.filename = filename
+
+        with open(filename, 'rb') as f:
+            (
+                magic,
+                self.version,
+                self.flags,
+                self.light_count,
+                self.frame_delay_ms,
+                palette_size,
+                self.row_count,
+                self.frame_count,
+                palette_offset,
+                self.index_offset,
+            ) = struct.unpack(BINARY_HEADER_FORMAT, f.read(BINARY_HEADER_SIZE))
+
+            if magic != BINARY_MAGIC:
+                raise OSError(f'{filename} is not a binary effect file')
+
+            f.seek(palette_offset)
+            self.palette = f.read(palette_size*3)
+
+        self.wide_indices = bool(self.flags & FLAG_WIDE_INDICES)
+
+        # frame is decoded in place, as packed r, g, b bytes
+        self.frame = bytearray(self.light_count*3)
+        self._frame_mv = memoryview(self.frame)
+        self._row_header = bytearray(ROW_HEADER_SIZE)
+        self._index_entry = bytearray(INDEX_ENTRY_SIZE)
+        # worst case is a run for every light, with a 2 byte palette index, delta rows
+        # fall back to whole rows before they get any bigger
+        self._payload = bytearray(self.light_count*3)
+        self._payload_mv = memoryview(self._payload)
+
+    # decodes the runs in payload[i:end] into the frame, starting at byte pos of it
+    def _decode_runs(self, i: int, end: int, pos: int):
+        payload = self._payload
+        palette = self.palette
+        frame = self.frame
+        frame_mv = self._frame_mv
+        wide = self.wide_indices
+
+        while i < end:
+            count = payload[i]
+            if wide:
+                color = (payload[i+1] | (payload[i+2] << 8))*3
+                i += 3
+            else:
+                color = payload[i+1]*3
+                i += 2
+
+            frame[pos] = palette[color]
+            frame[pos+1] = palette[color+1]
+            frame[pos+2] = palette[color+2]
+
+            # fill the rest of the run by doubling the already written part
+            filled = 3
+            total = count*3
+            while filled < total:
+                chunk = min(filled, total - filled)
+                frame_mv[pos+filled:pos+filled+chunk] = frame_mv[pos:pos+chunk]
+                filled += chunk
+
+            pos += total
+
+    # applies the changed spans of a delta row over the previous frame, in place
+    def _decode_spans(self, length: int):
+        payload = self._payload
+
+        i = 0
+        while i < length:
+            start = payload[i] | (payload[i+1] << 8)
+            size = payload[i+2] | (payload[i+3] << 8)
+            i += SPAN_HEADER_SIZE
+
+            self._decode_runs(i, i + size, start*3)
+            i += size
+
+    def _read_row(self, f):
+        f.readinto(self._row_header)
+        repeat, kind, length = struct.unpack(ROW_HEADER_FORMAT, self._row_header)
+
+        f.readinto(self._payload_mv[:length])
+
+        if kind == ROW_RUNS:
+            self._decode_runs(0, length, 0)
+        elif kind == ROW_DELTA:
+            self._decode_spans(length)
+        else:
+            raise OSError(f'Unsupported row kind {kind} in {self.filename}')
+
+        return repeat
+
+    # (first frame, byte offset) of row i, read from the index at the end of the file
+    def _read_index(self, f, i: int):
+        f.seek(self.index_offset + i*INDEX_ENTRY_SIZE)
+        f.readinto(self._index_entry)
+        return struct.unpack(INDEX_ENTRY_FORMAT, self._index_entry)
+
+    # binary search over the index for the row holding frame, a few small reads
+    # instead of decoding everything before it
+    def _find_row(self, f, frame: int):
+        low, high = 0, self.row_count - 1
+        while low < high:
+            middle = (low + high + 1) >> 1
+            if self._read_index(f, middle)[0] <= frame:
+                low = middle
+            else:
+                high = middle - 1
+
+        return low, self._read_index(f, low)[0]
+
+    # the closest row at or before row that is stored whole, and its offset
+    def _keyframe_before(self, f, row: int):
+        while True:
+            offset = self._read_index(f, row)[1]
+            if not self.flags & FLAG_DELTA_ROWS or row == 0:
+                return row, offset
+
+            f.seek(offset)
+            f.readinto(self._row_header)
+            if self._row_header[2] == ROW_RUNS:
+                return row, offset
+
+            row -= 1
+
+    def _rows(self, f, start_row = 0):
+        row, offset = self._keyframe_before(f, start_row) if start_row else (0, BINARY_HEADER_SIZE)
+        f.seek(offset)
+
+        # delta rows between the keyframe and start_row only update the frame
+        for row in range(row, self.row_count):
+            repeat = self._read_row(f)
+            if row >= start_row:
+                yield repeat, self.frame
+
+    def read_rows(self):
+        with open(self.filename, 'rb') as f:
+            yield from self._rows(f)
+
+    # Plays the effect in a loop starting at start_frame (wrapped to the effect length),
+    # which is found through the index, so resuming an effect or starting several strings
+    # on the same frame doesn't scan the file. Yields every stored row once, with the
+    # number of frames it is shown for.
+    def read_runs(self, start_frame = 0):
+        if not self.row_count:
+            return
+
+        with open(self.filename, 'rb') as f:
+            row, first_frame = self._find_row(f, start_frame % self.frame_count)
+            skip = start_frame % self.frame_count - first_frame
+
+            while True:
+                for repeat, frame in self._rows(f, row):
+                    yield repeat - skip, frame
+                    skip = 0
+
+                row = 0
+
+    def read_frames(self, start_frame = 0):
+        for repeat, frame in self.read_runs(start_frame):
+            for _ in range(repeat):
+                yield frame
@@ -0,0 +1,157 @@
+import uasyncio
+from uasyncio import create_task, CancelledError, sleep_ms
+from effect_reader import colors_into
+from frame_profiler import FrameProfiler
+
+# Reads effect frames ahead of playback into a ring of preallocated buffers.
+# A background task keeps up to buffer_count - 1 rows decoded and the render loop
+# only takes the next ready buffer. The buffer returned last stays owned by the render
+# loop until the following next_frame() call, so it is never overwritten mid-push.
+#
+# Rows are read with the number of frames they are shown for (reader.read_runs), a
+# repeated row takes one buffer and is returned again with `repeated` set, so the
+# render loop can tell the output doesn't need to change. Empty runs (0, None) only
+# give the reader a chance to let other tasks run.
+class FramePrefetcher:
+    def __init__(self, buffer_count = 4, profiler = None):
+        self.buffer_count = buffer_count
+        self.profiler = profiler or FrameProfiler(enabled=False)
+        self.buffers = []
+        self.buffers_mv = []
+        self.read_index = 0
+        self.write_index = 0
+        self.ready_count = 0
+        self.underruns = 0
+        self.frames_read = 0
+        self.frames_shown = 0
+        self.start_frame = 0
+        # frames each ready buffer is shown for, and how many more times the current one is
+        self.counts = []
+        self.remaining = 0
+        self.current = None
+        self.repeated = False
+        self.task = None
+        self.error = None
+        self.slot_freed = uasyncio.Event()
+
+    def _allocate(self, light_count: int):
+        size = light_count*3
+
+        if self.buffers and len(self.buffers[0]) == size:
+            return
+
+        self.buffers = [bytearray(size) for _ in range(self.buffer_count)]
+        self.buffers_mv = [memoryview(buffer) for buffer in self.buffers]
+        self.counts = [0]*self.buffer_count
+
+    # starts reading the effect at start_frame, see position() for resuming it later
+    def start(self, reader, start_frame = 0):
+        self.stop()
+        self._allocate(reader.light_count)
+
+        self.read_index = 0
+        self.write_index = 0
+        self.ready_count = 0
+        self.underruns = 0
+        self.frames_read = 0
+        self.frames_shown = 0
+        self.start_frame = start_frame
+        self.remaining = 0
+        self.current = None
+        self.repeated = False
+        self.error = None
+        self.slot_freed.clear()
+
+        self.task = create_task(self._fill(reader.read_runs(start_frame)))
+
+    # frame number the effect would continue from, frames read ahead but not shown
+    # yet don't count
+    def position(self):
+        return self.start_frame + self.frames_shown
+
+    def stop(self):
+        if self.task:
+            self.task.cancel() # type: ignore
+            self.task = None
+
+    def _copy_frame(self, frame, index: int):
+        if isinstance(frame, bytearray):
+            self.buffers_mv[index][:] = frame
+            return
+
+        colors_into(self.buffers[index], frame)
+
+    async def _fill(self, runs):
+        try:
+            while True:
+                while self.ready_count >= self.buffer_count - 1:
+                    await self.slot_freed.wait()
+                    self.slot_freed.clear()
+
+                start = self.profiler.start()
+                run = next(runs, None)
+                self.profiler.record('read', start)
+
+                if run is None:
+                    self.error = OSError('Effect has no frames')
+                    return
+
+                count, frame = run
+                if not count:
+                    # the reader is skipping to the start frame
+                    await sleep_ms(0)
+                    continue
+
+                start = self.profiler.start()
+                self._copy_frame(frame, self.write_index)
+                self.profiler.record('decode', start)
+
+                self.counts[self.write_index] = count
+                self.write_index = (self.write_index + 1) % self.buffer_count
+                self.ready_count += 1
+                self.frames_read += count
+
+                # let the render loop and mqtt run between reads
+                await sleep_ms(0)
+
+        except CancelledError:
+            pass
+        except Exception as e:
+            # a malformed or truncated effect, reported by next_frame()
+            self.error = e
+
+    # Returns the next frame as packed r, g, b bytes or None when the reader fell behind.
+    # repeated tells whether it is the same buffer as last time, showing a row again.
+    # Errors from the reader task are re-raised here, in the render loop.
+    def next_frame(self):
+        if self.remaining:
+            self.remaining -= 1
+            self.frames_shown += 1
+            self.profiler.effect_frames += 1
+            self.repeated = True
+            return self.current
+
+        self.repeated = False
+
+        if self.ready_count == 0:
+            if self.error:
+                error, self.error = self.error, None
+                raise error
+
+            if self.frames_shown:
+                self.underruns += 1
+                self.profiler.underruns += 1
+
+            return None
+
+        frame = self.buffers[self.read_index]
+        self.current = frame
+        self.remaining = self.counts[self.read_index] - 1
+
+        self.read_index = (self.read_index + 1) % self.buffer_count
+        self.ready_count -= 1
+        self.frames_shown += 1
+        self.profiler.effect_frames += 1
+        self.slot_freed.set()
+
+        return frame
@@ -0,0 +1,123 @@
+from array import array
+import time
+import gc
+
+STAGES = ('read', 'decode', 'push', 'show', 'sleep')
+
+# Lightweight per frame profiling of the render loop. Every stage keeps its last
+# `samples` durations (in us) in a ring buffer, summaries are only computed when
+# telemetry is published. With enabled=False every call returns right away.
+#
+# read   - reader step in the prefetch task (sd read and row decoding)
+# decode - copying the decoded frame into the prefetch ring
+# push   - converting the frame into pixel words
+# show   - sending the words to the leds
+# sleep  - time actually spent waiting for the next frame
+#
+# gc_pauses and the pause times only cover collections run through collect(). The
+# ones the allocator runs in the middle of a frame can't be timed, they are counted in
+# gc_allocator_collections when the heap drops by more than ALLOCATOR_GC_DROP between
+# two frames (objects are only freed by a collection, apart from small reallocations).
+#
+# effect_frames and underruns are counted by the FramePrefetchers of every segment:
+# effect frames shown and frames that weren't read in time.
+ALLOCATOR_GC_DROP = 1024
+
+class FrameProfiler:
+    def __init__(self, enabled = True, samples = 64):
+        self.enabled = enabled
+        self.samples = samples
+        self.timings = {stage: array('I', [0]*samples) for stage in STAGES}
+        self.counts = {stage: 0 for stage in STAGES}
+        self.reset()
+
+    def reset(self):
+        for stage in STAGES:
+            self.counts[stage] = 0
+
+        self.frames = 0
+        self.late_frames = 0
+        self.effect_frames = 0
+        self.underruns = 0
+        self.gc_pauses = 0
+        self.gc_pause_us = 0
+        self.gc_pause_max_us = 0
+        self.gc_allocator_collections = 0
+        self.heap_peak = 0
+        self.heap_last = 0
+
+    def start(self) -> int:
+        return time.ticks_us() if self.enabled else 0
+
+    def record(self, stage: str, start_us: int):
+        if not self.enabled:
+            return
+
+        count = self.counts[stage]
+        self.timings[stage][count % self.samples] = time.ticks_diff(time.ticks_us(), start_us)
+        self.counts[stage] = count + 1
+
+    def frame(self, late = False):
+        if not self.enabled:
+            return
+
+        self.frames += 1
+        if late:
+            self.late_frames += 1
+
+        heap = gc.mem_alloc() # type: ignore
+        if heap > self.heap_peak:
+            self.heap_peak = heap
+        if heap < self.heap_last - ALLOCATOR_GC_DROP:
+            self.gc_allocator_collections += 1
+        self.heap_last = heap
+
+    def reset_heap(self):
+        self.heap_peak = gc.mem_alloc() if self.enabled else 0 # type: ignore
+
+    # runs gc.collect() and returns how long it took
+    def collect(self) -> int:
+        start = time.ticks_us()
+        gc.collect()
+        pause = time.ticks_diff(time.ticks_us(), start)
+
+        self.gc_pauses += 1
+        self.gc_pause_us += pause
+        if pause > self.gc_pause_max_us:
+            self.gc_pause_max_us = pause
+        self.heap_last = gc.mem_alloc() # type: ignore
+
+        return pause
+
+    def stage_stats(self, stage: str):
+        count = min(self.counts[stage], self.samples)
+        if not count:
+            return 0, 0
+
+        samples = self.timings[stage]
+        total = 0
+        worst = 0
+        for i in range(count):
+            total += samples[i]
+            if samples[i] > worst:
+                worst = samples[i]
+
+        return total // count, worst
+
+    def summary(self):
+        result = {}
+        for stage in STAGES:
+            avg, worst = self.stage_stats(stage)
+            result[stage + '_avg_us'] = avg
+            result[stage + '_max_us'] = worst
+
+        result['frames'] = self.frames
+        result['late_frames'] = self.late_frames
+        result['effect_frames'] = self.effect_frames
+        result['underruns'] = self.underruns
+        result['gc_pauses'] = self.gc_pauses
+        result['gc_pause_max_us'] = self.gc_pause_max_us
+        result['gc_allocator_collections'] = self.gc_allocator_collections
+        result['heap_peak'] = self.heap_peak
+
+        return result
@@ -0,0 +1,101 @@
+from DiagnosticSensor import DiagnosticSensor
+from frame_profiler import STAGES
+from uasyncio import sleep_ms
+import time
+
+# metrics published as text, the others are numbers
+_TEXT_METRICS = (b'effect', b'heap_peak_effect')
+
+# Publishes FrameProfiler summaries as Home Assistant diagnostic sensors, along with
+# the merged and dropped counters of a CommandProcessor, the heap marks and
+# collection counters of a GcManager and the EffectCache stats when they are given
+class FrameTelemetry:
+    def __init__(self, profiler, mqtt, device, *, interval_ms = 60_000, commands = None, gc_manager = None, effect_cache = None):
+        self.profiler = profiler
+        self.commands = commands
+        self.gc_manager = gc_manager
+        self.effect_cache = effect_cache
+        self.interval_ms = interval_ms
+        self.publish_us = 0
+
+        metrics = [
+            (b'late_frames', b'Late frames', None),
+            (b'frames', b'Frames', None),
+            (b'effect_frames', b'Effect frames', None),
+            (b'underruns', b'Effect underruns', None),
+            (b'gc_pauses', b'GC scheduled pauses', None),
+            (b'gc_pause_max_us', b'GC scheduled pause max', 'us'),
+            (b'gc_allocator_collections', b'GC allocator collections', None),
+            (b'heap_peak', b'Heap peak', 'B'),
+            (b'publish_us', b'Telemetry publish time', 'us'),
+        ]
+
+        if commands:
+            metrics.append((b'commands_merged', b'Commands merged', None))
+            metrics.append((b'commands_dropped', b'Commands dropped', None))
+
+        if gc_manager:
+            metrics.append((b'effect', b'Effect', None))
+            metrics.append((b'effect_heap_peak', b'Effect heap peak', 'B'))
+            metrics.append((b'effect_free_min', b'Effect free heap min', 'B'))
+            metrics.append((b'heap_peak_effect', b'Heap peak effect', None))
+            metrics.append((b'heap_peak_effect_bytes', b'Heap peak effect peak', 'B'))
+            metrics.append((b'gc_idle_collections', b'GC idle collections', None))
+            metrics.append((b'gc_urgent_collections', b'GC urgent collections', None))
+            metrics.append((b'gc_deferred', b'GC deferred', None))
+
+        if effect_cache:
+            metrics.append((b'cache_hits', b'Effect cache hits', None))
+            metrics.append((b'cache_misses', b'Effect cache misses', None))
+            metrics.append((b'cache_streamed', b'Effect cache streamed', None))
+            metrics.append((b'cache_evictions', b'Effect cache evictions', None))
+            metrics.append((b'cache_used_bytes', b'Effect cache used', 'B'))
+
+        for stage in STAGES:
+            metrics.append((stage.encode() + b'_avg_us', stage.encode() + b' time', 'us'))
+            metrics.append((stage.encode() + b'_max_us', stage.encode() + b' time max', 'us'))
+
+        self.sensors = {
+            key.decode(): DiagnosticSensor(
+                mqtt,
+                name=name,
+                device=device,
+                object_id=b'frame-' + key.replace(b'_', b'-'),
+                unit=unit,
+                measurement=key not in _TEXT_METRICS,
+            ) for key, name, unit in metrics
+        }
+
+    async def init_mqtt(self):
+        for sensor in self.sensors.values():
+            await sensor.init_mqtt()
+
+    async def publish(self):
+        start = time.ticks_us()
+
+        summary = self.profiler.summary()
+        # cost of the previous publish, so the overhead of telemetry itself is visible
+        summary['publish_us'] = self.publish_us
+
+        if self.commands:
+            summary['commands_merged'] = self.commands.merged
+            summary['commands_dropped'] = self.commands.dropped
+
+        if self.gc_manager:
+            summary.update(self.gc_manager.summary())
+
+        if self.effect_cache:
+            for key, value in self.effect_cache.stats().items():
+                summary['cache_' + key] = value
+
+        for key, sensor in self.sensors.items():
+            await sensor.publish_state(str(summary[key]))
+
+        self.publish_us = time.ticks_diff(time.ticks_us(), start)
+
+    async def run(self):
+        while True:
+            await sleep_ms(self.interval_ms)
+
+            if self.profiler.enabled:
+                await self.publish()
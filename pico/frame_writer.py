@@ -0,0 +1,62 @@
+from array import array
+
+# Converts a whole frame of packed r, g, b bytes into the pixel words of a Neopixel
+# in a single pass. The output stage table (gamma and brightness) is expanded into
+# per channel tables that already hold the value shifted into its place in the word,
+# so each pixel costs three table lookups and two ors. lights.pixels is looked up on
+# every frame, double buffered outputs swap it after each show().
+class FrameWriter:
+    # ws2812 order, used when the Neopixel doesn't say how it packs the words
+    default_shift = {'R': 8, 'G': 16, 'B': 0}
+
+    def __init__(self, lights, stage):
+        self.lights = lights
+        self.stage = stage
+
+        shift = getattr(lights, 'shift', None) or self.default_shift
+        self.red_shift = shift['R']
+        self.green_shift = shift['G']
+        self.blue_shift = shift['B']
+
+        self.red = array('I', [0]*256)
+        self.green = array('I', [0]*256)
+        self.blue = array('I', [0]*256)
+        self.stage_version = -1
+
+    def set_brightness(self, brightness: int):
+        self.stage.set_brightness(brightness)
+
+        if self.stage.version == self.stage_version:
+            return
+
+        self.stage_version = self.stage.version
+        table = self.stage.table
+        red, green, blue = self.red, self.green, self.blue
+        red_shift, green_shift, blue_shift = self.red_shift, self.green_shift, self.blue_shift
+
+        for value in range(256):
+            scaled = table[value]
+            red[value] = scaled << red_shift
+            green[value] = scaled << green_shift
+            blue[value] = scaled << blue_shift
+
+    def write(self, frame, brightness: int):
+        self.set_brightness(brightness)
+
+        red, green, blue = self.red, self.green, self.blue
+        pixels = self.lights.pixels
+
+        j = 0
+        for i in range(min(len(frame) // 3, len(pixels))):
+            pixels[i] = red[frame[j]] | green[frame[j+1]] | blue[frame[j+2]]
+            j += 3
+
+    def fill(self, color, brightness: int):
+        self.set_brightness(brightness)
+
+        r, g, b = color
+        word = self.red[r] | self.green[g] | self.blue[b]
+
+        pixels = self.lights.pixels
+        for i in range(len(pixels)):
+            pixels[i] = word
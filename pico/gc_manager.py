@@ -0,0 +1,109 @@
+import gc
+
+# Runs gc.collect() in the slack left at the end of a frame, instead of leaving it to
+# the allocator, which collects when the heap runs out, usually in the middle of one.
+# MicroPython has no incremental collector, so the knobs are when to collect:
+#
+# A collection is due once alloc_budget bytes were allocated since the last one or
+# the free heap dropped below low_free. It runs when the slack before the next frame
+# is longer than the expected pause (the longest recent one, decaying) plus margin_us,
+# or regardless once less than urgent_free is left, as the allocator would collect
+# soon anyway. gc.threshold() is set to backstop_bytes, so a stretch of frames
+# without enough slack still gets a collection before the heap is exhausted.
+#
+# The heap high-water mark and the lowest free heap are kept per effect, for the
+# effect opened last (None until the first one). summary() reports them for the
+# current effect, and which effect has the highest mark of all.
+class GcManager:
+    def __init__(
+        self,
+        profiler,
+        *,
+        alloc_budget = 32*1024,
+        low_free = 32*1024,
+        urgent_free = 8*1024,
+        backstop_bytes = 96*1024,
+        margin_us = 500,
+    ):
+        self.profiler = profiler
+        self.alloc_budget = alloc_budget
+        self.low_free = low_free
+        self.urgent_free = urgent_free
+        self.margin_us = margin_us
+
+        # the first collection gives the pause estimate something to start from
+        self.pause_us = 0
+        self.collect()
+        self.heap_size = gc.mem_alloc() + gc.mem_free() # type: ignore
+        if backstop_bytes:
+            gc.threshold(backstop_bytes) # type: ignore
+
+        # effect name -> [heap high-water mark, lowest free heap]
+        self.marks = {}
+        self.effect = None
+        self.mark = self.marks[None] = [self.alloc_after, self.heap_size - self.alloc_after]
+
+        self.idle_collections = 0
+        self.urgent_collections = 0
+        self.deferred = 0
+
+    # starts attributing the heap to effect_name
+    def begin(self, effect_name):
+        self.effect = effect_name
+        mark = self.marks.get(effect_name)
+        if mark is None:
+            alloc = gc.mem_alloc() # type: ignore
+            mark = self.marks[effect_name] = [alloc, self.heap_size - alloc]
+        self.mark = mark
+
+    def collect(self):
+        pause = self.profiler.collect()
+        self.pause_us = pause if pause > self.pause_us else self.pause_us - (self.pause_us >> 3)
+        self.alloc_after = gc.mem_alloc() # type: ignore
+
+    # Called once per frame with the us left before the next one, collects if it's due
+    # and fits. Returns whether it collected.
+    def idle(self, slack_us: int) -> bool:
+        alloc = gc.mem_alloc() # type: ignore
+        free = self.heap_size - alloc
+
+        mark = self.mark
+        if alloc > mark[0]:
+            mark[0] = alloc
+        if free < mark[1]:
+            mark[1] = free
+
+        if alloc - self.alloc_after < self.alloc_budget and free >= self.low_free:
+            return False
+
+        if free < self.urgent_free:
+            self.urgent_collections += 1
+        elif slack_us < self.pause_us + self.margin_us:
+            self.deferred += 1
+            return False
+        else:
+            self.idle_collections += 1
+
+        self.collect()
+        return True
+
+    def summary(self):
+        mark = self.mark
+
+        peak_effect = None
+        peak = -1
+        for effect, (heap_peak, _) in self.marks.items():
+            if heap_peak > peak:
+                peak_effect = effect
+                peak = heap_peak
+
+        return {
+            'effect': self.effect or 'none',
+            'effect_heap_peak': mark[0],
+            'effect_free_min': mark[1],
+            'heap_peak_effect': peak_effect or 'none',
+            'heap_peak_effect_bytes': peak,
+            'gc_idle_collections': self.idle_collections,
+            'gc_urgent_collections': self.urgent_collections,
+            'gc_deferred': self.deferred,
+        }
@@ -0,0 +1,332 @@
+from micropython import const
+
+# fields of a LightCommand the message didn't have
+ABSENT = const(-1)
+# effect of a merged command that stopped the effect (see Light.merge_command)
+EFFECT_CLEAR = const(-2)
+# effect the light doesn't have
+EFFECT_UNKNOWN = const(-3)
+
+# A Home Assistant json light command as plain ints, so one can be filled in place for
+# every message. state is 1 for ON and 0 for OFF, color is packed 0xRRGGBB, effect an
+# index into the light's effects and transition_ms the transition length. Fields the
+# message didn't have are ABSENT.
+class LightCommand:
+    __slots__ = ('state', 'brightness', 'color', 'effect', 'transition_ms')
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.state = ABSENT
+        self.brightness = ABSENT
+        self.color = ABSENT
+        self.effect = ABSENT
+        self.transition_ms = ABSENT
+
+_STATE = b'state'
+_BRIGHTNESS = b'brightness'
+_COLOR = b'color'
+_EFFECT = b'effect'
+_TRANSITION = b'transition'
+_ON = b'ON'
+_OFF = b'OFF'
+_NULL = b'null'
+
+_QUOTE = const(34)
+_BACKSLASH = const(92)
+_COMMA = const(44)
+_COLON = const(58)
+_MINUS = const(45)
+_DOT = const(46)
+_ZERO = const(48)
+_NINE = const(57)
+_OPEN_BRACE = const(123)
+_CLOSE_BRACE = const(125)
+_OPEN_BRACKET = const(91)
+_CLOSE_BRACKET = const(93)
+
+# Parses the json of a light command straight from the received bytes (or a
+# memoryview of them) into a LightCommand, without decoding it to a str or building
+# a dict. Only the fields of the Home Assistant json light schema are read, anything
+# else is skipped. Numbers are kept as thousandths internally, so a transition of
+# 0.5 s becomes 500 ms without floats.
+#
+# The position and the last string and number read are kept on the parser instead
+# of being returned, so parsing a well formed message allocates nothing.
+class CommandParser:
+    def __init__(self):
+        self.data = b''
+        self.i = 0
+        self.end = 0
+        # the last string read, without its quotes
+        self.start = 0
+        self.stop = 0
+        self.escaped = False
+        # the last number read, in thousandths
+        self.value = 0
+
+    # Fills command from data, effects are the light's effect names as bytes.
+    # Returns False when data isn't a json object.
+    def parse(self, data, command: LightCommand, effects) -> bool:
+        command.clear()
+        self.data = data
+        self.i = 0
+        self.end = len(data)
+
+        try:
+            return self._parse(command, effects)
+        except IndexError:
+            # cut short
+            return False
+        except (ValueError, UnicodeError):
+            # an effect name with an invalid escape (see _effect)
+            return False
+        finally:
+            self.data = b''
+
+    def _parse(self, command: LightCommand, effects) -> bool:
+        if self._next() != _OPEN_BRACE:
+            return False
+
+        if self._next() == _CLOSE_BRACE:
+            return self._at_end()
+        self.i -= 1
+
+        while True:
+            if self._next() != _QUOTE or not self._string():
+                return False
+            key_start = self.start
+            key_stop = self.stop
+
+            if self._next() != _COLON:
+                return False
+
+            if self._is(key_start, key_stop, _STATE):
+                if self._next() != _QUOTE or not self._string():
+                    return False
+                if self._is(self.start, self.stop, _ON):
+                    command.state = 1
+                elif self._is(self.start, self.stop, _OFF):
+                    command.state = 0
+                else:
+                    return False
+
+            elif self._is(key_start, key_stop, _BRIGHTNESS):
+                if not self._number():
+                    return False
+                # out of range values would index past the output stage's gamma table
+                value = self.value // 1000
+                command.brightness = 0 if value < 0 else 255 if value > 255 else value
+
+            elif self._is(key_start, key_stop, _TRANSITION):
+                if not self._number():
+                    return False
+                command.transition_ms = self.value
+
+            elif self._is(key_start, key_stop, _COLOR):
+                if not self._color(command):
+                    return False
+
+            elif self._is(key_start, key_stop, _EFFECT):
+                c = self._next()
+                if c == _QUOTE:
+                    if not self._string():
+                        return False
+                    command.effect = self._effect(effects)
+                else:
+                    self.i -= 1
+                    if not self._literal(_NULL):
+                        return False
+                    command.effect = EFFECT_CLEAR
+
+            elif not self._skip_value():
+                return False
+
+            c = self._next()
+            if c == _CLOSE_BRACE:
+                return self._at_end()
+            if c != _COMMA:
+                return False
+
+    # the next byte that isn't whitespace, moving past it
+    def _next(self) -> int:
+        data = self.data
+        i = self.i
+        c = data[i]
+        while c == 32 or c == 10 or c == 13 or c == 9:
+            i += 1
+            c = data[i]
+        self.i = i + 1
+        return c
+
+    def _at_end(self) -> bool:
+        data = self.data
+        i = self.i
+        while i < self.end:
+            c = data[i]
+            if not (c == 32 or c == 10 or c == 13 or c == 9):
+                return False
+            i += 1
+        return True
+
+    # reads a string whose opening quote was just read into start and stop
+    def _string(self) -> bool:
+        data = self.data
+        i = self.i
+        self.start = i
+        self.escaped = False
+
+        c = data[i]
+        while c != _QUOTE:
+            if c == _BACKSLASH:
+                self.escaped = True
+                i += 1
+            i += 1
+            c = data[i]
+
+        self.stop = i
+        self.i = i + 1
+        return True
+
+    # whether data[start:stop] is text
+    def _is(self, start: int, stop: int, text) -> bool:
+        if stop - start != len(text):
+            return False
+
+        data = self.data
+        for i in range(stop - start):
+            if data[start + i] != text[i]:
+                return False
+        return True
+
+    def _literal(self, text) -> bool:
+        i = self.i
+        if not self._is(i, i + len(text), text):
+            return False
+        self.i = i + len(text)
+        return True
+
+    # reads a number into value, in thousandths
+    def _number(self) -> bool:
+        self._next()
+        self.i -= 1
+
+        data = self.data
+        i = self.i
+        negative = data[i] == _MINUS
+        if negative:
+            i += 1
+
+        value = 0
+        digits = 0
+        c = data[i]
+        while _ZERO <= c <= _NINE:
+            value = value*10 + c - _ZERO
+            digits += 1
+            i += 1
+            c = data[i]
+        value *= 1000
+
+        if c == _DOT:
+            scale = 100
+            i += 1
+            c = data[i]
+            while _ZERO <= c <= _NINE:
+                value += (c - _ZERO)*scale
+                scale //= 10
+                digits += 1
+                i += 1
+                c = data[i]
+
+        # exponents aren't sent for these fields
+        if not digits or c == 101 or c == 69:
+            return False
+
+        self.value = -value if negative else value
+        self.i = i
+        return True
+
+    def _color(self, command: LightCommand) -> bool:
+        if self._next() != _OPEN_BRACE:
+            return False
+
+        r = g = b = ABSENT
+        if self._next() == _CLOSE_BRACE:
+            return True
+        self.i -= 1
+
+        while True:
+            if self._next() != _QUOTE or not self._string() or self._next() != _COLON:
+                return False
+
+            channel = self.data[self.start] if self.stop - self.start == 1 else 0
+            if channel == 114 or channel == 103 or channel == 98:
+                if not self._number():
+                    return False
+
+                value = self.value // 1000
+                value = 0 if value < 0 else 255 if value > 255 else value
+                if channel == 114:
+                    r = value
+                elif channel == 103:
+                    g = value
+                else:
+                    b = value
+            elif not self._skip_value():
+                return False
+
+            c = self._next()
+            if c == _CLOSE_BRACE:
+                break
+            if c != _COMMA:
+                return False
+
+        # only rgb colours are supported
+        if r >= 0 and g >= 0 and b >= 0:
+            command.color = r << 16 | g << 8 | b
+        return True
+
+    def _effect(self, effects) -> int:
+        start = self.start
+        stop = self.stop
+
+        if self.escaped:
+            # names with escapes are rare enough to decode, a bad escape raises
+            # ValueError or UnicodeError, which reject the message in parse()
+            import ujson
+            name = ujson.loads(bytes(self.data[start - 1:stop + 1])).encode()
+            for index in range(len(effects)):
+                if effects[index] == name:
+                    return index
+            return EFFECT_UNKNOWN
+
+        for index in range(len(effects)):
+            if self._is(start, stop, effects[index]):
+                return index
+        return EFFECT_UNKNOWN
+
+    # skips a value of a field that isn't read
+    def _skip_value(self) -> bool:
+        c = self._next()
+
+        if c == _QUOTE:
+            return self._string()
+
+        if c == _OPEN_BRACE or c == _OPEN_BRACKET:
+            depth = 1
+            while depth:
+                c = self._next()
+                if c == _QUOTE:
+                    self._string()
+                elif c == _OPEN_BRACE or c == _OPEN_BRACKET:
+                    depth += 1
+                elif c == _CLOSE_BRACE or c == _CLOSE_BRACKET:
+                    depth -= 1
+            return True
+
+        self.i -= 1
+        if c == _MINUS or _ZERO <= c <= _NINE:
+            return self._number()
+
+        return self._literal(b'true') or self._literal(b'false') or self._literal(_NULL)
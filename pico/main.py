@@ -1,17 +1,28 @@
 from Color import Color
 from Light import Light
-from effect_reader import effect_reader
+from effect_reader import effect_reader, binary_effect_reader
+from effect_cache import EffectCache
+from color_pipeline import OutputStage
+from compositor import Compositor, LightSegment
+from command_processor import CommandProcessor
+from state_publisher import StatePublisher
+from transitions import ease_in_out
+from frame_profiler import FrameProfiler
+from frame_telemetry import FrameTelemetry
+from gc_manager import GcManager
+from procedural_effects import procedural_effects
 from lib.ha_mqtt_device import Device
 from lib.lib.mqtt_as import MQTTClient
 from lib.wifiConfig import tryConnectingToKnownNetworks
 from sdcard import SDCard
 from secrets import mqtt_password, mqtt_user
 import uasyncio
-from lib.neopixel import Neopixel
+from strip_manager import StripManager
+from dma_output import DmaStripManager
 import machine
+from ubinascii import hexlify
 import uos
 import time
-import gc
 
 chipSelectPin = machine.Pin(17, machine.Pin.OUT)
 spi = machine.SPI(
@@ -29,13 +40,28 @@ spi = machine.SPI(
 sd = None
 
 try:
-    sd = SDCard(spi, chipSelectPin)
+    sd = SDCard(spi, chipSelectPin, cache_bytes=16*1024, readahead_blocks=8)
     vfs = uos.VfsFat(sd)
     uos.mount(vfs, "/sd")
 except:
     pass
 
 frame_duration_ms = 30
+# (pin, led count) of every chain, each driven by its own PIO state machine and
+# together shown as one strip of lights
+strips = [(22, 100)]
+led_count = sum(count for _, count in strips)
+# send frames with DMA while the next one is rendered, instead of pushing them from the cpu
+dma_output = True
+prefetch_buffer_count = 4
+gamma = 2.2
+profiling_enabled = True
+# effects continue from the frame they were left at instead of starting over
+resume_effects = True
+# Home Assistant lights the strip is split into, as (name, first light, light count)
+# or (name, strip index) for one of the chains in strips, each with its own colour,
+# brightness, effect and transitions
+segments = [(b'light', 0, led_count)]
 
 client = MQTTClient(
     port=1883,
@@ -55,84 +81,151 @@ device = Device(
     name=b'String lights',
 )
 
+effect_readers = {
+    'effect': effect_reader,
+    'bfx': binary_effect_reader,
+}
+
+effects_dir = '/sd/effects'
+
 effect_filenames = []
 try:
-    effect_filenames = [filename.rsplit('.') for filename in uos.listdir('/sd/effects')]
+    effect_filenames = [filename.rsplit('.') for filename in uos.listdir(effects_dir)]
 except:
     pass
 
-ha_light = Light(
-    mqtt=client,
-    name=b'light',
-    device=device,
-    transition_duration_ms=500,
-    frame_duration_ms=frame_duration_ms,
-    effects=[filename for (filename, extension) in effect_filenames if extension == 'effect']
-)
+# binary effects take precedence over text ones with the same name
+effect_extensions = {}
+for (filename, extension) in effect_filenames:
+    if extension in effect_readers and effect_extensions.get(filename) != 'bfx':
+        effect_extensions[filename] = extension
+
+hardware_id = hexlify(machine.unique_id())
+
+# set by every light on a command, wakes the render loop while nothing is changing
+state_changed = uasyncio.Event()
+
+ha_lights = [
+    Light(
+        mqtt=client,
+        name=name,
+        device=device,
+        # the first light keeps the id it had before the strip could be split
+        object_id=None if i == 0 else b'light-' + hardware_id + b'-' + str(i).encode(),
+        transition_duration_ms=500,
+        transition_easing=ease_in_out,
+        # effect files win over procedural effects with the same name
+        effects=list(effect_extensions) + [effect for effect in procedural_effects if effect not in effect_extensions]
+    )
+    for i, (name, *_) in enumerate(segments)
+]
+
+# state updates of a light are sent at most once per window
+publisher = StatePublisher(window_ms=250)
+commands = CommandProcessor(ha_lights, publisher, changed=state_changed)
+
+profiler = FrameProfiler(enabled=profiling_enabled)
+# collections run in the slack between frames instead of when the heap runs out
+gc_manager = GcManager(profiler, alloc_budget=32*1024, low_free=32*1024)
+effect_cache = EffectCache(max_fraction=0.5, collect=gc_manager.collect)
+
+telemetry = FrameTelemetry(profiler, client, device, interval_ms=60_000, commands=commands, gc_manager=gc_manager, effect_cache=effect_cache)
+
+def open_effect_file(effect_name):
+    extension = effect_extensions[effect_name]
+    return effect_readers[extension](
+        effect_name=effect_name,
+        filename=f'{effects_dir}/{effect_name}.{extension}',
+    )
+
+def open_effect(effect_name, segment):
+    if effect_name in effect_extensions:
+        reader = effect_cache.open(effect_name, open_effect_file)
+    else:
+        reader = procedural_effects[effect_name](segment.view.count, segment.light.color)
+
+    profiler.reset_heap()
+    gc_manager.begin(effect_name)
+    return reader
 
 async def mqtt_up():
     await client.connect()
     await device.init_mqtt()
-    await ha_light.init_mqtt()
+    for light in ha_lights:
+        await light.init_mqtt()
+    await telemetry.init_mqtt()
     while True:
         await client.up.wait() # type: ignore
         client.up.clear()
         await device.init_mqtt()
-        await ha_light.init_mqtt()
+        for light in ha_lights:
+            await light.init_mqtt()
+        await telemetry.init_mqtt()
 
 async def mqtt_messages_handler():
-    async for topic, msg, retained in client.queue: # type: ignore
-        await ha_light.handle_mqtt_message(topic, msg)
+    await commands.run(client.queue)
+
+def segment_view(lights, segment):
+    if len(segment) == 2:
+        return lights.strip_segment(segment[1])
+    return lights.segment(segment[1], segment[2])
 
 async def lights_main():
-    lights = Neopixel(
-        num_leds=100,
-        pin=22,
-        state_machine=0,
+    lights = DmaStripManager(strips) if dma_output else StripManager(strips)
+    stage = OutputStage(gamma=gamma)
+    compositor = Compositor(
+        lights,
+        [
+            LightSegment(light, segment_view(lights, segment), stage.shared_with(), prefetch_buffer_count=prefetch_buffer_count, profiler=profiler)
+            for light, segment in zip(ha_lights, segments)
+        ],
+        open_effect,
+        resume_effects=resume_effects,
+        frame_duration_ms=frame_duration_ms,
     )
-    reader = None
-    frames = None
 
     while True:
-        if not ha_light.effect:
-            lights.fill(ha_light.color.to_tuple(), ha_light.brightness)
-            await uasyncio.sleep_ms(frame_duration_ms)
-        else:
-            last_frame_time_ms = time.ticks_ms()
-            try:
-                if not reader or reader.effect_name != ha_light.effect:
-                    reader = effect_reader(
-                        effect_name=ha_light.effect,
-                        filename=f'/sd/effects/{ha_light.effect}.effect',
-                    )
-                    frames = reader.read_frames()
-                    gc.collect()
-
-                frame = next(frames) #type:ignore
+        tick_start_ms = time.ticks_ms()
+        state_changed.clear()
 
-                for i, val in enumerate(frame):
-                    lights.set_pixel(i, val, ha_light.brightness)
-            except OSError as e:
-                print(e)
-                ha_light.effect = None
-                await ha_light.publish_state(ha_light.brightness, ha_light.color)
+        start = profiler.start()
+        commands.apply(tick_start_ms)
+        due_in = compositor.tick(tick_start_ms)
+        profiler.record('push', start)
 
-            delay = reader.frame_delay_ms if reader else frame_duration_ms
+        for segment in compositor.take_errors():
+            publisher.request(segment.light)
 
-            diff = time.ticks_diff(time.ticks_ms(), last_frame_time_ms)
+        delay = due_in - time.ticks_diff(time.ticks_ms(), tick_start_ms)
+        if gc_manager.idle(delay*1000):
+            delay = due_in - time.ticks_diff(time.ticks_ms(), tick_start_ms)
 
-            if delay - diff > 0:
-                await uasyncio.sleep_ms(delay - diff)
-            else:
-                await uasyncio.sleep_ms(2)
+        start = profiler.start()
+        if delay > frame_duration_ms:
+            # nothing due for a while, a command ends the wait early
+            try:
+                await uasyncio.wait_for_ms(state_changed.wait(), delay)
+            except uasyncio.TimeoutError:
+                pass
+        else:
+            await uasyncio.sleep_ms(delay if delay > 0 else 2)
+        profiler.record('sleep', start)
+        profiler.frame(late=delay <= 0)
 
-        lights.show()
+        # unchanged frames aren't sent again, the strip keeps showing the last one
+        if compositor.dirty:
+            start = profiler.start()
+            await lights.wait_done()
+            lights.show()
+            profiler.record('show', start)
 
 
 async def main():
     _, ssid, password = await tryConnectingToKnownNetworks()
     client._ssid = ssid
     client._wifi_pw = password
-    await uasyncio.gather(mqtt_messages_handler(), mqtt_up(), lights_main()) # type: ignore
+    await uasyncio.gather(mqtt_messages_handler(), publisher.run(), mqtt_up(), lights_main(), telemetry.run()) # type: ignore
 
-uasyncio.run(main())
+# MicroPython runs main.py as __main__, the guard lets host tools import this module
+if __name__ == '__main__':
+    uasyncio.run(main())
@@ -0,0 +1,221 @@
+# Effects generated at runtime instead of being read from the sd card. They expose
+# the same interface as the file readers (effect_name, light_count, frame_delay_ms,
+# read_frames, read_runs) and render every frame in place into one preallocated bytearray of
+# packed r, g, b bytes, using integer math and state allocated up front, so each
+# frame costs a bounded amount of work and no allocations.
+
+def fill_frame(frame_mv, r: int, g: int, b: int, start: int, count: int):
+    if count <= 0:
+        return
+
+    pos = start*3
+    frame_mv[pos] = r
+    frame_mv[pos+1] = g
+    frame_mv[pos+2] = b
+
+    # copy the already written part over the rest, doubling it each time
+    filled = 3
+    total = count*3
+    while filled < total:
+        chunk = min(filled, total - filled)
+        frame_mv[pos+filled:pos+filled+chunk] = frame_mv[pos:pos+chunk]
+        filled += chunk
+
+def hue_wheel():
+    # 256 hues around the colour wheel, 3 bytes each
+    wheel = bytearray(256*3)
+    for h in range(256):
+        sector, offset = divmod(h*6, 256)
+        rising = offset
+        falling = 255 - offset
+        r, g, b = (
+            (255, rising, 0),
+            (falling, 255, 0),
+            (0, 255, rising),
+            (0, falling, 255),
+            (rising, 0, 255),
+            (255, 0, falling),
+        )[sector]
+        wheel[h*3] = r
+        wheel[h*3+1] = g
+        wheel[h*3+2] = b
+    return wheel
+
+class procedural_effect:
+    def __init__(self, effect_name: str, light_count: int, frame_delay_ms: int):
+        self.effect_name = effect_name
+        self.filename = None
+        self.light_count = light_count
+        self.frame_delay_ms = frame_delay_ms
+        self.frame = bytearray(light_count*3)
+        self.frame_mv = memoryview(self.frame)
+        self.tick = 0
+
+    def render(self, tick: int):
+        pass
+
+    def read_frames(self, start_frame = 0):
+        self.tick = start_frame
+        while True:
+            self.render(self.tick)
+            self.tick += 1
+            yield self.frame
+
+    # every rendered frame is shown once, like a file effect without repeated rows
+    def read_runs(self, start_frame = 0):
+        for frame in self.read_frames(start_frame):
+            yield 1, frame
+
+class rainbow(procedural_effect):
+    def __init__(self, effect_name: str, light_count: int, *, frame_delay_ms = 30, speed = 2, cycles = 1):
+        super().__init__(effect_name, light_count, frame_delay_ms)
+        self.speed = speed
+        self.wheel = hue_wheel()
+        # hue offset of every pixel along the strip
+        self.offsets = bytearray((i*256*cycles // light_count) & 0xff for i in range(light_count))
+
+    def render(self, tick: int):
+        frame, wheel, offsets = self.frame, self.wheel, self.offsets
+        shift = tick*self.speed
+
+        j = 0
+        for i in range(self.light_count):
+            h = ((offsets[i] + shift) & 0xff)*3
+            frame[j] = wheel[h]
+            frame[j+1] = wheel[h+1]
+            frame[j+2] = wheel[h+2]
+            j += 3
+
+class chase(procedural_effect):
+    def __init__(self, effect_name: str, light_count: int, color, *, frame_delay_ms = 50, length = 3, gap = 7):
+        super().__init__(effect_name, light_count, frame_delay_ms)
+        # read on every frame, so passing the light's colour makes the effect follow it
+        self.color = color
+        self.length = length
+        self.period = length + gap
+
+    def render(self, tick: int):
+        r, g, b = self.color.to_tuple()
+        frame_mv = self.frame_mv
+        period = self.period
+
+        fill_frame(frame_mv, 0, 0, 0, 0, self.light_count)
+
+        start = tick % period
+        while start < self.light_count:
+            fill_frame(frame_mv, r, g, b, start, min(self.length, self.light_count - start))
+            start += period
+
+class twinkle(procedural_effect):
+    def __init__(self, effect_name: str, light_count: int, color, *, frame_delay_ms = 30, chance = 12, fade = 12, seed = 1):
+        super().__init__(effect_name, light_count, frame_delay_ms)
+        self.color = color
+        # out of 256, per light and frame
+        self.chance = chance
+        self.fade = fade
+        self.levels = bytearray(light_count)
+        self.seed = seed
+
+    def render(self, tick: int):
+        r, g, b = self.color.to_tuple()
+        levels, frame = self.levels, self.frame
+        fade, chance = self.fade, self.chance
+        seed = self.seed
+
+        j = 0
+        for i in range(self.light_count):
+            # 16 bit lcg, keeps every value a small int
+            seed = (seed*25173 + 13849) & 0xffff
+            level = levels[i]
+
+            if level > fade:
+                level -= fade
+            else:
+                level = 255 if (seed >> 8) < chance else 0
+
+            levels[i] = level
+            frame[j] = (r*level) >> 8
+            frame[j+1] = (g*level) >> 8
+            frame[j+2] = (b*level) >> 8
+            j += 3
+
+        self.seed = seed
+
+class fire(procedural_effect):
+    def __init__(self, effect_name: str, light_count: int, *, frame_delay_ms = 30, cooling = 55, sparking = 120, seed = 7):
+        super().__init__(effect_name, light_count, frame_delay_ms)
+        self.cooling = (cooling*10) // light_count + 2
+        self.sparking = sparking
+        self.heat = bytearray(light_count)
+        self.seed = seed
+
+        # black -> red -> yellow -> white
+        self.palette = bytearray(256*3)
+        for heat in range(256):
+            third = (heat*192) >> 8
+            ramp = (third & 0x3f) << 2
+            if third > 0x80:
+                color = (255, 255, ramp)
+            elif third > 0x40:
+                color = (255, ramp, 0)
+            else:
+                color = (ramp, 0, 0)
+            self.palette[heat*3:heat*3+3] = bytes(color)
+
+    def _random(self, limit: int) -> int:
+        self.seed = (self.seed*25173 + 13849) & 0xffff
+        return ((self.seed >> 8)*limit) >> 8
+
+    def render(self, tick: int):
+        heat, palette, frame = self.heat, self.palette, self.frame
+        count = self.light_count
+
+        # cool down every cell a little
+        for i in range(count):
+            cooled = heat[i] - self._random(self.cooling)
+            heat[i] = cooled if cooled > 0 else 0
+
+        # heat drifts up and diffuses
+        for i in range(count - 1, 1, -1):
+            heat[i] = (heat[i-1] + 2*heat[i-2]) // 3
+
+        # ignite new sparks near the bottom
+        if self._random(256) < self.sparking:
+            i = self._random(min(7, count))
+            sparked = heat[i] + 160 + self._random(96)
+            heat[i] = sparked if sparked < 255 else 255
+
+        j = 0
+        for i in range(count):
+            h = heat[i]*3
+            frame[j] = palette[h]
+            frame[j+1] = palette[h+1]
+            frame[j+2] = palette[h+2]
+            j += 3
+
+class breathe(procedural_effect):
+    def __init__(self, effect_name: str, light_count: int, color, *, frame_delay_ms = 30, period_frames = 120):
+        super().__init__(effect_name, light_count, frame_delay_ms)
+        self.color = color
+        self.period_frames = period_frames
+
+        # one breath as 256 levels, a smoothstep up and back down
+        self.levels = bytearray(256)
+        for step in range(256):
+            p = step*2 if step < 128 else (255 - step)*2
+            self.levels[step] = min((p*p*(768 - 2*p)) >> 16, 255)
+
+    def render(self, tick: int):
+        r, g, b = self.color.to_tuple()
+        level = self.levels[((tick % self.period_frames) << 8) // self.period_frames]
+
+        fill_frame(self.frame_mv, (r*level) >> 8, (g*level) >> 8, (b*level) >> 8, 0, self.light_count)
+
+# effect name as shown in Home Assistant -> factory taking the led count and the light's colour
+procedural_effects = {
+    'Rainbow wave': lambda light_count, color: rainbow('Rainbow wave', light_count),
+    'Chase': lambda light_count, color: chase('Chase', light_count, color),
+    'Twinkle': lambda light_count, color: twinkle('Twinkle', light_count, color),
+    'Fire': lambda light_count, color: fire('Fire', light_count),
+    'Breathe': lambda light_count, color: breathe('Breathe', light_count, color),
+}
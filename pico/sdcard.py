@@ -37,9 +37,15 @@ _TOKEN_CMD25 = const(0xFC)
 _TOKEN_STOP_TRAN = const(0xFD)
 _TOKEN_DATA = const(0xFE)
 
+# driver specific ioctl operations, reporting the sector cache counters
+IOCTL_CACHE_HITS = const(0x100)
+IOCTL_CACHE_MISSES = const(0x101)
+IOCTL_CACHE_READAHEADS = const(0x102)
+IOCTL_CACHE_RESET_COUNTERS = const(0x103)
+
 
 class SDCard:
-    def __init__(self, spi, cs, baudrate=1320000):
+    def __init__(self, spi, cs, baudrate=1320000, cache_bytes=0, readahead_blocks=8):
         self.spi = spi
         self.cs = cs
 
@@ -50,9 +56,31 @@ class SDCard:
             self.dummybuf[i] = 0xFF
         self.dummybuf_memoryview = memoryview(self.dummybuf)
 
+        self.init_cache(cache_bytes, readahead_blocks)
+
         # initialise the card
         self.init_card(baudrate)
 
+    def init_cache(self, cache_bytes, readahead_blocks):
+        # LRU cache of whole sectors, slots are picked by the oldest use stamp
+        nslots = cache_bytes // 512
+        self.cache = bytearray(nslots * 512)
+        self.cache_mv = memoryview(self.cache)
+        self.cache_slot_block = [-1] * nslots
+        self.cache_slot_used = [0] * nslots
+        self.cache_slots = {}
+        self.cache_clock = 0
+
+        # sequential reads are served with one CMD18 of readahead_blocks sectors
+        self.readahead_blocks = min(readahead_blocks, nslots)
+        self.readahead = bytearray(self.readahead_blocks * 512)
+        self.readahead_mv = memoryview(self.readahead)
+        self.next_block = -1
+
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.cache_readaheads = 0
+
     def init_spi(self, baudrate):
         try:
             master = self.spi.MASTER
@@ -150,10 +178,11 @@ class SDCard:
         # create and send the command
         buf = self.cmdbuf
         buf[0] = 0x40 | cmd
-        buf[1] = arg >> 24
-        buf[2] = arg >> 16
-        buf[3] = arg >> 8
-        buf[4] = arg
+        # masked so the driver also runs under CPython, where bytearray doesn't truncate
+        buf[1] = (arg >> 24) & 0xFF
+        buf[2] = (arg >> 16) & 0xFF
+        buf[3] = (arg >> 8) & 0xFF
+        buf[4] = arg & 0xFF
         buf[5] = crc
         self.spi.write(buf)
 
@@ -241,7 +270,7 @@ class SDCard:
         self.cs(1)
         self.spi.write(b"\xff")
 
-    def readblocks(self, block_num, buf):
+    def read_card_blocks(self, block_num, buf):
         # workaround for shared bus, required for (at least) some Kingston
         # devices, ensure MOSI is high before starting transaction
         self.spi.write(b"\xff")
@@ -272,6 +301,77 @@ class SDCard:
             if self.cmd(12, 0, 0xFF, skip1=True):
                 raise OSError(5)  # EIO
 
+    def cache_get(self, block_num, buf):
+        slot = self.cache_slots.get(block_num)
+        if slot is None:
+            return False
+
+        self.cache_clock += 1
+        self.cache_slot_used[slot] = self.cache_clock
+        buf[:] = self.cache_mv[slot * 512 : (slot + 1) * 512]
+        return True
+
+    def cache_put(self, block_num, buf):
+        slot = self.cache_slots.get(block_num)
+        if slot is None:
+            # evict the least recently used slot, unused ones have a stamp of 0
+            used = self.cache_slot_used
+            slot = 0
+            for i in range(1, len(used)):
+                if used[i] < used[slot]:
+                    slot = i
+
+            evicted = self.cache_slot_block[slot]
+            if evicted >= 0:
+                del self.cache_slots[evicted]
+
+            self.cache_slot_block[slot] = block_num
+            self.cache_slots[block_num] = slot
+
+        self.cache_clock += 1
+        self.cache_slot_used[slot] = self.cache_clock
+        self.cache_mv[slot * 512 : (slot + 1) * 512] = buf
+
+    def readblocks(self, block_num, buf):
+        if not self.cache_slot_block:
+            self.read_card_blocks(block_num, buf)
+            return
+
+        nblocks = len(buf) // 512
+        assert nblocks and not len(buf) % 512, "Buffer length is invalid"
+
+        sequential = block_num == self.next_block
+        self.next_block = block_num + nblocks
+
+        mv = memoryview(buf)
+        i = 0
+        while i < nblocks:
+            if self.cache_get(block_num + i, mv[i * 512 : (i + 1) * 512]):
+                self.cache_hits += 1
+                i += 1
+                continue
+
+            # read the whole run of missing sectors at once
+            run = 1
+            while i + run < nblocks and (block_num + i + run) not in self.cache_slots:
+                run += 1
+            self.cache_misses += run
+
+            start = block_num + i
+            ahead = self.readahead_blocks
+            if sequential and run < ahead and start + ahead <= self.sectors:
+                self.read_card_blocks(start, self.readahead)
+                self.cache_readaheads += 1
+                for j in range(ahead):
+                    self.cache_put(start + j, self.readahead_mv[j * 512 : (j + 1) * 512])
+                mv[i * 512 : (i + run) * 512] = self.readahead_mv[: run * 512]
+            else:
+                self.read_card_blocks(start, mv[i * 512 : (i + run) * 512])
+                for j in range(run):
+                    self.cache_put(start + j, mv[(i + j) * 512 : (i + j + 1) * 512])
+
+            i += run
+
     def writeblocks(self, block_num, buf):
         # workaround for shared bus, required for (at least) some Kingston
         # devices, ensure MOSI is high before starting transaction
@@ -299,8 +399,26 @@ class SDCard:
                 nblocks -= 1
             self.write_token(_TOKEN_STOP_TRAN)
 
+        # keep cached copies of the written sectors up to date
+        if self.cache_slots:
+            mv = memoryview(buf)
+            for i in range(len(buf) // 512):
+                if block_num + i in self.cache_slots:
+                    self.cache_put(block_num + i, mv[i * 512 : (i + 1) * 512])
+
     def ioctl(self, op, arg):
         if op == 4:  # get number of blocks
             return self.sectors
         if op == 5:  # get block size in bytes
             return 512
+        if op == IOCTL_CACHE_HITS:
+            return self.cache_hits
+        if op == IOCTL_CACHE_MISSES:
+            return self.cache_misses
+        if op == IOCTL_CACHE_READAHEADS:
+            return self.cache_readaheads
+        if op == IOCTL_CACHE_RESET_COUNTERS:
+            self.cache_hits = 0
+            self.cache_misses = 0
+            self.cache_readaheads = 0
+            return 0
@@ -0,0 +1,35 @@
+import uasyncio
+
+# Publishes the state of lights marked with request(), from its own task. Requests
+# made within window_ms of the first one are published together, once per light, so a
+# light publishes at most once per window however often it changes. A light still
+# skips a state equal to the one it published last (see Light.publish_state).
+class StatePublisher:
+    def __init__(self, *, window_ms = 250):
+        self.window_ms = window_ms
+        self.changed = []
+        self.ready = uasyncio.Event()
+
+        self.requested = 0
+        self.published = 0
+        self.duplicates = 0
+
+    def request(self, light):
+        self.requested += 1
+
+        if light not in self.changed:
+            self.changed.append(light)
+
+        self.ready.set()
+
+    async def run(self):
+        while True:
+            await self.ready.wait()
+            await uasyncio.sleep_ms(self.window_ms)
+            self.ready.clear()
+
+            while self.changed:
+                if await self.changed.pop(0).publish_target_state():
+                    self.published += 1
+                else:
+                    self.duplicates += 1
@@ -0,0 +1,101 @@
+from array import array
+from lib.neopixel import Neopixel
+import time
+
+# the RP2040 has two PIO blocks with four state machines each
+MAX_STRIPS = 8
+
+# One Neopixel chain on its own pin and PIO state machine, showing the lights
+# [start, start + count) of the shared frame
+class Strip:
+    def __init__(self, neopixel, start: int, count: int, pixels_mv, chunk_words: int):
+        self.neopixel = neopixel
+        self.start = start
+        self.count = count
+        self.sm = neopixel.sm
+        # RGB chains only shift out the low 24 bits of every word
+        self.cut = 0 if 'W' in neopixel.mode else 8
+
+        # the chain shows its part of the shared buffer, its own one is dropped
+        self.pixels = pixels_mv[start:start + count]
+        neopixel.pixels = self.pixels
+
+        # views are made up front, slicing while showing would allocate
+        self.chunks = [self.pixels[i:i + chunk_words] for i in range(0, count, chunk_words)]
+
+# A part of the shared frame, with the interface FrameWriter expects from a Neopixel,
+# so a strip (or any other range of lights) can be driven on its own
+class Segment:
+    def __init__(self, manager, start: int, count: int):
+        self.manager = manager
+        self.start = start
+        self.count = count
+        self.shift = manager.shift
+        # one view per buffer of the manager, pixels follows the one being written
+        self.views = [memoryview(buffer)[start:start + count] for buffer in manager.buffers]
+
+    @property
+    def pixels(self):
+        return self.views[self.manager.back]
+
+# Drives several Neopixel chains as one strip of logical lights. strips is a list of
+# (pin, led count) tuples; chain i runs on PIO state machine i and shows the next
+# led count lights of the frame. mode is passed on to the Neopixel library, which uses
+# its own default when it's None. All chains share one pixel buffer, written by a
+# FrameWriter like a single Neopixel would be.
+#
+# show() feeds the chains round robin, chunk_words words at a time, so every state
+# machine is shifting out its FIFO while the others are being filled. A frame then
+# takes about as long as the longest chain, instead of the sum of all of them.
+class StripManager:
+    def __init__(self, strips, *, mode = None, chunk_words = 4, latch_us = 100):
+        if not strips or len(strips) > MAX_STRIPS:
+            raise ValueError(f'Between 1 and {MAX_STRIPS} strips are supported')
+
+        self.led_count = sum(count for _, count in strips)
+        self.pixels = array('I', [0]*self.led_count)
+        self.pixels_mv = memoryview(self.pixels)
+        self.latch_us = latch_us
+        # the buffers frames are written to, and the index of the one being written
+        self.buffers = [self.pixels]
+        self.back = 0
+
+        self.strips = []
+        start = 0
+        for state_machine, (pin, count) in enumerate(strips):
+            if mode:
+                neopixel = Neopixel(num_leds=count, state_machine=state_machine, pin=pin, mode=mode)
+            else:
+                neopixel = Neopixel(num_leds=count, state_machine=state_machine, pin=pin)
+            self.strips.append(Strip(neopixel, start, count, self.pixels_mv, chunk_words))
+            start += count
+
+        self.shift = getattr(self.strips[0].neopixel, 'shift', None)
+        self.chunk_count = max(len(strip.chunks) for strip in self.strips)
+
+    def segment(self, start: int, count: int) -> Segment:
+        return Segment(self, start, count)
+
+    def strip_segment(self, index: int) -> Segment:
+        strip = self.strips[index]
+        return Segment(self, strip.start, strip.count)
+
+    # show() blocks until the frame is pushed out, so there is nothing to wait for
+    async def wait_done(self):
+        pass
+
+    def show(self):
+        strips = self.strips
+
+        if len(strips) == 1:
+            strips[0].neopixel.show()
+            return
+
+        for chunk in range(self.chunk_count):
+            for strip in strips:
+                chunks = strip.chunks
+                if chunk < len(chunks):
+                    strip.sm.put(chunks[chunk], strip.cut)
+
+        # the chains latch after the line stays low for a while
+        time.sleep_us(self.latch_us)
@@ -0,0 +1,111 @@
+from Color import Color
+import time
+
+# Easing curves map transition progress to eased progress, both as 8.8 fixed
+# point fractions in 0 - 256, using integer math only.
+
+def linear(progress: int) -> int:
+    return progress
+
+def ease_in(progress: int) -> int:
+    return (progress*progress) >> 8
+
+def ease_out(progress: int) -> int:
+    rest = 256 - progress
+    return 256 - ((rest*rest) >> 8)
+
+def ease_in_out(progress: int) -> int:
+    # smoothstep, 3p^2 - 2p^3
+    return (progress*progress*(768 - 2*progress)) >> 16
+
+easings = {
+    'linear': linear,
+    'ease_in': ease_in,
+    'ease_out': ease_out,
+    'ease_in_out': ease_in_out,
+}
+
+# Brightness and colour transitions of a light, advanced by the render loop with
+# the real time of each frame. Every tick is O(1): the value is interpolated from
+# the start and target straight away, so late or skipped frames don't slow the
+# transition down. Starting a new transition retargets from the current value,
+# so nothing is ever left half way.
+class TransitionScheduler:
+    def __init__(self, easing = linear):
+        self.easing = easing
+
+        self.brightness_active = False
+        self.brightness_start = 0
+        self.brightness_target = 0
+        self.brightness_start_ms = 0
+        self.brightness_duration_ms = 0
+
+        self.color_active = False
+        self.color_start = Color()
+        self.color_target = Color()
+        self.color_start_ms = 0
+        self.color_duration_ms = 0
+
+    @property
+    def active(self):
+        return self.brightness_active or self.color_active
+
+    def start_brightness(self, current: int, target: int, duration_ms: int, now_ms = None):
+        self.brightness_start = current
+        self.brightness_target = target
+        self.brightness_start_ms = time.ticks_ms() if now_ms is None else now_ms
+        self.brightness_duration_ms = duration_ms
+        self.brightness_active = True
+
+    def start_color(self, current: 'Color', target: 'Color', duration_ms: int, now_ms = None):
+        self.color_start.copy_from(current)
+        self.color_target.copy_from(target)
+        self.color_start_ms = time.ticks_ms() if now_ms is None else now_ms
+        self.color_duration_ms = duration_ms
+        self.color_active = True
+
+    # Zero length transitions: the value is written into light at once and anything
+    # running towards another one is dropped, nothing is left to interpolate
+
+    def set_brightness(self, light, target: int):
+        self.brightness_active = False
+        self.brightness_target = target
+        light.brightness = target
+
+    def set_color(self, light, target: 'Color'):
+        self.color_active = False
+        self.color_target.copy_from(target)
+        light.color.copy_from(target)
+
+    def _progress(self, start_ms: int, duration_ms: int, now_ms: int) -> int:
+        elapsed = time.ticks_diff(now_ms, start_ms)
+
+        if elapsed >= duration_ms:
+            return 256
+
+        if elapsed <= 0:
+            return 0
+
+        return self.easing((elapsed << 8) // duration_ms)
+
+    # Writes the interpolated brightness and colour into light, returns whether
+    # anything is still transitioning
+    def tick(self, light, now_ms: int) -> bool:
+        if self.brightness_active:
+            progress = self._progress(self.brightness_start_ms, self.brightness_duration_ms, now_ms)
+            start = self.brightness_start
+            light.brightness = start + (((self.brightness_target - start)*progress) >> 8)
+
+            if progress >= 256:
+                light.brightness = self.brightness_target
+                self.brightness_active = False
+
+        if self.color_active:
+            progress = self._progress(self.color_start_ms, self.color_duration_ms, now_ms)
+            light.color.blend_into(self.color_start, self.color_target, progress)
+
+            if progress >= 256:
+                light.color.copy_from(self.color_target)
+                self.color_active = False
+
+        return self.active